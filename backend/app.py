@@ -1,15 +1,45 @@
 import pdb
-from flask import Flask, jsonify, request, send_file
+from flask import (Flask, copy_current_request_context, g, jsonify, request,
+                   send_file, stream_with_context)
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import sqlite3
 import json
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
+import click
+import joblib
 import os
+import sys
+import base64
+import bisect
+import csv
+import gzip
+import importlib.util
+import io
+import multiprocessing
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import hashlib
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial, wraps
 from io import BytesIO
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
 
 """
@@ -24,7 +54,8 @@ CORS(app)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DATA_DIR = os.path.join(BASE_DIR, "..", "data")
+DATA_DIR = os.environ.get(
+    'CHURNLYTICS_DATA_DIR', os.path.join(BASE_DIR, "..", "data"))
 DB_PATH = os.path.join(DATA_DIR, "gym_analytics.db")
 
 # # Database path
@@ -32,18 +63,415 @@ DB_PATH = os.path.join(DATA_DIR, "gym_analytics.db")
 # DATA_DIR = '../data'
 
 # Import/Export Configuration
-UPLOAD_FOLDER = '../data/uploads'
-EXPORT_FOLDER = '../data/exports'
+UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads')
+EXPORT_FOLDER = os.path.join(DATA_DIR, 'exports')
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 50_000))
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', 10_000))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+MAINTENANCE_WORKERS = int(os.environ.get('MAINTENANCE_WORKERS', 1))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+# Churn model configuration
+MODEL_FOLDER = os.path.join(DATA_DIR, 'models')
+CHURN_MODEL_PATH = os.environ.get(
+    'CHURN_MODEL_PATH', os.path.join(MODEL_FOLDER, 'churn_model.joblib'))
+CHURN_HIGH_RISK = float(os.environ.get('CHURN_HIGH_RISK', 0.6))
+CHURN_MEDIUM_RISK = float(os.environ.get('CHURN_MEDIUM_RISK', 0.3))
 
 # Create necessary directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(EXPORT_FOLDER, exist_ok=True)
+os.makedirs(MODEL_FOLDER, exist_ok=True)
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# ============================================================================
+# CONNECTION POOL
+# ============================================================================
+
+# Size the pool to the number of threads per worker (gunicorn --threads)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_KB = 64 * 1024
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections
+
+    Connections are opened lazily up to `size` and handed back out LIFO so
+    the most recently used (warmest) connection is reused first. Pragmas
+    are applied once, when a connection is opened.
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 read_only=False):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.read_only = read_only
+        self.reset()
+
+    def reset(self):
+        """Forget every connection without closing it (used after fork)"""
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._open = 0
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def _connect(self):
+        if self.read_only:
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True,
+                                   timeout=self.timeout, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(
+                self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_KB}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, open a new one, or wait for a release"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._open < self.size
+            if can_open:
+                self._open += 1
+                self._misses += 1
+            else:
+                self._waits += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise RuntimeError(
+                f'Timed out after {self.timeout}s waiting for a database connection')
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': idle,
+                'in_use': self._open - idle,
+                'hits': self._hits,
+                'misses': self._misses,
+                'waits': self._waits,
+                'timeouts': self._timeouts
+            }
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+
+db_pool = ConnectionPool(DB_PATH)
+
+# SQLite connections must not cross a fork (gunicorn --preload)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=db_pool.reset)
+
+# ============================================================================
+# SCHEMA MIGRATIONS
+# ============================================================================
+
+# Primary key per table. pandas.to_sql creates tables without keys, so
+# apply_table_schema() rebuilds them with the key declared.
+TABLE_KEYS = {
+    'members': 'member_id',
+    'checkins': 'checkin_id',
+    'sales': 'sale_id',
+    'leads': 'lead_id'
+}
+
+# index name -> (table, columns)
+TABLE_INDEXES = {
+    'idx_checkins_member_ts': ('checkins', ('member_id', 'checkin_ts')),
+    'idx_checkins_ts': ('checkins', ('checkin_ts',)),
+    'idx_members_active_location_id': ('members', ('is_active', 'location_id')),
+    'idx_sales_date': ('sales', ('date',)),
+    'idx_leads_date': ('leads', ('date',))
+}
+
+# Lookup tables coding low-cardinality text columns as small integers:
+# lookup table -> id column. Ids start at 1; the cubes use 0 for NULL.
+LOOKUP_TABLES = {
+    'locations': 'location_id',
+    'membership_types': 'membership_type_id'
+}
+
+# Typed columns parsed once at ingest from the free-form source columns, so
+# queries compare integers instead of calling julianday()/strftime() per row.
+# table -> [(column, kind, source columns)], where kind is
+#   'day'   - days since 1970-01-01 of the first non-NULL source
+#   'epoch' - seconds since 1970-01-01 UTC
+#   a LOOKUP_TABLES name - the id of the value in that table
+DERIVED_COLUMNS = {
+    'members': [
+        ('signup_day', 'day', ('signup_date', 'join_date')),
+        ('cancel_day', 'day', ('cancellation_date',)),
+        ('location_id', 'locations', ('location',)),
+        ('membership_type_id', 'membership_types', ('membership_type',))
+    ],
+    'checkins': [
+        ('checkin_ts', 'epoch', ('checkin_date',)),
+        ('location_id', 'locations', ('location',))
+    ]
+}
+SECONDS_PER_DAY = 86400
+UNIX_EPOCH_JULIANDAY = 2440587.5
+
+# Tables whose imports upsert through a staging table. row_hash holds a hash
+# of each row's source columns so unchanged rows are skipped (NULL = unknown).
+ROW_HASH_TABLES = ('members', 'checkins')
+ROW_HASH_COLUMN = 'row_hash'
+
+
+def _table_columns(conn, table):
+    """Return [(name, type, pk)] for a table, or [] if it doesn't exist"""
+    rows = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    return [(row[1], row[2], row[5]) for row in rows]
+
+
+def _rebuild_with_primary_key(conn, table, key):
+    """Copy a keyless table into one with `key` as PRIMARY KEY
+
+    Later rows win when the same key appears more than once, matching the
+    import contract that existing rows match on their id column.
+    """
+    columns = _table_columns(conn, table)
+    names = [name for name, _, _ in columns]
+    if key not in names or any(pk for _, _, pk in columns):
+        return False
+
+    column_defs = ', '.join(
+        f'"{name}" {col_type or ""}'.rstrip() +
+        (' PRIMARY KEY' if name == key else '')
+        for name, col_type, _ in columns
+    )
+    column_list = ', '.join(f'"{name}"' for name in names)
+    tmp_table = f'{table}__rebuild'
+
+    conn.execute(f'DROP TABLE IF EXISTS "{tmp_table}"')
+    conn.execute(f'CREATE TABLE "{tmp_table}" ({column_defs})')
+    conn.execute(
+        f'INSERT OR REPLACE INTO "{tmp_table}" ({column_list}) '
+        f'SELECT {column_list} FROM "{table}" ORDER BY rowid')
+    conn.execute(f'DROP TABLE "{table}"')
+    conn.execute(f'ALTER TABLE "{tmp_table}" RENAME TO "{table}"')
+    return True
+
+
+def derived_column_names(table):
+    return [column for column, _, _ in DERIVED_COLUMNS.get(table, [])]
+
+
+def _create_lookup_tables(conn):
+    for lookup, id_column in LOOKUP_TABLES.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {lookup} (
+                {id_column} INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+
+
+def lookup_ids(conn, lookup, values):
+    """{str(value): id} for the given values, adding any new ones to `lookup`"""
+    names = pd.Series(values, dtype=object).dropna().astype(str).unique().tolist()
+    conn.executemany(f'INSERT OR IGNORE INTO {lookup} (name) VALUES (?)',
+                     [(name,) for name in names])
+    return dict(conn.execute(f'SELECT name, {LOOKUP_TABLES[lookup]} FROM {lookup}'))
+
+
+def derive_columns(conn, table, where='1 = 1', params=()):
+    """Fill the typed columns of a table's rows matching `where`
+
+    Run after rows are written through the source columns alone (to_sql
+    loads, member imports). Check-in imports compute the same values in
+    _prepare_checkin_chunk instead, from the timestamps they already parse.
+    """
+    names = {name for name, _, _ in _table_columns(conn, table)}
+    assignments = []
+    for column, kind, sources in DERIVED_COLUMNS.get(table, []):
+        present = [f'"{source}"' for source in sources if source in names]
+        if not present:
+            assignments.append(f'"{column}" = NULL')
+            continue
+        value = present[0] if len(present) == 1 else f'COALESCE({", ".join(present)})'
+        if kind == 'epoch':
+            expression = f"CAST(strftime('%s', {value}) AS INTEGER)"
+        elif kind == 'day':
+            expression = f"CAST(strftime('%s', {value}) AS INTEGER) / {SECONDS_PER_DAY}"
+        else:
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {kind} (name)
+                SELECT DISTINCT CAST({value} AS TEXT) FROM "{table}"
+                WHERE ({where}) AND {value} IS NOT NULL
+            """, params)
+            id_column = LOOKUP_TABLES[kind]
+            expression = f'(SELECT {id_column} FROM {kind} WHERE name = CAST({value} AS TEXT))'
+        assignments.append(f'"{column}" = {expression}')
+    if assignments:
+        conn.execute(f'UPDATE "{table}" SET {", ".join(assignments)} WHERE {where}', params)
+
+
+def _add_derived_columns(conn, table):
+    """Add and fill any typed columns the table doesn't have yet"""
+    names = {name for name, _, _ in _table_columns(conn, table)}
+    missing = [column for column in derived_column_names(table) if column not in names]
+    if not missing:
+        return
+    _create_lookup_tables(conn)
+    for column in missing:
+        conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" INTEGER')
+    derive_columns(conn, table)
+
+
+def apply_table_schema(conn, table):
+    """Declare the primary key, typed columns and indexes for one table (idempotent)
+
+    Safe to call after anything that recreates the table, e.g. a
+    mode=replace import, which drops keys and indexes along with the data.
+    """
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        if table in TABLE_KEYS:
+            _rebuild_with_primary_key(conn, table, TABLE_KEYS[table])
+        _add_derived_columns(conn, table)
+
+        names = {name for name, _, _ in _table_columns(conn, table)}
+        if table in ROW_HASH_TABLES and ROW_HASH_COLUMN not in names:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN {ROW_HASH_COLUMN} INTEGER')
+        for index_name, (index_table, columns) in TABLE_INDEXES.items():
+            if index_table == table and set(columns) <= names:
+                column_list = ', '.join(f'"{col}"' for col in columns)
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON "{table}" ({column_list})')
+        if not in_transaction:
+            conn.commit()
+    except Exception:
+        if not in_transaction:
+            conn.rollback()
+        raise
+
+    conn.execute(f'ANALYZE "{table}"')
+
+
+# (version, description, function(conn)); never renumber an applied version
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a schema migration that runs once, in version order"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+@migration(1, 'primary keys and lookup indexes')
+def _migration_keys_and_indexes(conn):
+    for table in TABLE_KEYS:
+        if _table_columns(conn, table):
+            apply_table_schema(conn, table)
+
+
+@migration(2, 'key/value app state')
+def _migration_app_state(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+
+def get_state(conn, key, default=None):
+    row = conn.execute(
+        'SELECT value FROM app_state WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(conn, key, value):
+    conn.execute(
+        'INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)', (key, value))
+
+
+def migrate():
+    """Apply any pending schema migrations, in version order"""
+    with db_pool.connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        applied = {row[0] for row in conn.execute(
+            'SELECT version FROM schema_migrations')}
+
+        for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in applied:
+                continue
+            print(f"Applying migration {version}: {description}")
+            func(conn)
+            conn.execute(
+                'INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)',
+                (version, description, datetime.now().isoformat()))
+            conn.commit()
+
 # ============================================================================
 # DATABASE INITIALIZATION
 # ============================================================================
@@ -53,9 +481,6 @@ def init_database():
     """Initialize SQLite database and load CSV data"""
     print("Initializing database...")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     # Load CSV files
     members_df = pd.read_csv(os.path.join(DATA_DIR, "members.csv"))
     checkins_df = pd.read_csv(f'{DATA_DIR}/checkins.csv')
@@ -68,367 +493,3543 @@ def init_database():
         checkins_df.rename(
             columns={'checkin_datetime': 'checkin_date'}, inplace=True)
 
+    # Hashed like an import of the same files, so re-uploading them is a no-op
+    for df in (members_df, checkins_df):
+        df[ROW_HASH_COLUMN] = row_hashes(df, df.columns)
+
     sales_df = pd.read_csv(f'{DATA_DIR}/sales.csv')
     leads_df = pd.read_csv(f'{DATA_DIR}/leads.csv')
 
     # Create tables and load data
-    members_df.to_sql('members', conn, if_exists='replace', index=False)
-    checkins_df.to_sql('checkins', conn, if_exists='replace', index=False)
-    sales_df.to_sql('sales', conn, if_exists='replace', index=False)
-    leads_df.to_sql('leads', conn, if_exists='replace', index=False)
+    with db_pool.connection() as conn:
+        members_df.to_sql('members', conn, if_exists='replace', index=False)
+        checkins_df.to_sql('checkins', conn, if_exists='replace', index=False)
+        sales_df.to_sql('sales', conn, if_exists='replace', index=False)
+        leads_df.to_sql('leads', conn, if_exists='replace', index=False)
+        conn.commit()
+
+        for table in TABLE_KEYS:
+            apply_table_schema(conn, table)
+        if _table_columns(conn, 'member_activity'):
+            rebuild_member_activity(conn)
+        if _table_columns(conn, 'checkin_hourly'):
+            rebuild_checkin_cubes(conn)
+        conn.commit()
+        if _table_columns(conn, 'member_risk'):
+            rebuild_member_risk(conn)
+            conn.commit()
+        if _table_columns(conn, 'kpi_daily'):
+            conn.execute('DELETE FROM kpi_daily')
+            conn.commit()
+        if _table_columns(conn, 'app_state'):
+            bump_data_version(conn)
+            conn.commit()
 
-    conn.close()
     print("✓ Database initialized successfully")
 
 
-# Initialize database on startup if it doesn't exist
-if not os.path.exists(DB_PATH):
-    init_database()
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+# query_db / query_to_df record the time and row count of every statement,
+# keyed by the calling function plus a hash of the normalized SQL and the
+# backend that ran it, and requests record latency per route. Everything is exported at /api/metrics
+# in Prometheus text format; /api/metrics/queries lists the statements
+# themselves. Per-request peak memory uses tracemalloc, which slows Python
+# allocation noticeably, so it is opt-in (METRICS_TRACE_MEMORY=1). Setting
+# SLOW_QUERY_MS logs EXPLAIN QUERY PLAN for statements slower than that.
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+SLOW_QUERY_LOG_SIZE = 100
+METRICS_TRACE_MEMORY = os.environ.get('METRICS_TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 64, 256, 1024))
+ROW_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_set(names, values, extra=()):
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Prometheus histogram with one series per label combination"""
+
+    def __init__(self, name, documentation, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Count per bucket (the last one is +Inf), then the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        for labels, values in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket'
+                             f'{_label_set(self.label_names, labels, [le])} {cumulative}')
+            label_set = _label_set(self.label_names, labels)
+            lines.append(f'{self.name}_sum{label_set} {values[-1]}')
+            lines.append(f'{self.name}_count{label_set} {cumulative}')
+        return lines
+
+
+query_duration = Histogram(
+    'churnlytics_query_duration_seconds',
+    'Time spent executing and fetching one SQL statement',
+    ('query', 'caller', 'backend'))
+query_rows = Histogram(
+    'churnlytics_query_rows', 'Rows returned per SQL statement',
+    ('query', 'caller', 'backend'), buckets=ROW_BUCKETS)
+request_duration = Histogram(
+    'churnlytics_http_request_duration_seconds',
+    'Time from request start until the response is handed to the WSGI server',
+    ('method', 'route', 'status'))
+request_peak_memory = Histogram(
+    'churnlytics_http_request_peak_memory_bytes',
+    'Peak Python heap growth during a request (METRICS_TRACE_MEMORY=1)',
+    ('method', 'route'), buckets=MEMORY_BUCKETS)
+
+_query_catalog = {}
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+if METRICS_TRACE_MEMORY:
+    tracemalloc.start()
+
+
+def _query_id(query):
+    """(id, normalized SQL) for a statement, cached per SQL string"""
+    entry = _query_catalog.get(query)
+    if entry is None:
+        normalized = ' '.join(query.split())
+        entry = (hashlib.sha1(normalized.encode()).hexdigest()[:10], normalized)
+        _query_catalog[query] = entry
+    return entry
+
+
+def explain_query_plan(query, params=()):
+    """EXPLAIN QUERY PLAN output as indented lines"""
+    with db_pool.connection() as conn:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def record_query(query, params, seconds, rows, caller, backend='sqlite'):
+    """Record one statement's timing; log its plan if it was slow"""
+    query_id, normalized = _query_id(query)
+    query_duration.observe(seconds, query_id, caller, backend)
+    query_rows.observe(rows, query_id, caller, backend)
+
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        try:
+            if backend == 'duckdb':
+                plan = columnar_store.explain(translate_to_duckdb(query), params)
+            else:
+                plan = explain_query_plan(query, params)
+        except Exception as e:
+            plan = [f'(no plan: {e})']
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'query': query_id,
+            'caller': caller,
+            'backend': backend,
+            'duration_ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'sql': normalized,
+            'plan': plan
+        }
+        slow_queries.append(entry)
+        app.logger.warning('Slow query %s from %s on %s: %.1f ms, %d rows\n%s\n%s',
+                           query_id, caller, backend, entry['duration_ms'], rows,
+                           normalized, '\n'.join(plan))
+
+
+def query_summary():
+    """Per-statement totals from the query histograms, slowest first"""
+    statements = dict(_query_catalog.values())
+    rows = query_rows.snapshot()
+    summary = []
+    for (query_id, caller, backend), values in query_duration.snapshot().items():
+        calls = sum(values[:-1])
+        row_values = rows.get((query_id, caller, backend))
+        summary.append({
+            'query': query_id,
+            'caller': caller,
+            'backend': backend,
+            'calls': calls,
+            'total_ms': round(values[-1] * 1000, 2),
+            'avg_ms': round(values[-1] * 1000 / calls, 2),
+            'avg_rows': round(row_values[-1] / calls, 1) if row_values else None,
+            'sql': statements.get(query_id)
+        })
+    return sorted(summary, key=lambda item: -item['total_ms'])
+
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    if METRICS_TRACE_MEMORY:
+        # tracemalloc is process-wide, so concurrent requests share one peak
+        g.metrics_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_duration.observe(time.perf_counter() - start,
+                                 request.method, route, str(response.status_code))
+        if METRICS_TRACE_MEMORY and 'metrics_memory' in g:
+            peak = tracemalloc.get_traced_memory()[1] - g.pop('metrics_memory')
+            request_peak_memory.observe(max(peak, 0), request.method, route)
+    return response
+
+
+def _gauge_lines(name, documentation, values):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    lines.extend(f'{name}{_label_set(("stat",), (stat,))} {value}'
+                 for stat, value in values.items())
+    return lines
+
+
+def _process_memory():
+    stats = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    stats['resident'] = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    stats['peak_resident'] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return stats
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for histogram in (request_duration, request_peak_memory, query_duration, query_rows):
+        lines.extend(histogram.render())
+    lines.extend(_gauge_lines('churnlytics_db_pool', 'SQLite connection pool counters',
+                              db_pool.stats()))
+    cache_stats = {key: value for key, value in response_cache.stats().items()
+                   if isinstance(value, (int, float))}
+    lines.extend(_gauge_lines('churnlytics_response_cache', 'Response cache counters',
+                              cache_stats))
+    lines.extend(_gauge_lines('churnlytics_process_memory_bytes', 'Process memory from /proc',
+                              _process_memory()))
+    return '\n'.join(lines) + '\n'
 
 # ============================================================================
-# UTILITY FUNCTIONS
+# COLUMNAR BACKEND
 # ============================================================================
 
+# ANALYTICS_BACKEND=duckdb runs read-only analytics statements on an embedded
+# DuckDB engine over Parquet snapshots of the data tables (DATA_DIR/columnar)
+# instead of on SQLite. SQLite stays the system of record: imports, jobs and
+# app_state never leave it. A snapshot records the source version it was
+# taken at; while it lags behind, statements run on SQLite and a background
+# sync_columnar job takes a new one. SQLite's date functions are mapped onto
+# DuckDB macros, and a statement DuckDB rejects stays on SQLite.
+
+ANALYTICS_BACKENDS = ('sqlite', 'duckdb')
+ANALYTICS_BACKEND = os.environ.get('ANALYTICS_BACKEND', 'sqlite').lower()
+COLUMNAR_FOLDER = os.path.join(DATA_DIR, 'columnar')
+COLUMNAR_ROWS_PER_FILE = int(os.environ.get('COLUMNAR_ROWS_PER_FILE', 250_000))
+COLUMNAR_TABLES = ('members', 'checkins', 'sales', 'leads', 'locations',
+                   'membership_types', 'member_activity', 'member_scores')
+
+# Rows are written in this order so Parquet row-group min/max statistics let
+# DuckDB skip everything outside a date window
+COLUMNAR_SORT_KEYS = {'checkins': 'checkin_ts', 'sales': 'date', 'leads': 'date'}
+
+# app_state keys whose values change what the synced tables contain
+COLUMNAR_SOURCE_KEYS = ('data_version', 'activity_window_date', 'scores_updated_at')
+
+# SQLite semantics as DuckDB macros: 'now' is UTC, unparseable dates are
+# NULL, and CAST(x AS INTEGER) truncates instead of rounding. Month
+# arithmetic clamps to the month end where SQLite overflows (Mar 31 + 1
+# month is Apr 30, not May 1).
+DUCKDB_MACROS = """
+    CREATE OR REPLACE MACRO sqlite_ts(x) AS CASE
+        WHEN CAST(x AS VARCHAR) = 'now' THEN make_timestamp(epoch_us(now()))
+        ELSE TRY_CAST(x AS TIMESTAMP) END;
+    CREATE OR REPLACE MACRO sqlite_shift(x, modifier) AS
+        sqlite_ts(x) + CAST(ltrim(modifier, '+') AS INTERVAL);
+    CREATE OR REPLACE MACRO sqlite_julianday(x) AS
+        epoch(sqlite_ts(x)) / 86400.0 + 2440587.5;
+    CREATE OR REPLACE MACRO sqlite_date(x) AS strftime(sqlite_ts(x), '%Y-%m-%d'),
+        (x, modifier) AS strftime(sqlite_shift(x, modifier), '%Y-%m-%d');
+    CREATE OR REPLACE MACRO sqlite_datetime(x) AS strftime(sqlite_ts(x), '%Y-%m-%d %H:%M:%S'),
+        (x, modifier) AS strftime(sqlite_shift(x, modifier), '%Y-%m-%d %H:%M:%S');
+    CREATE OR REPLACE MACRO sqlite_strftime(fmt, x) AS strftime(sqlite_ts(x), fmt);
+    CREATE OR REPLACE MACRO sqlite_int(x) AS CAST(trunc(TRY_CAST(x AS DOUBLE)) AS BIGINT);
+"""
 
-def query_db(query, params=()):
-    """Execute SQL query and return results as list of dicts"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return results
+_SQLITE_DATE_FUNCTION = re.compile(r'\b(julianday|date|datetime|strftime)\s*\(', re.IGNORECASE)
+_SQLITE_REAL = re.compile(r'\bAS\s+REAL\b', re.IGNORECASE)
+_CAST_OPEN = re.compile(r'\bCAST\s*\(', re.IGNORECASE)
+_AS_INTEGER = re.compile(r'^(.*)\s+AS\s+INTEGER\s*$', re.IGNORECASE | re.DOTALL)
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)', re.IGNORECASE)
+_CTE_NAME = re.compile(r'(?:\bWITH|,)\s*(\w+)\s+AS\s*\(', re.IGNORECASE)
 
 
-def query_to_df(query, params=()):
-    """Execute SQL query and return as DataFrame"""
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+def _require_duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise RuntimeError(
+            'ANALYTICS_BACKEND=duckdb needs the duckdb package (pip install duckdb)')
+    return duckdb
+
+
+def _closing_paren(sql, start):
+    """Index of the ')' closing the '(' just before `start`"""
+    depth = 1
+    for i in range(start, len(sql)):
+        if sql[i] == '(':
+            depth += 1
+        elif sql[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError('Unbalanced parentheses in SQL statement')
+
+
+def _rewrite_integer_casts(sql):
+    """CAST(x AS INTEGER) -> sqlite_int(x), innermost casts first"""
+    parts, pos = [], 0
+    for match in _CAST_OPEN.finditer(sql):
+        if match.start() < pos:
+            continue
+        end = _closing_paren(sql, match.end())
+        inner = _rewrite_integer_casts(sql[match.end():end])
+        integer = _AS_INTEGER.match(inner)
+        parts.append(sql[pos:match.start()])
+        parts.append(f'sqlite_int({integer.group(1)})' if integer else f'CAST({inner})')
+        pos = end + 1
+    parts.append(sql[pos:])
+    return ''.join(parts)
+
+
+def translate_to_duckdb(query):
+    """Rewrite a SQLite statement to run on DuckDB with the macros above"""
+    sql = _SQLITE_DATE_FUNCTION.sub(lambda m: f'sqlite_{m.group(1).lower()}(', query)
+    sql = _SQLITE_REAL.sub('AS DOUBLE', sql)
+    return _rewrite_integer_casts(sql)
+
+
+def referenced_tables(query):
+    """Tables a statement reads, excluding its own CTEs"""
+    ctes = {name.lower() for name in _CTE_NAME.findall(query)}
+    return {name.lower() for name in _TABLE_REFERENCE.findall(query)} - ctes
+
+
+def _duckdb_type(sqlite_type):
+    """DuckDB column type for a SQLite declared type, by affinity"""
+    declared = (sqlite_type or '').upper()
+    if 'INT' in declared:
+        return 'BIGINT'
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'DOUBLE'
+    return 'VARCHAR'
+
+
+def columnar_source_version(conn):
+    """The app_state values a snapshot must match to be current"""
+    placeholders = ', '.join('?' * len(COLUMNAR_SOURCE_KEYS))
+    state = dict(conn.execute(
+        f'SELECT key, value FROM app_state WHERE key IN ({placeholders})',
+        COLUMNAR_SOURCE_KEYS).fetchall())
+    return ':'.join(str(state.get(key, '')) for key in COLUMNAR_SOURCE_KEYS)
+
+
+class ColumnarStore:
+    """DuckDB views over the current Parquet snapshot in COLUMNAR_FOLDER
+
+    One in-memory DuckDB database per process, queried through a cursor per
+    thread. The manifest (CURRENT) is re-read whenever the file changes, so
+    a sync run by another process is picked up on the next statement.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, 'CURRENT')
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the DuckDB connection without closing it (used after fork)"""
+        self._conn = None
+        self._local = threading.local()
+        self._manifest_key = None
+        self.manifest = None
+        # query id -> DuckDB error, for statements that stay on SQLite
+        self.unsupported = {}
+
+    def refresh(self):
+        """The current manifest with views pointing at its snapshot, or None"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._manifest_key:
+            return self.manifest
+
+        with self._lock:
+            if key != self._manifest_key:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                if self._conn is None:
+                    self._conn = _require_duckdb().connect(
+                        config={'default_null_order': 'nulls_first_on_asc_last_on_desc'})
+                    self._conn.execute(DUCKDB_MACROS)
+                snapshot = os.path.join(self.folder, manifest['snapshot'])
+                for table in manifest['tables']:
+                    files = os.path.join(snapshot, table, '*.parquet').replace("'", "''")
+                    self._conn.execute(
+                        f'CREATE OR REPLACE VIEW "{table}" AS SELECT * FROM read_parquet(\'{files}\')')
+                self.manifest = manifest
+                self._manifest_key = key
+        return self.manifest
+
+    def execute(self, sql, params=()):
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        return cursor.execute(sql, params)
+
+    def explain(self, sql, params=()):
+        return self.execute('EXPLAIN ' + sql, params).fetchall()[0][1].splitlines()
+
+    def stats(self):
+        manifest = self.manifest or {}
+        return {
+            'backend': ANALYTICS_BACKEND,
+            'snapshot': manifest.get('snapshot'),
+            'version': manifest.get('version'),
+            'synced_at': manifest.get('synced_at'),
+            'unsupported_queries': len(self.unsupported)
+        }
+
+
+columnar_store = ColumnarStore(COLUMNAR_FOLDER)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=columnar_store.reset)
+
+# SQL -> (tables it reads, DuckDB translation)
+_columnar_statements = {}
+
+
+def columnar_statement(query):
+    """The DuckDB translation of `query` if it should run there, else None"""
+    if ANALYTICS_BACKEND != 'duckdb':
+        return None
+    entry = _columnar_statements.get(query)
+    if entry is None:
+        entry = _columnar_statements[query] = (
+            referenced_tables(query), translate_to_duckdb(query))
+    tables, sql = entry
+    if not tables or not tables <= set(COLUMNAR_TABLES) \
+            or _query_id(query)[0] in columnar_store.unsupported:
+        return None
+
+    manifest = columnar_store.refresh()
+    with db_pool.connection() as conn:
+        version = columnar_source_version(conn)
+    if manifest is None or manifest['version'] != version:
+        schedule_columnar_sync()
+        return None
+    if not tables <= set(manifest['tables']):
+        return None
+    return sql
+
+
+def run_columnar(query, sql, params, fetch):
+    """fetch(cursor) for `sql` on DuckDB, or None to fall back to SQLite"""
+    duckdb = _require_duckdb()
+    try:
+        return fetch(columnar_store.execute(sql, params))
+    except duckdb.Error as e:
+        query_id = _query_id(query)[0]
+        # A missing file means a sync swapped snapshots mid-query; retry next time
+        if not isinstance(e, duckdb.IOException):
+            columnar_store.unsupported[query_id] = str(e)
+        app.logger.warning('DuckDB could not run query %s, using SQLite: %s', query_id, e)
+        return None
+
+
+def _duckdb_records(cursor):
+    """Rows as dicts, with DECIMAL values as floats like SQLite returns them"""
+    columns = [column[0] for column in cursor.description]
+    decimals = [column[0] for column in cursor.description
+                if str(column[1]).startswith('DECIMAL')]
+    records = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for record in records:
+        for name in decimals:
+            if record[name] is not None:
+                record[name] = float(record[name])
+    return records
+
+
+def _duckdb_columns(cursor):
+    """Columns, with DECIMAL values as floats like SQLite returns them"""
+    result = Columns.from_cursor(cursor)
+    for position, column in enumerate(cursor.description):
+        if str(column[1]).startswith('DECIMAL'):
+            result.values[position] = [
+                None if value is None else float(value) for value in result.values[position]]
+    return result
+
+
+def _duckdb_frame(cursor):
+    """DataFrame with the dtypes read_sql_query gives for the same result"""
+    df = cursor.df()
+    for name, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) \
+                and pd.api.types.is_integer_dtype(dtype):
+            df[name] = df[name].astype('float64' if df[name].isna().any() else 'int64')
     return df
 
+
+def sync_columnar_store(report=None):
+    """Write a Parquet snapshot of COLUMNAR_TABLES and make it current"""
+    duckdb = _require_duckdb()
+    start = time.perf_counter()
+    refresh_activity_window()
+
+    os.makedirs(COLUMNAR_FOLDER, exist_ok=True)
+    snapshot = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    snapshot_dir = os.path.join(COLUMNAR_FOLDER, snapshot)
+    tmp_dir = snapshot_dir + '.tmp'
+    writer = duckdb.connect()
+    tables = {}
+    try:
+        with db_pool.connection() as conn:
+            # One read transaction, so every table comes from the same point in time
+            conn.execute('BEGIN')
+            version = columnar_source_version(conn)
+            existing = [table for table in COLUMNAR_TABLES if _table_columns(conn, table)]
+            for position, table in enumerate(existing):
+                if report:
+                    report(position / len(existing), f'Writing {table}')
+                columns = _table_columns(conn, table)
+                select = ', '.join(f'TRY_CAST("{name}" AS {_duckdb_type(col_type)}) AS "{name}"'
+                                   for name, col_type, _ in columns)
+                table_dir = os.path.join(tmp_dir, table)
+                os.makedirs(table_dir)
+
+                order = COLUMNAR_SORT_KEYS.get(table)
+                order_by = f' ORDER BY "{order}"' if order in {c[0] for c in columns} else ''
+                chunks = pd.read_sql_query(f'SELECT * FROM "{table}"{order_by}', conn,
+                                           chunksize=COLUMNAR_ROWS_PER_FILE)
+                rows = part = 0
+                for chunk in chunks:
+                    rows += len(chunk)
+                    writer.register('chunk', chunk)
+                    path = os.path.join(table_dir, f'part-{part:05d}.parquet')
+                    writer.execute(f"COPY (SELECT {select} FROM chunk) TO '{path}' "
+                                   "(FORMAT PARQUET, COMPRESSION ZSTD)")
+                    writer.unregister('chunk')
+                    part += 1
+                if part == 0:
+                    # Empty table: a schema-only file keeps the view valid
+                    writer.register('chunk', pd.DataFrame(
+                        {name: pd.Series([], dtype=object) for name, _, _ in columns}))
+                    path = os.path.join(table_dir, 'part-00000.parquet')
+                    writer.execute(f"COPY (SELECT {select} FROM chunk) TO '{path}' (FORMAT PARQUET)")
+                    writer.unregister('chunk')
+                tables[table] = rows
+            conn.rollback()
+        os.rename(tmp_dir, snapshot_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        writer.close()
+
+    previous = columnar_store.refresh()
+    manifest = {
+        'snapshot': snapshot,
+        'previous': previous['snapshot'] if previous else None,
+        'version': version,
+        'tables': tables,
+        'synced_at': datetime.now().isoformat(timespec='seconds'),
+        'elapsed_seconds': round(time.perf_counter() - start, 2)
+    }
+    tmp_manifest = columnar_store.manifest_path + '.tmp'
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, columnar_store.manifest_path)
+
+    # Keep the previous snapshot for statements other processes still have open
+    for name in os.listdir(COLUMNAR_FOLDER):
+        path = os.path.join(COLUMNAR_FOLDER, name)
+        if os.path.isdir(path) and not name.endswith('.tmp') \
+                and name not in (snapshot, manifest['previous']):
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+def schedule_columnar_sync():
+    """Queue a sync_columnar job unless one is already queued or running"""
+    return submit_job_once('sync_columnar')
+
+
+@app.cli.command('sync-columnar')
+def sync_columnar_command():
+    """Write a fresh Parquet snapshot for ANALYTICS_BACKEND=duckdb"""
+    manifest = sync_columnar_store()
+    click.echo(f"Snapshot {manifest['snapshot']} written in {manifest['elapsed_seconds']}s")
+    for table, rows in manifest['tables'].items():
+        click.echo(f'  {table}: {rows:,} rows')
+
 # ============================================================================
-# API ENDPOINTS
+# LOCATION SHARDS
 # ============================================================================
 
+# SHARD_MODE=location keeps each club's rows in its own SQLite file under
+# DATA_DIR/shards, so a request for one location reads one small file and
+# the cross-location endpoints run their aggregates on every shard at once
+# and merge the partials. SHARD_MODE=franchise groups clubs into one shard
+# per franchise, using a JSON file (SHARD_GROUPS) mapping location names to
+# franchise names; unlisted locations get a shard of their own.
+#
+# Like the columnar store, shards are read-only copies of the main database,
+# which stays the system of record. Every write records the locations it
+# touched (location_changes), and a shard is current until one of its
+# locations changes after it was copied. Until then requests for it read the
+# main database, and a background sync_shards job copies the stale shards
+# again; the others are hard-linked into the new set unchanged. A new UTC
+# day (visits_30d moves) or a full reload makes the whole set stale.
+
+SHARD_MODES = ('', 'location', 'franchise')
+SHARD_MODE = os.environ.get('SHARD_MODE', '').lower()
+SHARD_FOLDER = os.path.join(DATA_DIR, 'shards')
+SHARD_GROUPS = os.environ.get(
+    'SHARD_GROUPS', os.path.join(DATA_DIR, 'franchises.json'))
+SHARD_WORKERS = int(os.environ.get('SHARD_WORKERS', 8))
+SHARD_POOL_SIZE = int(os.environ.get('SHARD_POOL_SIZE', 2))
+UNASSIGNED_SHARD = 'unassigned'
+
+# Rows copied into each shard from the attached main database (src).
+# {where} matches the shard's locations, held in temp.shard_locations.
+# Check-ins and activity follow the member's home location, so per-member
+# aggregates never span shards. Rows of unknown members, and members without
+# a location, go to the unassigned shard.
+SHARD_TABLES = {
+    'locations': 'SELECT * FROM src.locations',
+    'membership_types': 'SELECT * FROM src.membership_types',
+    'members': 'SELECT * FROM src.members m WHERE {where}',
+    'checkins': """
+        SELECT c.* FROM src.members m
+        JOIN src.checkins c ON c.member_id = m.member_id
+        WHERE {where}
+    """,
+    'member_activity': """
+        SELECT a.* FROM src.members m
+        JOIN src.member_activity a ON a.member_id = m.member_id
+        WHERE {where}
+    """,
+    'sales': 'SELECT * FROM src.sales WHERE {where}',
+    'leads': 'SELECT * FROM src.leads WHERE {where}'
+}
+SHARD_ORPHANS = """
+    SELECT * FROM src.{table}
+    WHERE member_id IS NULL OR member_id NOT IN (SELECT member_id FROM src.members)
+"""
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
-    })
 
+def shard_groups():
+    """Location name -> franchise name, from SHARD_GROUPS (SHARD_MODE=franchise only)"""
+    if SHARD_MODE != 'franchise' or not os.path.exists(SHARD_GROUPS):
+        return {}
+    with open(SHARD_GROUPS) as f:
+        return json.load(f)
 
-@app.route('/api/overview', methods=['GET'])
-def get_overview():
-    """Get high-level overview metrics"""
 
-    # chechkins
+def shard_name(location, groups):
+    """File-safe name of the shard holding `location` (a name or None)"""
+    if location is None:
+        return UNASSIGNED_SHARD
+    if SHARD_MODE == 'franchise':
+        location = groups.get(location, location)
+    return re.sub(r'[^a-z0-9]+', '-', str(location).lower()).strip('-') \
+        or UNASSIGNED_SHARD
 
-    checkins_query = """
-    SELECT
-        COUNT(*) as total_checkins,
-        COUNT(DISTINCT member_id) as unique_members_checked_in
-    FROM checkins
-"""
-    chechkins = query_db(checkins_query)
 
-    # Get active member counts
-    members_query = """
-    SELECT
-        COUNT(*) as total_members,
-        SUM(is_active) as active_members,
-        COUNT(CASE WHEN is_active = 0 THEN 1 END) as churned_members,
-        COUNT(CASE WHEN tour_scheduled = 1 THEN 1 END) as tours_scheduled,
-        COUNT(DISTINCT location) as total_locations
-    FROM members
-"""
+def _shard_condition(table, unassigned):
+    """WHERE clause selecting a shard's rows of `table` in SHARD_TABLES"""
+    if table in ('sales', 'leads'):
+        condition = 'location IN (SELECT name FROM temp.shard_locations)'
+        return condition + ' OR location IS NULL' if unassigned else condition
+    condition = 'm.location_id IN (SELECT location_id FROM temp.shard_locations)'
+    return condition + ' OR m.location_id IS NULL' if unassigned else condition
 
-    location_stats = query_db(members_query)
 
-    # Total stats
-    total_query = """
-        SELECT 
-            COUNT(*) as total_members,
-            SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_members,
-            ROUND(SUM(CASE WHEN is_active = 1 THEN COALESCE(monthly_fee, 39.99) ELSE 0 END), 2) as mrr
-        FROM members
+def _create_location_changes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS location_changes (
+            location TEXT PRIMARY KEY,
+            data_version INTEGER NOT NULL
+        )
+    """)
+
+
+@migration(11, 'per-location change versions for shards')
+def _migration_location_changes(conn):
+    _create_location_changes(conn)
+
+
+def member_locations(conn, member_ids):
+    """Home location names of `member_ids`, whose shards hold their rows
+
+    None stands for members with no location or no members row (the
+    unassigned shard). Returns None, meaning every location, when sharding
+    is off, so imports skip the lookup.
+    """
+    if not SHARD_MODE:
+        return None
+    member_ids = pd.Series(list(member_ids), dtype=object)
+    locations = {None} if member_ids.isna().any() else set()
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS shard_members (member_id PRIMARY KEY)')
+    conn.execute('DELETE FROM shard_members')
+    conn.executemany('INSERT OR IGNORE INTO shard_members VALUES (?)',
+                     [(m,) for m in member_ids.dropna().unique().tolist()])
+    locations.update(name for (name,) in conn.execute("""
+        SELECT DISTINCT l.name
+        FROM shard_members t
+        LEFT JOIN members m ON m.member_id = t.member_id
+        LEFT JOIN locations l ON l.location_id = m.location_id
+    """))
+    conn.execute('DELETE FROM shard_members')
+    return locations
+
+
+def record_location_changes(conn, locations):
+    """Stamp `locations` (names, None for no location) with the data version
+
+    locations=None marks every location.
     """
-    totals = query_db(total_query)[0]
+    version = int(get_state(conn, 'data_version', 0))
+    if locations is None:
+        set_state(conn, 'all_locations_changed', version)
+        return
+    conn.executemany(
+        'INSERT OR REPLACE INTO location_changes (location, data_version) VALUES (?, ?)',
+        [('' if location is None else str(location), version) for location in set(locations)])
 
-    # Calculate retention rate
-    retention_rate = (totals['active_members'] / totals['total_members']
-                      ) * 100 if totals['total_members'] > 0 else 0
 
-    # Recent month trends - handle both signup_date and join_date
-    monthly_signups = """
-        SELECT 
-            strftime('%Y-%m', COALESCE(signup_date, join_date)) as month,
-            COUNT(*) as signups
-        FROM members
-        WHERE COALESCE(signup_date, join_date) >= date('now', '-6 months')
-        GROUP BY month
-        ORDER BY month DESC
-        LIMIT 6
+def stale_shards(conn, manifest):
+    """Names of the shards in `manifest` to copy again, or None for all of them
+
+    A shard is stale once a location it holds changed after the data
+    version it was copied at; a location new since then adds its shard.
     """
-    signups_trend = query_db(monthly_signups)
+    groups = shard_groups()
+    if manifest is None or manifest['mode'] != SHARD_MODE \
+            or manifest.get('day') != _day_label(utc_day()) \
+            or manifest.get('groups') != groups:
+        return None
+    shards = manifest['shards']
+    everything = int(get_state(conn, 'all_locations_changed', 0))
+    stale = {name for name, shard in shards.items() if everything > shard['version']}
+    owners = {location or None: name for name, shard in shards.items()
+              for location in shard['locations']}
+    for location, version in conn.execute('SELECT location, data_version FROM location_changes'):
+        name = owners.get(location or None) or shard_name(location or None, groups)
+        if name not in shards or version > shards[name]['version']:
+            stale.add(name)
+    return stale
+
+
+def _write_shard(path, locations):
+    """Copy the rows of `locations` ({name: location_id}) into a new file"""
+    unassigned = None in locations
+    conn = sqlite3.connect(f'file:{quote(path)}', uri=True)
+    try:
+        # A half-written shard is deleted, so it needs no journal
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('ATTACH DATABASE ? AS src', (f'file:{quote(DB_PATH)}?mode=ro',))
+        conn.execute('CREATE TEMP TABLE shard_locations (location_id INTEGER, name TEXT)')
+
+        # One read transaction, so every table comes from the same point in time
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO temp.shard_locations VALUES (?, ?)',
+                         [(location_id, name) for name, location_id in locations.items()
+                          if name is not None])
+        schema = conn.execute("""
+            SELECT type, tbl_name, sql FROM src.sqlite_master
+            WHERE type IN ('table', 'index') AND sql IS NOT NULL
+        """).fetchall()
+        tables = {name: sql for kind, name, sql in schema
+                  if kind == 'table' and name in SHARD_TABLES}
+        rows = {}
+        for table, select in SHARD_TABLES.items():
+            if table not in tables:
+                continue
+            conn.execute(tables[table])
+            rows[table] = conn.execute(f'INSERT INTO main."{table}" ' + select.format(
+                where=_shard_condition(table, unassigned))).rowcount
+            if unassigned and table in ('checkins', 'member_activity'):
+                rows[table] += conn.execute(f'INSERT INTO main."{table}" ' +
+                                            SHARD_ORPHANS.format(table=table)).rowcount
+        for kind, table, sql in schema:
+            if kind == 'index' and table in tables:
+                conn.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
 
-    # Calculate churn rate
-    churn_query = """
-        SELECT 
-            COUNT(*) as recent_churns
-        FROM members
-        WHERE cancellation_date >= date('now', '-30 days')
+
+def sync_shards(report=None):
+    """Copy the stale shards out of the main database and make a new set current
+
+    Shards none of whose locations changed since the previous set are
+    hard-linked into the new one instead of being copied.
+    """
+    if SHARD_MODE not in SHARD_MODES[1:]:
+        raise ValueError('Set SHARD_MODE to location or franchise to use shards')
+    start = time.perf_counter()
+    refresh_activity_window()
+    day = _day_label(utc_day())
+    groups = shard_groups()
+    previous = shard_router.refresh()
+
+    with db_pool.connection() as conn:
+        # Read before copying, so a write racing the copy leaves its shard stale
+        version = int(get_state(conn, 'data_version', 0))
+        stale = stale_shards(conn, previous)
+        locations = dict(conn.execute('SELECT name, location_id FROM locations'))
+        for table in ('sales', 'leads'):
+            if _table_columns(conn, table):
+                for (name,) in conn.execute(f'SELECT DISTINCT location FROM "{table}"'):
+                    locations.setdefault(name, None)
+    locations.setdefault(None, None)
+
+    shards = {}
+    for name, location_id in locations.items():
+        shards.setdefault(shard_name(name, groups), {})[name] = location_id
+
+    os.makedirs(SHARD_FOLDER, exist_ok=True)
+    snapshot = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    snapshot_dir = os.path.join(SHARD_FOLDER, snapshot)
+    tmp_dir = snapshot_dir + '.tmp'
+    os.makedirs(tmp_dir)
+    kept, rows = {}, {}
+    try:
+        if stale is not None:
+            # Shard files are never written after a sync, so they can be shared
+            previous_dir = os.path.join(SHARD_FOLDER, previous['snapshot'])
+            for name, shard_locations in shards.items():
+                shard = previous['shards'].get(name)
+                if name in stale or shard is None \
+                        or set(shard['locations']) != set(shard_locations):
+                    continue
+                try:
+                    os.link(os.path.join(previous_dir, f'{name}.db'),
+                            os.path.join(tmp_dir, f'{name}.db'))
+                except OSError:
+                    continue
+                kept[name] = shard
+
+        # Each shard is a separate file, so they are written in parallel
+        with ThreadPoolExecutor(max_workers=SHARD_WORKERS,
+                                thread_name_prefix='churnlytics-shard-sync') as executor:
+            futures = {name: executor.submit(_write_shard, os.path.join(tmp_dir, f'{name}.db'),
+                                             shard_locations)
+                       for name, shard_locations in shards.items() if name not in kept}
+            for done, (name, future) in enumerate(futures.items()):
+                rows[name] = future.result()
+                if report:
+                    report((done + 1) / len(futures), f'Wrote shard {name}')
+        os.rename(tmp_dir, snapshot_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    manifest = {
+        'snapshot': snapshot,
+        'previous': previous['snapshot'] if previous else None,
+        'mode': SHARD_MODE,
+        'version': f'{version}:{day}',
+        'day': day,
+        'groups': groups,
+        'shards': {name: {'locations': sorted(shard_locations, key=lambda n: (n is not None, n or '')),
+                          'rows': kept[name]['rows'] if name in kept else rows[name],
+                          'version': kept[name]['version'] if name in kept else version}
+                   for name, shard_locations in shards.items()},
+        'copied': sorted(rows),
+        'synced_at': datetime.now().isoformat(timespec='seconds'),
+        'elapsed_seconds': round(time.perf_counter() - start, 2)
+    }
+    tmp_manifest = shard_router.manifest_path + '.tmp'
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, shard_router.manifest_path)
+
+    # Keep the previous set for requests other processes still have open
+    for name in os.listdir(SHARD_FOLDER):
+        path = os.path.join(SHARD_FOLDER, name)
+        if os.path.isdir(path) and not name.endswith('.tmp') \
+                and name not in (snapshot, manifest['previous']):
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+class ShardRouter:
+    """Connection pools for the current shard set in SHARD_FOLDER
+
+    The manifest (CURRENT) is re-read whenever the file changes, so a sync
+    run by another process is picked up on the next request.
     """
-    churn_result = query_db(churn_query)
-    recent_churns = churn_result[0]['recent_churns'] if churn_result else 0
 
-    churn_rate = (recent_churns / totals['active_members']) * \
-        100 if totals['active_members'] > 0 else 0
+    def __init__(self, folder):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, 'CURRENT')
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget pools and threads without closing them (used after fork)"""
+        self._manifest_key = None
+        self.manifest = None
+        # (shard name -> pool, location name -> shard name), swapped as a pair
+        self._routes = ({}, {})
+        self._stale = (None, None)
+        self._executor = None
+
+    def refresh(self):
+        """The current manifest with a pool per shard, or None"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._manifest_key:
+            return self.manifest
+
+        with self._lock:
+            if key != self._manifest_key:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                snapshot = os.path.join(self.folder, manifest['snapshot'])
+                pools = {name: ConnectionPool(os.path.join(snapshot, f'{name}.db'),
+                                              size=SHARD_POOL_SIZE, read_only=True)
+                         for name in manifest['shards']}
+                locations = {location: name for name, shard in manifest['shards'].items()
+                             for location in shard['locations']}
+                previous_pools = self._routes[0]
+                self._routes = (pools, locations)
+                self.manifest = manifest
+                self._manifest_key = key
+                for pool in previous_pools.values():
+                    pool.close_all()
+        return self.manifest
+
+    def stale(self, manifest):
+        """stale_shards() for `manifest`, cached until the data version moves"""
+        key = (manifest and manifest['snapshot'], current_data_version())
+        cached_key, stale = self._stale
+        if cached_key != key:
+            with db_pool.connection() as conn:
+                stale = stale_shards(conn, manifest)
+            self._stale = (key, stale)
+        return stale
+
+    def route(self, location=None):
+        """Pools of the shards holding `location` (all shards if None)
+
+        None when sharding is off or a shard needed is stale, in which case
+        the caller reads the main database; a stale shard queues a sync.
+        """
+        if not SHARD_MODE:
+            return None
+        manifest = self.refresh()
+        stale = self.stale(manifest)
+        if stale is not None:
+            pools, locations = self._routes
+            if location is None:
+                if not stale:
+                    return list(pools.values())
+            else:
+                name = locations.get(location) or shard_name(location, manifest['groups'])
+                if name not in stale:
+                    return [pools[name]] if name in pools else []
+        schedule_shard_sync()
+        return None
+
+    def fan_out(self, pools, query, params=()):
+        """Run `query` on each pool concurrently; one list of row dicts per pool
+
+        `pools` is a list from route(), or None for the main database.
+        """
+        caller = sys._getframe(1).f_code.co_name
+        backend = 'sqlite' if pools is None else 'shard'
+
+        def run(pool):
+            with pool.connection() as conn:
+                start = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                cursor.execute(query, params)
+                results = [dict(row) for row in cursor.fetchall()]
+                elapsed = time.perf_counter() - start
+            record_query(query, params, elapsed, len(results), caller, backend)
+            return results
+
+        if pools is None:
+            return [run(db_pool)]
+        if len(pools) < 2:
+            return [run(pool) for pool in pools]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=SHARD_WORKERS, thread_name_prefix='churnlytics-shard')
+            executor = self._executor
+        return list(executor.map(run, pools))
+
+    def stats(self):
+        manifest = self.manifest or {}
+        return {
+            'mode': SHARD_MODE or None,
+            'snapshot': manifest.get('snapshot'),
+            'version': manifest.get('version'),
+            'synced_at': manifest.get('synced_at'),
+            'shards': len(manifest.get('shards', {})),
+            'copied': len(manifest.get('copied', []))
+        }
 
-    return jsonify({
-        'total_members': totals['total_members'],
-        'active_members': totals['active_members'],
-        'mrr': totals['mrr'],
-        'retention_rate': round(retention_rate, 1),
-        'churn_rate': round(churn_rate, 2),
-        'location_stats': location_stats,
-        'signup_trend': signups_trend
-    })
 
+shard_router = ShardRouter(SHARD_FOLDER)
 
-@app.route('/api/churn-analysis', methods=['GET'])
-def get_churn_analysis():
-    """Get detailed churn analysis"""
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=shard_router.reset)
 
-    # Churn by membership type
-    churn_by_type = """
-        SELECT 
-            membership_type,
-            COUNT(*) as total,
-            SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) as churned,
-            ROUND(100.0 * SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) / COUNT(*), 1) as churn_rate
-        FROM members
-        GROUP BY membership_type
-        ORDER BY churn_rate DESC
-    """
-    churn_by_membership = query_db(churn_by_type)
 
-    # Churn by location
-    churn_by_location = """
-    SELECT 
-        location,
-        COUNT(*) as total_members,
-        SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) as churned,
-        ROUND(100.0 * SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) / COUNT(*), 1) as churn_rate
-    FROM members
-    GROUP BY location
-    ORDER BY total_members DESC
-    """
-    churn_by_loc = query_db(churn_by_location)
+def schedule_shard_sync():
+    """Queue a sync_shards job unless one is already queued or running"""
+    return submit_job_once('sync_shards')
 
-    # Churn by tenure - handle both signup_date and join_date
 
-    churn_by_tenure = """
-    SELECT 
-        CASE 
-            WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 3 THEN '0-3 months'
-            WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 6 THEN '3-6 months'
-            WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 12 THEN '6-12 months'
-            ELSE '12+ months'
-        END as tenure_group,
-        COUNT(*) as total,
-        SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) as churned,
-        ROUND(100.0 * SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) / COUNT(*), 1) as churn_rate
-    FROM members
-    GROUP BY tenure_group
-    ORDER BY 
-        CASE tenure_group
-            WHEN '0-3 months' THEN 1
-            WHEN '3-6 months' THEN 2
-            WHEN '6-12 months' THEN 3
-            ELSE 4
-        END
-"""
+@app.cli.command('sync-shards')
+def sync_shards_command():
+    """Copy the main database into per-location shards for SHARD_MODE"""
+    manifest = sync_shards()
+    click.echo(f"{len(manifest['copied'])} of {len(manifest['shards'])} shards copied to "
+               f"{manifest['snapshot']} in {manifest['elapsed_seconds']}s")
+    for name, shard in manifest['shards'].items():
+        state = 'copied' if name in manifest['copied'] else 'unchanged'
+        click.echo(f"  {name}: {shard['rows'].get('members', 0):,} members, "
+                   f"{shard['rows'].get('checkins', 0):,} check-ins ({state})")
+
+# ============================================================================
+# UTILITY FUNCTIONS
+# ============================================================================
 
-    churn_by_ten = query_db(churn_by_tenure)
 
-    # PT impact on retention
-    pt_impact = """
-        SELECT 
-            has_personal_training as has_pt,
-            COUNT(*) as total,
-            SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) as churned,
-            ROUND(100.0 * SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) / COUNT(*), 1) as churn_rate
-        FROM members
-        GROUP BY has_personal_training
+def utc_day():
+    """Today's UTC day number (days since 1970-01-01)"""
+    return int(time.time() // SECONDS_PER_DAY)
+
+
+def _day_label(day):
+    return (datetime(1970, 1, 1) + timedelta(days=day)).strftime('%Y-%m-%d')
+
+
+def _day_number(label):
+    return (datetime.strptime(label, '%Y-%m-%d') - datetime(1970, 1, 1)).days
+
+
+def query_db(query, params=(), caller=None):
+    """Execute SQL query and return results as list of dicts"""
+    caller = caller or sys._getframe(1).f_code.co_name
+    duckdb_sql = columnar_statement(query)
+    if duckdb_sql is not None:
+        start = time.perf_counter()
+        results = run_columnar(query, duckdb_sql, params, _duckdb_records)
+        if results is not None:
+            record_query(query, params, time.perf_counter() - start, len(results),
+                         caller, 'duckdb')
+            return results
+
+    with db_pool.connection() as conn:
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(query, params)
+        results = [dict(row) for row in cursor.fetchall()]
+        elapsed = time.perf_counter() - start
+    record_query(query, params, elapsed, len(results), caller)
+    return results
+
+
+def query_columns(query, params=(), caller=None):
+    """Execute SQL query and return results as Columns (no dict per row)"""
+    caller = caller or sys._getframe(1).f_code.co_name
+    duckdb_sql = columnar_statement(query)
+    if duckdb_sql is not None:
+        start = time.perf_counter()
+        results = run_columnar(query, duckdb_sql, params, _duckdb_columns)
+        if results is not None:
+            record_query(query, params, time.perf_counter() - start, len(results),
+                         caller, 'duckdb')
+            return results
+
+    with db_pool.connection() as conn:
+        start = time.perf_counter()
+        results = Columns.from_cursor(conn.execute(query, params))
+        elapsed = time.perf_counter() - start
+    record_query(query, params, elapsed, len(results), caller)
+    return results
+
+
+def query_to_df(query, params=(), caller=None):
+    """Execute SQL query and return as DataFrame"""
+    caller = caller or sys._getframe(1).f_code.co_name
+    duckdb_sql = columnar_statement(query)
+    if duckdb_sql is not None:
+        start = time.perf_counter()
+        df = run_columnar(query, duckdb_sql, params, _duckdb_frame)
+        if df is not None:
+            record_query(query, params, time.perf_counter() - start, len(df),
+                         caller, 'duckdb')
+            return df
+
+    with db_pool.connection() as conn:
+        start = time.perf_counter()
+        df = pd.read_sql_query(query, conn, params=params)
+        elapsed = time.perf_counter() - start
+    record_query(query, params, elapsed, len(df), caller)
+    return df
+
+
+# Handlers with several independent statements run them at once on a small
+# shared thread pool: sqlite3 releases the GIL while a statement runs, so
+# they overlap on separate pooled connections. The pool bounds how many
+# statements run concurrently per process. Statements are CPU-bound once
+# the database is in the page cache, so the default leaves one core for
+# the request thread; 0 (the default on a single core) runs them one after
+# another on the request thread.
+QUERY_WORKERS = int(os.environ.get(
+    'QUERY_WORKERS', min(4, (os.cpu_count() or 1) - 1)))
+
+_query_executor = None
+_query_executor_lock = threading.Lock()
+_query_worker = threading.local()
+
+
+def _reset_query_executor():
+    global _query_executor
+    _query_executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_query_executor)
+
+
+def _run_in_worker(call):
+    _query_worker.active = True
+    try:
+        return call()
+    finally:
+        _query_worker.active = False
+
+
+def query_pool():
+    """The shared query executor, or None where calls should run inline
+
+    Calls made from a query worker run inline, so nested use cannot
+    exhaust the pool. Submit work through _run_in_worker.
     """
-    pt_stats = query_db(pt_impact)
+    global _query_executor
+    if QUERY_WORKERS <= 0 or getattr(_query_worker, 'active', False):
+        return None
+    with _query_executor_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(
+                max_workers=QUERY_WORKERS, thread_name_prefix='churnlytics-query')
+        return _query_executor
 
-    # Monthly churn trend
-    monthly_churn = """
-        SELECT 
-            strftime('%Y-%m', cancellation_date) as month,
-            COUNT(*) as churned_count
-        FROM members
-        WHERE cancellation_date IS NOT NULL
-            AND cancellation_date >= date('now', '-12 months')
-        GROUP BY month
-        ORDER BY month
+
+def run_concurrently(*calls):
+    """Call each zero-argument callable, overlapping them; results in order
+
+    The first call runs on the calling thread and the rest on the query pool.
     """
-    churn_trend = query_db(monthly_churn)
+    executor = query_pool() if len(calls) > 1 else None
+    if executor is None:
+        return [call() for call in calls]
+    futures = [executor.submit(_run_in_worker, call) for call in calls[1:]]
+    first = calls[0]()
+    return [first] + [future.result() for future in futures]
+
+
+def query_all(*statements, columns=False):
+    """query_db (query_columns if `columns`) for each (query, params) pair
+    concurrently; results in order"""
+    caller = sys._getframe(1).f_code.co_name
+    fetch = query_columns if columns else query_db
+    return run_concurrently(*[
+        partial(fetch, query, params, caller) for query, params in statements])
 
-    return jsonify({
-        'churn_by_membership': churn_by_membership,
-        'churn_by_location': churn_by_loc,
-        'churn_by_tenure': churn_by_ten,
-        'pt_impact': pt_stats,
-        'monthly_trend': churn_trend
-    })
+# ============================================================================
+# MEMBER ACTIVITY ROLLUP
+# ============================================================================
 
+# One row per member with check-ins, maintained from the checkins table so
+# the at-risk, engagement and export endpoints never aggregate raw check-ins.
+# visits_30d is a rolling window; it is re-based once per day (see
+# refresh_activity_window) using the checkins(checkin_ts) index.
 
-@app.route('/api/at-risk-members', methods=['GET'])
-def get_at_risk_members():
-    """Identify members at high risk of churning"""
+MEMBER_ACTIVITY_SELECT = """
+    SELECT
+        member_id,
+        datetime(MIN(checkin_ts), 'unixepoch') as first_checkin,
+        datetime(MAX(checkin_ts), 'unixepoch') as last_checkin,
+        MAX(checkin_ts) as last_checkin_ts,
+        COUNT(*) as total_checkins,
+        SUM(CASE WHEN checkin_ts >= ? THEN 1 ELSE 0 END) as visits_30d
+    FROM checkins
+"""
 
-    # Get members with low recent engagement
-    query = """
-        WITH member_checkins AS (
-            SELECT
-                m.member_id,
-                m.location,
-                m.membership_type,
-                m.has_personal_training,
-                m.monthly_fee,
-                CAST((julianday('now') - julianday(COALESCE(m.signup_date, m.join_date))) / 30 AS REAL) as months_member,
-                COUNT(c.checkin_id) as total_checkins,
-                MAX(c.checkin_date) as last_checkin,
-                CAST((julianday('now') - julianday(MAX(c.checkin_date))) AS INTEGER) as days_since_checkin
-            FROM members m
-            LEFT JOIN checkins c ON m.member_id = c.member_id
-            WHERE m.is_active = 1
-            GROUP BY m.member_id
-        )
-        SELECT
-            member_id,
-            location,
-            membership_type,
-            has_personal_training,
-            COALESCE(monthly_fee, 39.99) as monthly_fee,
-            months_member,
-            total_checkins,
-            last_checkin,
-            days_since_checkin,
-            CASE
-                WHEN days_since_checkin > 30 OR days_since_checkin IS NULL THEN 'High'
-                WHEN days_since_checkin > 14 THEN 'Medium'
-                ELSE 'Low'
-            END as risk_level,
-            ROUND(total_checkins * 1.0 / NULLIF(months_member, 0), 1) as avg_checkins_per_month
-        FROM member_checkins
-        WHERE days_since_checkin > 7 OR days_since_checkin IS NULL
-        ORDER BY days_since_checkin DESC
-        LIMIT 100
-    """
+_activity_window_date = None
 
-    at_risk = query_db(query)
 
-    # Risk level summary
-    risk_summary = """
-        WITH member_checkins AS (
-            SELECT 
-                m.member_id,
-                MAX(c.checkin_date) as last_checkin,
-                CAST((julianday('now') - julianday(MAX(c.checkin_date))) AS INTEGER) as days_since_checkin
-            FROM members m
-            LEFT JOIN checkins c ON m.member_id = c.member_id
-            WHERE m.is_active = 1
-            GROUP BY m.member_id
+def _window_start(today, days=30):
+    """Epoch seconds of midnight `days` days before `today`"""
+    return (today - days) * SECONDS_PER_DAY
+
+
+def _create_member_activity(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS member_activity (
+            member_id TEXT PRIMARY KEY,
+            first_checkin TEXT,
+            last_checkin TEXT,
+            last_checkin_ts INTEGER,
+            total_checkins INTEGER NOT NULL DEFAULT 0,
+            visits_30d INTEGER NOT NULL DEFAULT 0
         )
-        SELECT 
-            CASE 
-                WHEN days_since_checkin > 30 OR days_since_checkin IS NULL THEN 'High'
-                WHEN days_since_checkin > 14 THEN 'Medium'
-                ELSE 'Low'
-            END as risk_level,
-            COUNT(*) as count
-        FROM member_checkins
-        GROUP BY risk_level
+    """)
+
+
+def rebuild_member_activity(conn):
+    """Recompute the rollup for every member from scratch; the caller commits"""
+    _create_member_activity(conn)
+    conn.execute('DELETE FROM member_activity')
+    today = utc_day()
+    conn.execute(f"""
+        INSERT INTO member_activity
+            (member_id, first_checkin, last_checkin, last_checkin_ts, total_checkins, visits_30d)
+        {MEMBER_ACTIVITY_SELECT}
+        WHERE member_id IS NOT NULL
+        GROUP BY member_id
+    """, (_window_start(today),))
+    set_state(conn, 'activity_window_date', _day_label(today))
+
+
+def update_member_activity(conn, member_ids):
+    """Recompute the rollup for the given members only (after an append)
+
+    Each member is re-aggregated through the checkins(member_id,
+    checkin_ts) index, so the cost tracks the members touched rather
+    than the size of the checkins table. Their member_risk rows follow.
+    Nothing is committed, so the rollup lands with the caller's import.
     """
-    summary = query_db(risk_summary)
+    member_ids = pd.Series(member_ids).dropna().unique().tolist()
+    if not member_ids:
+        return
+    conn.execute(
+        'CREATE TEMP TABLE IF NOT EXISTS touched_members (member_id PRIMARY KEY)')
+    conn.execute('DELETE FROM touched_members')
+    conn.executemany('INSERT OR IGNORE INTO touched_members VALUES (?)',
+                     [(m,) for m in member_ids])
+    conn.execute(f"""
+        INSERT OR REPLACE INTO member_activity
+            (member_id, first_checkin, last_checkin, last_checkin_ts, total_checkins, visits_30d)
+        {MEMBER_ACTIVITY_SELECT}
+        WHERE member_id IN (SELECT member_id FROM touched_members)
+        GROUP BY member_id
+    """, (_window_start(utc_day()),))
+    update_member_risk(conn, 'm.member_id IN (SELECT member_id FROM touched_members)')
+    conn.execute('DELETE FROM touched_members')
+
+
+def refresh_activity_window():
+    """Re-base visits_30d if the 30-day window has moved since the last run"""
+    global _activity_window_date
+
+    with db_pool.connection() as conn:
+        day = utc_day()
+        today = _day_label(day)
+        if _activity_window_date == today:
+            return
+        if get_state(conn, 'activity_window_date') != today:
+            conn.execute("""
+                UPDATE member_activity
+                SET visits_30d = (
+                    SELECT COUNT(*)
+                    FROM checkins c
+                    WHERE c.member_id = member_activity.member_id
+                        AND c.checkin_ts >= ?
+                )
+            """, (_window_start(day),))
+            set_state(conn, 'activity_window_date', today)
+            conn.commit()
+        _activity_window_date = today
+
+
+@migration(3, 'member activity rollup')
+def _migration_member_activity(conn):
+    # Filled by migration 7, once checkins has its typed columns
+    _create_member_activity(conn)
 
-    return jsonify({
-        'at_risk_members': at_risk,
-        'risk_summary': summary
-    })
+# ============================================================================
+# CHECK-IN CUBES
+# ============================================================================
 
+# Check-in counts pre-aggregated per (day, hour, location) and per (day,
+# location), so the engagement patterns read a few hundred cube rows for
+# any date range instead of bucketing every check-in. Days are UTC day
+# numbers and locations are location_id codes (0 for none). Counts are
+# additive: an append adds the buckets of its new rows and subtracts those
+# of the rows it replaces, without rereading the checkins table.
 
-@app.route('/api/engagement', methods=['GET'])
-def get_engagement_metrics():
-    """Get member engagement statistics"""
+WEEKDAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
 
-    # Check-in patterns by hour
-    hourly_pattern = """
-        SELECT 
-            CAST(strftime('%H', checkin_date) AS INTEGER) as hour,
-            COUNT(*) as checkin_count
+
+def _create_checkin_cubes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkin_hourly (
+            day INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            checkins INTEGER NOT NULL,
+            PRIMARY KEY (day, hour, location_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkin_daily (
+            day INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            dow INTEGER NOT NULL,
+            checkins INTEGER NOT NULL,
+            PRIMARY KEY (day, location_id)
+        )
+    """)
+
+
+def rebuild_checkin_cubes(conn):
+    """Recompute both cubes from the whole checkins table"""
+    _create_checkin_cubes(conn)
+    conn.execute('DELETE FROM checkin_hourly')
+    conn.execute('DELETE FROM checkin_daily')
+    conn.execute(f"""
+        INSERT INTO checkin_hourly (day, hour, location_id, checkins)
+        SELECT
+            checkin_ts / {SECONDS_PER_DAY} as day,
+            checkin_ts % {SECONDS_PER_DAY} / 3600 as hour,
+            COALESCE(location_id, 0) as location_id,
+            COUNT(*)
         FROM checkins
-        WHERE checkin_date >= date('now', '-30 days')
-        GROUP BY hour
-        ORDER BY hour
+        WHERE checkin_ts IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    # 1970-01-01 (day 0) was a Thursday; dow counts from Sunday = 0
+    conn.execute("""
+        INSERT INTO checkin_daily (day, location_id, dow, checkins)
+        SELECT day, location_id, (day + 4) % 7, SUM(checkins)
+        FROM checkin_hourly
+        GROUP BY day, location_id
+    """)
+
+
+def checkin_cube_counts(timestamps, location_ids):
+    """Check-ins per (day, hour, location_id) for rows with these values"""
+    rows = pd.DataFrame({
+        'checkin_ts': pd.Series(timestamps, dtype='float64').to_numpy(),
+        'location_id': pd.Series(location_ids, dtype='float64').fillna(0).to_numpy()
+    }).dropna()
+    ts = rows['checkin_ts'].astype('int64')
+    rows = pd.DataFrame({
+        'day': ts // SECONDS_PER_DAY,
+        'hour': ts % SECONDS_PER_DAY // 3600,
+        'location_id': rows['location_id'].astype('int64')
+    })
+    return rows.groupby(['day', 'hour', 'location_id'], sort=False).size()
+
+
+def apply_checkin_cube_counts(conn, counts):
+    """Add per-bucket check-in counts (negative to remove) to both cubes"""
+    counts = counts.groupby(level=['day', 'hour', 'location_id']).sum()
+    counts = counts[counts != 0]
+    if counts.empty:
+        return
+    daily = counts.groupby(level=['day', 'location_id']).sum()
+
+    conn.executemany("""
+        INSERT INTO checkin_hourly (day, hour, location_id, checkins) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, hour, location_id) DO UPDATE SET checkins = checkins + excluded.checkins
+    """, [(int(day), int(hour), int(location_id), int(n))
+          for (day, hour, location_id), n in counts.items()])
+    conn.executemany("""
+        INSERT INTO checkin_daily (day, location_id, dow, checkins) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, location_id) DO UPDATE SET checkins = checkins + excluded.checkins
+    """, [(int(day), int(location_id), (int(day) + 4) % 7, int(n))
+          for (day, location_id), n in daily.items()])
+    if (counts < 0).any():
+        conn.execute('DELETE FROM checkin_hourly WHERE checkins <= 0')
+        conn.execute('DELETE FROM checkin_daily WHERE checkins <= 0')
+
+
+@migration(6, 'check-in time cubes')
+def _migration_checkin_cubes(conn):
+    # Filled by migration 7, once checkins has its typed columns
+    _create_checkin_cubes(conn)
+
+
+@migration(7, 'typed date columns and location/membership type codes')
+def _migration_typed_columns(conn):
+    for index_name in ('idx_checkins_member_date', 'idx_checkins_date',
+                       'idx_members_active_location'):
+        conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+    for table in DERIVED_COLUMNS:
+        if _table_columns(conn, table):
+            apply_table_schema(conn, table)
+    conn.execute('DROP TABLE IF EXISTS member_activity')
+    rebuild_member_activity(conn)
+    conn.execute('DROP TABLE IF EXISTS checkin_hourly')
+    conn.execute('DROP TABLE IF EXISTS checkin_daily')
+    rebuild_checkin_cubes(conn)
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+
+# Analytics responses only change when data is imported. Every import bumps
+# the shared data_version counter in app_state, which invalidates cached
+# responses in every worker. The UTC date is part of the version too, since
+# the date('now', ...) windows move at midnight.
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_MAX_ENTRIES = int(
+    os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+class ResponseCache:
+    """In-process LRU cache of response bodies with TTL and a memory cap"""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._not_modified = 0
+
+    def get(self, key, version):
+        """Return (body, mimetype, etag, content coding) or None if missing, stale or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, stored_at, body, mimetype, etag, coding = entry
+                if entry_version == version and time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return body, mimetype, etag, coding
+                self._drop(key)
+            self._misses += 1
+            return None
+
+    def put(self, key, version, body, mimetype, coding=None):
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if len(body) > self.max_bytes:
+            return etag
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, time.monotonic(), body, mimetype, etag, coding)
+            self._bytes += len(body)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+        return etag
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[2])
+
+    def record_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0,
+                'evictions': self._evictions,
+                'not_modified': self._not_modified
+            }
+
+
+response_cache = ResponseCache()
+
+
+def current_data_version(conn=None):
+    """Data version counter plus today's UTC date, e.g. '12:2024-05-01'
+
+    Pass `conn` to read it inside that connection's transaction.
     """
-    hourly = query_db(hourly_pattern)
+    if conn is None:
+        with db_pool.connection() as conn:
+            counter = get_state(conn, 'data_version', '0')
+    else:
+        counter = get_state(conn, 'data_version', '0')
+    return f"{counter}:{datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
 
-    # Check-in patterns by day of week
-    daily_pattern = """
-        SELECT 
-            CASE CAST(strftime('%w', checkin_date) AS INTEGER)
-                WHEN 0 THEN 'Sunday'
-                WHEN 1 THEN 'Monday'
-                WHEN 2 THEN 'Tuesday'
-                WHEN 3 THEN 'Wednesday'
-                WHEN 4 THEN 'Thursday'
-                WHEN 5 THEN 'Friday'
-                WHEN 6 THEN 'Saturday'
-            END as day_of_week,
-            COUNT(*) as checkin_count
-        FROM checkins
-        WHERE checkin_date >= date('now', '-30 days')
-        GROUP BY day_of_week
-        ORDER BY CAST(strftime('%w', checkin_date) AS INTEGER)
+
+def bump_data_version(conn, locations=None):
+    """Invalidate cached analytics after imported rows are written
+
+    `locations` names the locations whose rows changed (see
+    record_location_changes); left out, every shard goes stale.
     """
-    daily = query_db(daily_pattern)
+    conn.execute("""
+        INSERT INTO app_state (key, value) VALUES ('data_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """)
+    record_location_changes(conn, locations)
+    response_cache.clear()
 
-    # Average visits per member by location
-    avg_visits = """
-        SELECT 
-            m.location,
-            COUNT(DISTINCT m.member_id) as active_members,
-            COUNT(c.checkin_id) as total_checkins,
-            ROUND(COUNT(c.checkin_id) * 1.0 / NULLIF(COUNT(DISTINCT m.member_id), 0), 1) as avg_visits_per_member
-        FROM members m
-        LEFT JOIN checkins c ON m.member_id = c.member_id 
-            AND c.checkin_date >= date('now', '-30 days')
-        WHERE m.is_active = 1
-        GROUP BY m.location
+
+def cached_response(view):
+    """Serve a GET endpoint from the response cache with ETag revalidation
+
+    The view returns its payload as a dict (or an error response). Each
+    format and content coding is rendered and cached on its own; plain JSON
+    keeps the (path, args) key the dashboard reads.
     """
-    location_engagement = query_db(avg_visits)
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            fmt = response_format()
+        except ResponseFormatError as e:
+            return jsonify({'error': str(e)}), 400
+        requested_coding = content_coding()
+        version = current_data_version()
+        key = (request.path, tuple(sorted((k, v) for k, v in request.args.items(multi=True)
+                                          if k != 'format')))
+        if (fmt, requested_coding) != ('json', None):
+            key += (fmt, requested_coding)
+
+        cached = response_cache.get(key, version)
+        if cached is None:
+            result = view(*args, **kwargs)
+            if not isinstance(result, dict):
+                return result
+            try:
+                body, mimetype = render_payload(result, fmt)
+            except ResponseFormatError as e:
+                return jsonify({'error': str(e)}), 400
+            coding = None
+            if requested_coding and len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+                body, coding = compress_body(body, requested_coding), requested_coding
+            etag = response_cache.put(key, version, body, mimetype, coding)
+        else:
+            body, mimetype, etag, coding = cached
+
+        response = app.response_class(body, mimetype=mimetype)
+        if coding:
+            response.headers['Content-Encoding'] = coding
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            response_cache.record_not_modified()
+        return response
+    return wrapper
 
-    # Engagement distribution
-    engagement_dist = """
-        WITH member_visits AS (
-            SELECT 
-                m.member_id,
-                COUNT(c.checkin_id) as visits_last_30d
-            FROM members m
-            LEFT JOIN checkins c ON m.member_id = c.member_id 
-                AND c.checkin_date >= date('now', '-30 days')
-            WHERE m.is_active = 1
-            GROUP BY m.member_id
-        )
+# ============================================================================
+# RESPONSE FORMATS
+# ============================================================================
+
+# Cached endpoints return their payload as a dict, and cached_response picks
+# the representation from the Accept header (or ?format=). JSON stays the
+# default. The columnar formats write every list of rows as {column: [values]}:
+# as JSON, as MessagePack, or as an Arrow IPC stream of one list (?table=,
+# default the longest). Query results are fetched into Columns, one list per
+# column straight from the cursor, so these formats never build a dict per
+# row. Bodies of RESPONSE_COMPRESS_MIN_BYTES or more are brotli or gzip
+# compressed when the client accepts it.
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# format -> (mimetype, other mimetypes accepted for it, module it needs)
+RESPONSE_FORMATS = {
+    'json': ('application/json', (), None),
+    'columns': ('application/vnd.churnlytics.columns+json', (), None),
+    'msgpack': ('application/msgpack', ('application/x-msgpack', 'application/vnd.msgpack'),
+                'msgpack'),
+    'arrow': ('application/vnd.apache.arrow.stream', (), 'pyarrow')
+}
+# content coding -> module it needs, in order of preference
+CONTENT_CODINGS = {'br': 'brotli', 'gzip': None}
+
+_installed_modules = {}
+
+
+class ResponseFormatError(ValueError):
+    """Raised for a ?format= or ?table= the response can't be rendered in"""
+
+
+class Columns:
+    """A result set held as one list per column instead of a dict per row
+
+    jsonify() renders it as the usual list of row objects; the columnar
+    response formats write the lists as they are.
+    """
+
+    def __init__(self, names, values):
+        self.names = list(names)
+        self.values = [list(column) for column in values]
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        return cls(names, zip(*rows) if rows else [[] for _ in names])
+
+    @classmethod
+    def from_frame(cls, df):
+        """Plain Python scalars, with None for NaN"""
+        return cls(df.columns, (
+            [None if isinstance(v, float) and v != v else v for v in df[name].tolist()]
+            for name in df.columns))
+
+    def __len__(self):
+        return len(self.values[0]) if self.values else 0
+
+    def __getitem__(self, name):
+        return self.values[self.names.index(name)]
+
+    def head(self, n):
+        return Columns(self.names, (column[:n] for column in self.values))
+
+    def drop(self, name):
+        position = self.names.index(name)
+        return Columns(self.names[:position] + self.names[position + 1:],
+                       self.values[:position] + self.values[position + 1:])
+
+    def replace(self, name, new_name, values):
+        """Swap a column for `values` under `new_name`, in place"""
+        position = self.names.index(name)
+        self.names[position] = new_name
+        self.values[position] = list(values)
+
+    def rows(self):
+        return [dict(zip(self.names, row)) for row in zip(*self.values)]
+
+
+class ColumnsJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, rendering Columns as a list of row objects"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Columns):
+            return o.rows()
+        return DefaultJSONProvider.default(o)
+
+
+app.json = ColumnsJSONProvider(app)
+
+
+def _installed(module):
+    if module not in _installed_modules:
+        _installed_modules[module] = importlib.util.find_spec(module) is not None
+    return _installed_modules[module]
+
+
+def response_format():
+    """Format name from ?format= or the Accept header (JSON if nothing matches)"""
+    requested = request.args.get('format')
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise ResponseFormatError(
+                f'format must be one of: {", ".join(RESPONSE_FORMATS)}')
+        module = RESPONSE_FORMATS[requested][2]
+        if module and not _installed(module):
+            raise ResponseFormatError(f'{requested} responses need the {module} package')
+        return requested
+
+    offered = {}
+    for name, (mimetype, aliases, module) in RESPONSE_FORMATS.items():
+        if module is None or _installed(module):
+            offered.update((accepted, name) for accepted in (mimetype, *aliases))
+    return offered[request.accept_mimetypes.best_match(list(offered), 'application/json')]
+
+
+def content_coding():
+    """Best content coding the client accepts, or None for identity"""
+    codings = [coding for coding, module in CONTENT_CODINGS.items()
+               if module is None or _installed(module)]
+    best = request.accept_encodings.best_match(codings)
+    return best if best and request.accept_encodings[best] > 0 else None
+
+
+def _is_table(value):
+    return isinstance(value, Columns) or (
+        isinstance(value, list) and bool(value) and all(isinstance(row, dict) for row in value))
+
+
+def columnar(value):
+    """`value` with every list of rows turned into {column: [values]}"""
+    if isinstance(value, Columns):
+        return dict(zip(value.names, value.values))
+    if isinstance(value, dict):
+        return {key: columnar(item) for key, item in value.items()}
+    if _is_table(value):
+        names = list(dict.fromkeys(name for row in value for name in row))
+        return {name: [columnar(row.get(name)) for row in value] for name in names}
+    return value
+
+
+def _arrow_stream(payload):
+    """One list of the payload as an Arrow IPC stream; the rest goes in its metadata"""
+    import pyarrow as pa
+
+    tables = [key for key, value in payload.items() if _is_table(value)]
+    name = request.args.get('table') or max(
+        tables, key=lambda key: len(payload[key]), default=None)
+    if name not in tables:
+        raise ResponseFormatError(
+            f'table must be one of: {", ".join(tables)}' if tables
+            else 'This response has no table to send as Arrow')
+    rest = {key: value for key, value in payload.items() if key != name}
+    table = pa.table(columnar(payload[name]))
+    table = table.replace_schema_metadata({
+        'table': name,
+        'payload': app.json.dumps(columnar(rest))
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render_payload(payload, fmt):
+    """(body, mimetype) of a payload dict in response format `fmt`"""
+    mimetype = RESPONSE_FORMATS[fmt][0]
+    if fmt == 'json':
+        body = app.json.response(payload).get_data()
+    elif fmt == 'columns':
+        body = app.json.dumps(columnar(payload)).encode()
+    elif fmt == 'msgpack':
+        import msgpack
+        body = msgpack.packb(columnar(payload), default=app.json.default)
+    else:
+        body = _arrow_stream(payload)
+    return body, mimetype
+
+
+def compress_body(body, coding):
+    """`body` in content coding `coding`"""
+    if coding == 'br':
+        import brotli
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+# ============================================================================
+# MEMBER AGGREGATES
+# ============================================================================
+
+# The overview, churn and location endpoints all break the same members
+# table down by a handful of dimensions. Rather than one GROUP BY scan per
+# breakdown, the table is loaded once per data version into integer-coded
+# arrays, reduced to a small cube (type x location x tenure x PT) with one
+# bincount per measure, and every breakdown is summed out of that cube.
+
+DEFAULT_MONTHLY_FEE = 39.99
+TENURE_GROUPS = ['0-3 months', '3-6 months', '6-12 months', '12+ months']
+
+# Columns of the per-member measures matrix
+MEASURES = ['total', 'churned', 'active', 'mrr', 'pt_members', 'tours_scheduled']
+
+_member_frame_cache = {'version': None, 'frame': None}
+_member_frame_lock = threading.Lock()
+
+
+def _day_to_month(days):
+    """Day numbers -> datetime64[M] (NaT where NaN)"""
+    return pd.to_datetime(days, unit='D').to_numpy().astype('datetime64[M]')
+
+
+def load_member_frame():
+    """Load members as integer codes and numeric measures
+
+    Dates are the typed day-number columns, so nothing is parsed here.
+    Locations and membership types are read as their lookup codes and
+    labelled from the lookup tables.
+    """
+    with db_pool.connection() as conn:
+        columns = {name for name, _, _ in _table_columns(conn, 'members')}
+    tour_column = 'tour_scheduled' if 'tour_scheduled' in columns else 'NULL'
+
+    df = query_to_df(f"""
+        SELECT
+            location_id,
+            membership_type_id,
+            has_personal_training,
+            is_active,
+            monthly_fee,
+            {tour_column} as tour_scheduled,
+            signup_day,
+            cancel_day
+        FROM members
+    """)
+    names = {}
+    for lookup, id_column in LOOKUP_TABLES.items():
+        rows = query_to_df(f'SELECT {id_column}, name FROM {lookup}')
+        names[lookup] = dict(zip(rows[id_column], rows['name']))
+
+    active = (df['is_active'] == 1).to_numpy()
+    fee = df['monthly_fee'].fillna(DEFAULT_MONTHLY_FEE).to_numpy(dtype=float)
+    measures = np.column_stack([
+        np.ones(len(df)),
+        (df['is_active'] == 0).to_numpy(),
+        active,
+        np.where(active, fee, 0.0),
+        (df['has_personal_training'] == 1).to_numpy(),
+        (df['tour_scheduled'] == 1).to_numpy()
+    ]).astype(float)
+
+    frame = {
+        'measures': measures,
+        'is_active_sum': df['is_active'].sum(min_count=1),
+        'signup_day': df['signup_day'].to_numpy(dtype=float),
+        'cancel_day': df['cancel_day'].to_numpy(dtype=float)
+    }
+    frame['signup_month'] = _day_to_month(frame['signup_day'])
+    frame['cancel_month'] = _day_to_month(frame['cancel_day'])
+    for name, column, lookup in [('membership_type', 'membership_type_id', 'membership_types'),
+                                 ('location', 'location_id', 'locations')]:
+        codes, ids = pd.factorize(df[column], use_na_sentinel=False)
+        frame[name] = codes, [names[lookup].get(i) for i in ids]
+    frame['has_pt'] = pd.factorize(df['has_personal_training'], use_na_sentinel=False)
+    return frame
+
+
+def member_frame():
+    """The member frame for the current data version (loaded on first use)"""
+    version = current_data_version()
+    with _member_frame_lock:
+        if _member_frame_cache['version'] != version:
+            _member_frame_cache['frame'] = load_member_frame()
+            _member_frame_cache['version'] = version
+        return _member_frame_cache['frame']
+
+
+def _sql_round(values, digits):
+    """Round half away from zero, like SQLite's ROUND"""
+    scale = 10 ** digits
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+def _records(df):
+    """DataFrame -> list of dicts with plain Python scalars and None for NaN"""
+    return Columns.from_frame(df).rows()
+
+
+def _label(value):
+    return None if pd.isna(value) else value
+
+
+def _flag_label(value):
+    return None if pd.isna(value) else int(value)
+
+
+def _churn_rows(key, labels, sums, total_name='total'):
+    """One row per group present in `sums` (a MEASURES x groups matrix)"""
+    present = sums[0] > 0
+    total = sums[0][present]
+    churned = sums[1][present]
+    return pd.DataFrame({
+        key: [labels[i] for i in np.flatnonzero(present)],
+        total_name: total.astype(int),
+        'churned': churned.astype(int),
+        'churn_rate': _sql_round(100.0 * churned / total, 1)
+    })
+
+
+def _month_counts(months, value_name):
+    labels, counts = np.unique(months[~np.isnat(months)], return_counts=True)
+    return pd.DataFrame({
+        'month': np.datetime_as_string(labels, unit='M'),
+        value_name: counts
+    })
+
+
+def breakdown_windows():
+    """The current (fractional) day and the date('now', ...) window
+    boundaries as day numbers, taken from SQLite's calendar so month
+    arithmetic matches SQL"""
+    return query_db(f"""
+        SELECT
+            julianday('now') - {UNIX_EPOCH_JULIANDAY} as day,
+            julianday(date('now', '-30 days')) - {UNIX_EPOCH_JULIANDAY} as days_30,
+            julianday(date('now', '-6 months')) - {UNIX_EPOCH_JULIANDAY} as months_6,
+            julianday(date('now', '-12 months')) - {UNIX_EPOCH_JULIANDAY} as months_12
+    """)[0]
+
+
+def member_breakdowns(frame, now=None):
+    """Compute every member breakdown in one pass over `frame`
+
+    `now` is a dict of day numbers from breakdown_windows().
+    """
+    if now is None:
+        now = breakdown_windows()
+
+    type_codes, type_labels = frame['membership_type']
+    location_codes, location_labels = frame['location']
+    pt_codes, pt_labels = frame['has_pt']
+    type_labels = [_label(v) for v in type_labels]
+    location_labels = [_label(v) for v in location_labels]
+    pt_labels = [_flag_label(v) for v in pt_labels]
+
+    with np.errstate(invalid='ignore'):
+        tenure_months = np.trunc((now['day'] - frame['signup_day']) / 30)
+    tenure_codes = np.select(
+        [tenure_months < 3, tenure_months < 6, tenure_months < 12], [0, 1, 2], 3)
+
+    # One cube cell per (type, location, tenure, pt) combination
+    shape = (len(type_labels), len(location_labels),
+             len(TENURE_GROUPS), len(pt_labels))
+    cells = np.ravel_multi_index(
+        (type_codes, location_codes, tenure_codes, pt_codes), shape) \
+        if len(tenure_codes) else np.zeros(0, dtype=int)
+    measures = frame['measures']
+    cube = np.stack([
+        np.bincount(cells, weights=measures[:, i], minlength=int(np.prod(shape)))
+        for i in range(len(MEASURES))
+    ]).reshape((len(MEASURES),) + shape)
+
+    by_type = _churn_rows('membership_type', type_labels, cube.sum(axis=(2, 3, 4)))
+    by_type = by_type.sort_values('churn_rate', ascending=False, kind='stable')
+
+    location_sums = cube.sum(axis=(1, 3, 4))
+    churn_by_location = _churn_rows(
+        'location', location_labels, location_sums, 'total_members')
+    churn_by_location = churn_by_location.sort_values(
+        'total_members', ascending=False, kind='stable')
+
+    churn_by_tenure = _churn_rows(
+        'tenure_group', TENURE_GROUPS, cube.sum(axis=(1, 2, 4)))
+
+    pt_order = sorted(range(len(pt_labels)),
+                      key=lambda i: (pt_labels[i] is not None, pt_labels[i] or 0))
+    pt_impact = _churn_rows(
+        'has_pt', [pt_labels[i] for i in pt_order], cube.sum(axis=(1, 2, 3))[:, pt_order])
+
+    cancel_day, signup_day = frame['cancel_day'], frame['signup_day']
+    with np.errstate(invalid='ignore'):
+        monthly_trend = _month_counts(
+            frame['cancel_month'][cancel_day >= now['months_12']], 'churned_count')
+        signup_trend = _month_counts(
+            frame['signup_month'][signup_day >= now['months_6']], 'signups')
+        recent_churns = int((cancel_day >= now['days_30']).sum())
+    signup_trend = signup_trend.iloc[::-1].head(6)
+
+    location_order = sorted(
+        np.flatnonzero(location_sums[0] > 0),
+        key=lambda i: (location_labels[i] is not None, location_labels[i] or ''))
+    total, active, mrr, pt_members = (
+        location_sums[MEASURES.index(name)][location_order]
+        for name in ['total', 'active', 'mrr', 'pt_members'])
+    location_metrics = pd.DataFrame({
+        'location': [location_labels[i] for i in location_order],
+        'total_members': total.astype(int),
+        'active_members': active.astype(int),
+        'retention_rate': _sql_round(100.0 * active / total, 1),
+        'mrr': mrr.round(2),
+        'pt_members': pt_members.astype(int),
+        'pt_attachment_rate': _sql_round(100.0 * pt_members / total, 1)
+    })
+
+    totals = dict(zip(MEASURES, cube.reshape(len(MEASURES), -1).sum(axis=1)))
+    active_sum = frame['is_active_sum']
+    return {
+        'totals': {
+            'total_members': int(totals['total']),
+            'active_members': int(totals['active']),
+            'churned_members': int(totals['churned']),
+            'is_active_sum': None if pd.isna(active_sum) else int(active_sum),
+            'tours_scheduled': int(totals['tours_scheduled']),
+            'total_locations': sum(1 for i in np.flatnonzero(location_sums[0] > 0)
+                                   if location_labels[i] is not None),
+            'mrr': round(float(totals['mrr']), 2),
+            'recent_churns': recent_churns
+        },
+        'churn_by_membership': _records(by_type),
+        'churn_by_location': _records(churn_by_location),
+        'churn_by_tenure': _records(churn_by_tenure),
+        'pt_impact': _records(pt_impact),
+        'monthly_trend': _records(monthly_trend),
+        'signup_trend': _records(signup_trend),
+        'location_metrics': _records(location_metrics)
+    }
+
+# ============================================================================
+# CHURN SCORING
+# ============================================================================
+
+# A random forest trained offline (flask train-churn-model) scores every
+# active member in one predict_proba call. Scores are written to
+# member_scores, which the at-risk endpoint and export read, so requests
+# never touch the model. Scores are stamped with the data version they were
+# computed for; a stale stamp queues a background rescore.
+#
+# Training features are taken as of each member's cancellation date for
+# churned members and as of today for active ones, so recency reflects the
+# period before churn rather than the time since.
+
+CHURN_FEATURES = [
+    'tenure_days', 'total_checkins', 'visits_30d', 'visits_per_month',
+    'days_since_checkin', 'has_personal_training', 'monthly_fee',
+    'membership_type', 'location'
+]
+CHURN_CATEGORICAL = ['membership_type', 'location']
+# Enough of each class that the stratified 20% holdout holds at least one
+CHURN_MIN_TRAINING_ROWS = 50
+CHURN_MIN_CLASS_ROWS = 5
+
+# Days are day numbers and timestamps epoch seconds (see DERIVED_COLUMNS).
+# The training query takes the current epoch second; scoring rows are
+# given ref_day (now) in Python.
+CHURN_TRAINING_QUERY = f"""
+    WITH ref AS (
+        SELECT
+            member_id,
+            CASE WHEN is_active = 0 THEN (cancel_day + 1) * {SECONDS_PER_DAY}
+                 ELSE ? END as ref_ts
+        FROM members
+        WHERE is_active = 1 OR cancel_day IS NOT NULL
+    ),
+    visits AS (
+        SELECT
+            c.member_id,
+            COUNT(*) as total_checkins,
+            SUM(CASE WHEN c.checkin_ts >= (CAST(r.ref_ts / {SECONDS_PER_DAY} AS INTEGER) - 30) * {SECONDS_PER_DAY}
+                THEN 1 ELSE 0 END) as visits_30d,
+            MAX(c.checkin_ts) / {SECONDS_PER_DAY}.0 as last_day
+        FROM checkins c
+        JOIN ref r ON r.member_id = c.member_id
+        WHERE c.checkin_ts < r.ref_ts
+        GROUP BY c.member_id
+    )
+    SELECT
+        m.member_id,
+        m.membership_type,
+        m.location,
+        m.has_personal_training,
+        m.monthly_fee,
+        m.is_active,
+        m.signup_day,
+        r.ref_ts / {SECONDS_PER_DAY}.0 as ref_day,
+        v.total_checkins,
+        v.visits_30d,
+        v.last_day
+    FROM members m
+    JOIN ref r ON r.member_id = m.member_id
+    LEFT JOIN visits v ON v.member_id = m.member_id
+"""
+
+CHURN_SCORING_QUERY = f"""
+    SELECT
+        m.member_id,
+        m.membership_type,
+        m.location,
+        m.has_personal_training,
+        m.monthly_fee,
+        m.signup_day,
+        a.total_checkins,
+        a.visits_30d,
+        a.last_checkin_ts / {SECONDS_PER_DAY}.0 as last_day
+    FROM members m
+    LEFT JOIN member_activity a ON m.member_id = a.member_id
+    WHERE m.is_active = 1
+"""
+
+_churn_model_cache = {'key': None, 'model': None}
+_churn_model_lock = threading.Lock()
+
+
+@migration(5, 'member churn scores')
+def _migration_member_scores(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS member_scores (
+            member_id TEXT PRIMARY KEY,
+            churn_probability REAL NOT NULL,
+            risk_level TEXT NOT NULL,
+            scored_at TEXT NOT NULL,
+            model_trained_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_member_scores_probability
+        ON member_scores (churn_probability)
+    """)
+
+
+def churn_feature_matrix(df, categories):
+    """Feature matrix (columns in CHURN_FEATURES order) for a member frame
+
+    `categories` maps each categorical column to the classes seen in
+    training; unseen values are coded -1.
+    """
+    ref = df['ref_day'].to_numpy(dtype=float)
+    tenure = np.nan_to_num(np.clip(ref - df['signup_day'].to_numpy(dtype=float), 0, None))
+    total = df['total_checkins'].fillna(0).to_numpy(dtype=float)
+    recency = ref - df['last_day'].to_numpy(dtype=float)
+
+    features = {
+        'tenure_days': tenure,
+        'total_checkins': total,
+        'visits_30d': df['visits_30d'].fillna(0).to_numpy(dtype=float),
+        'visits_per_month': total / np.maximum(tenure / 30, 1),
+        # Members who never checked in have been absent their whole tenure
+        'days_since_checkin': np.where(np.isnan(recency), tenure, recency),
+        'has_personal_training': (df['has_personal_training'] == 1).to_numpy(dtype=float),
+        'monthly_fee': df['monthly_fee'].fillna(DEFAULT_MONTHLY_FEE).to_numpy(dtype=float)
+    }
+    for name in CHURN_CATEGORICAL:
+        values = df[name].fillna('Unknown').astype(str)
+        features[name] = pd.Categorical(values, categories=categories[name]).codes.astype(float)
+    return np.column_stack([features[name] for name in CHURN_FEATURES])
+
+
+def _risk_levels(probability):
+    return np.where(probability >= CHURN_HIGH_RISK, 'High',
+                    np.where(probability >= CHURN_MEDIUM_RISK, 'Medium', 'Low'))
+
+
+def train_churn_model(n_estimators=200, random_state=42):
+    """Fit the churn model on current data and save it to CHURN_MODEL_PATH"""
+    df = query_to_df(CHURN_TRAINING_QUERY, (int(time.time()),))
+    labels = (df['is_active'] == 0).to_numpy(dtype=int)
+    if (len(df) < CHURN_MIN_TRAINING_ROWS
+            or np.bincount(labels, minlength=2).min() < CHURN_MIN_CLASS_ROWS):
+        raise ValueError(
+            f'Need at least {CHURN_MIN_TRAINING_ROWS} members, including '
+            f'{CHURN_MIN_CLASS_ROWS} active and {CHURN_MIN_CLASS_ROWS} churned ones, to train')
+
+    categories = {
+        name: LabelEncoder().fit(df[name].fillna('Unknown').astype(str)).classes_.tolist()
+        for name in CHURN_CATEGORICAL
+    }
+    features = churn_feature_matrix(df, categories)
+
+    def forest():
+        return RandomForestClassifier(
+            n_estimators=n_estimators, max_depth=12, min_samples_leaf=20,
+            class_weight='balanced', n_jobs=-1, random_state=random_state)
+
+    # Holdout AUC for the report, then refit on everything for the artifact
+    X_train, X_test, y_train, y_test = train_test_split(
+        features, labels, test_size=0.2, stratify=labels, random_state=random_state)
+    holdout = forest().fit(X_train, y_train)
+    auc = roc_auc_score(y_test, holdout.predict_proba(X_test)[:, 1])
+
+    model = forest().fit(features, labels)
+    artifact = {
+        'model': model,
+        'features': CHURN_FEATURES,
+        'categories': categories,
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'training_rows': len(df),
+        'churn_rate': round(float(labels.mean()), 4),
+        'holdout_auc': round(float(auc), 4),
+        'feature_importance': dict(zip(
+            CHURN_FEATURES, np.round(model.feature_importances_, 4).tolist()))
+    }
+
+    os.makedirs(os.path.dirname(CHURN_MODEL_PATH), exist_ok=True)
+    tmp_path = CHURN_MODEL_PATH + '.tmp'
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, CHURN_MODEL_PATH)
+    return {key: value for key, value in artifact.items() if key != 'model'}
+
+
+def load_churn_model():
+    """The saved model artifact (reloaded when the file changes), or None"""
+    try:
+        stat = os.stat(CHURN_MODEL_PATH)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _churn_model_lock:
+        if _churn_model_cache['key'] != key:
+            _churn_model_cache['model'] = joblib.load(CHURN_MODEL_PATH)
+            _churn_model_cache['key'] = key
+        return _churn_model_cache['model']
+
+
+def score_members():
+    """Score every active member and replace member_scores; None without a model"""
+    artifact = load_churn_model()
+    if artifact is None:
+        return None
+
+    start = time.perf_counter()
+    version = current_data_version()
+    refresh_activity_window()
+    df = query_to_df(CHURN_SCORING_QUERY)
+    df['ref_day'] = time.time() / SECONDS_PER_DAY
+
+    model = artifact['model']
+    if len(df):
+        features = churn_feature_matrix(df, artifact['categories'])
+        probability = model.predict_proba(features)[:, list(model.classes_).index(1)]
+    else:
+        probability = np.empty(0)
+    probability = np.round(probability, 4)
+    risk = _risk_levels(probability)
+    scored_at = datetime.now().isoformat(timespec='seconds')
+
+    with db_pool.connection() as conn:
+        conn.execute('DELETE FROM member_scores')
+        conn.executemany(
+            'INSERT INTO member_scores VALUES (?, ?, ?, ?, ?)',
+            zip(df['member_id'].tolist(), probability.tolist(), risk.tolist(),
+                [scored_at] * len(df), [artifact['trained_at']] * len(df)))
+        rebuild_member_risk(conn)
+        set_state(conn, 'scores_version', version)
+        set_state(conn, 'scores_updated_at', scored_at)
+        conn.commit()
+    response_cache.clear()
+
+    levels, counts = np.unique(risk, return_counts=True)
+    return {
+        'members_scored': len(df),
+        'risk_levels': dict(zip(levels.tolist(), counts.tolist())),
+        'model_trained_at': artifact['trained_at'],
+        'elapsed_seconds': round(time.perf_counter() - start, 2)
+    }
+
+
+def scores_available():
+    with db_pool.connection() as conn:
+        return conn.execute('SELECT EXISTS (SELECT 1 FROM member_scores)').fetchone()[0] == 1
+
+
+def schedule_scoring():
+    """Queue a rescore when a model exists and scores predate the data version"""
+    if not os.path.exists(CHURN_MODEL_PATH):
+        return None
+    version = current_data_version()
+    with db_pool.connection() as conn:
+        if get_state(conn, 'scores_version') == version:
+            return None
+    return submit_job_once('score_members')
+
+
+@app.cli.command('train-churn-model')
+@click.option('--trees', default=200, show_default=True, help='Number of trees in the forest')
+def train_churn_model_command(trees):
+    """Train the churn model on current data and rescore active members"""
+    info = train_churn_model(n_estimators=trees)
+    click.echo(f"Trained on {info['training_rows']:,} members "
+               f"(churn rate {info['churn_rate']:.1%}, holdout AUC {info['holdout_auc']:.3f})")
+    for name, weight in sorted(info['feature_importance'].items(), key=lambda item: -item[1]):
+        click.echo(f'  {name:<22} {weight:.3f}')
+    click.echo(f'Saved {os.path.abspath(CHURN_MODEL_PATH)}')
+
+    stats = score_members()
+    click.echo(f"Scored {stats['members_scored']:,} active members: {stats['risk_levels']}")
+
+
+@app.cli.command('score-members')
+def score_members_command():
+    """Rescore all active members with the saved churn model"""
+    stats = score_members()
+    if stats is None:
+        raise click.ClickException(
+            'No churn model found; run `flask --app app train-churn-model` first')
+    click.echo(f"Scored {stats['members_scored']:,} active members "
+               f"in {stats['elapsed_seconds']}s: {stats['risk_levels']}")
+
+# ============================================================================
+# AT-RISK INDEX
+# ============================================================================
+
+# member_risk has one row per active member with just the columns the
+# at-risk list filters and sorts on. Each sort key is indexed together with
+# member_id, so a page is an index range scan starting right after the
+# previous page's last row (a keyset cursor) and page 500 costs what page 1
+# does. Rows are refreshed by the writes that change member_activity,
+# members and member_scores. Recency risk moves with the clock, so only the
+# last check-in is stored and the levels are applied at query time.
+
+AT_RISK_PAGE_SIZE = 100
+AT_RISK_MAX_PAGE_SIZE = 1000
+# Without a churn model the list holds members idle for more than this
+AT_RISK_IDLE_DAYS = 7
+RECENCY_HIGH_RISK_DAYS = 30
+RECENCY_MEDIUM_RISK_DAYS = 14
+RISK_LEVELS = ('High', 'Medium', 'Low')
+# last_seen_ts of members who never checked in: idler than anyone else
+NEVER_CHECKED_IN = -1
+
+# ?sort= -> (member_risk column, its direction for ?order=desc). Ties are
+# broken by member_id in the column's direction.
+AT_RISK_SORTS = {
+    'days_since_checkin': ('last_seen_ts', 'ASC'),
+    'churn_probability': ('churn_probability', 'DESC'),
+    'monthly_fee': ('monthly_fee', 'DESC'),
+    'member_id': ('member_id', 'DESC')
+}
+
+# index name -> columns; the location ones serve ?location= pages
+MEMBER_RISK_INDEXES = {
+    'idx_member_risk_idle': ('last_seen_ts', 'member_id'),
+    'idx_member_risk_probability': ('churn_probability', 'member_id'),
+    'idx_member_risk_fee': ('monthly_fee', 'member_id'),
+    'idx_member_risk_location_idle': ('location_id', 'last_seen_ts', 'member_id'),
+    'idx_member_risk_location_probability': ('location_id', 'churn_probability', 'member_id')
+}
+
+MEMBER_RISK_SELECT = f"""
+    SELECT
+        m.member_id,
+        m.location_id,
+        m.membership_type_id,
+        CASE WHEN m.has_personal_training = 1 THEN 1 ELSE 0 END,
+        COALESCE(m.monthly_fee, {DEFAULT_MONTHLY_FEE}),
+        COALESCE(a.last_checkin_ts, {NEVER_CHECKED_IN}),
+        s.churn_probability,
+        s.risk_level
+    FROM members m
+    LEFT JOIN member_activity a ON a.member_id = m.member_id
+    LEFT JOIN member_scores s ON s.member_id = m.member_id
+    WHERE m.is_active = 1
+"""
+
+
+class AtRiskQueryError(ValueError):
+    """Raised for a malformed at-risk filter, sort or cursor"""
+
+
+def _create_member_risk(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS member_risk (
+            member_id TEXT PRIMARY KEY,
+            location_id INTEGER,
+            membership_type_id INTEGER,
+            has_personal_training INTEGER NOT NULL,
+            monthly_fee REAL NOT NULL,
+            last_seen_ts INTEGER NOT NULL,
+            churn_probability REAL,
+            risk_level TEXT
+        )
+    """)
+    for index_name, columns in MEMBER_RISK_INDEXES.items():
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON member_risk ({", ".join(columns)})')
+
+
+def rebuild_member_risk(conn):
+    """Recompute member_risk for every active member"""
+    _create_member_risk(conn)
+    conn.execute('DELETE FROM member_risk')
+    conn.execute(f'INSERT INTO member_risk {MEMBER_RISK_SELECT}')
+
+
+def update_member_risk(conn, where, params=()):
+    """Recompute member_risk for the members (alias m) matching `where`"""
+    conn.execute(f"""
+        DELETE FROM member_risk
+        WHERE member_id IN (SELECT m.member_id FROM members m WHERE {where})
+    """, params)
+    conn.execute(f'INSERT INTO member_risk {MEMBER_RISK_SELECT} AND ({where})', params)
+
+
+@migration(9, 'at-risk keyset index')
+def _migration_member_risk(conn):
+    _create_member_risk(conn)
+    if _table_columns(conn, 'members'):
+        rebuild_member_risk(conn)
+    conn.execute('ANALYZE member_risk')
+
+
+def _encode_cursor(sort, order, key, member_id):
+    """Opaque cursor for the page after the row with this sort key and member_id"""
+    payload = json.dumps([sort, order, key, member_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, sort, order):
+    """(sort key, member_id) of the last row of the previous page"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, key, member_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise AtRiskQueryError('cursor is not valid')
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise AtRiskQueryError('cursor belongs to a different sort or order')
+    return key, member_id
+
+
+def _lookup_id(lookup, name):
+    """Id of a location/membership type name; -1 (matches nothing) if unknown"""
+    rows = query_db(f'SELECT {LOOKUP_TABLES[lookup]} as id FROM {lookup} WHERE name = ?',
+                    (name,))
+    return rows[0]['id'] if rows else -1
+
+
+def _flag_param(name, value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return 1
+    if value.lower() in ('0', 'false', 'no'):
+        return 0
+    raise AtRiskQueryError(f'{name} must be true or false')
+
+
+def _int_param(name, value, low, high=None):
+    try:
+        number = int(value)
+    except ValueError:
+        raise AtRiskQueryError(f'{name} must be a whole number')
+    if number < low or (high is not None and number > high):
+        raise AtRiskQueryError(
+            f'{name} must be at least {low}' + (f' and at most {high}' if high else ''))
+    return number
+
+
+def at_risk_page(args, scored):
+    """One page of the at-risk list for request args; raises AtRiskQueryError
+
+    Returns (rows as Columns, next cursor or None, sort, order). `scored`
+    lists members by churn score, otherwise by the days since their last
+    check-in.
+    """
+    sort = args.get('sort', 'churn_probability' if scored else 'days_since_checkin')
+    if sort not in AT_RISK_SORTS:
+        raise AtRiskQueryError(f'sort must be one of: {", ".join(AT_RISK_SORTS)}')
+    if sort == 'churn_probability' and not scored:
+        raise AtRiskQueryError('churn_probability needs churn scores; train a model first')
+    order = args.get('order', 'asc' if sort == 'member_id' else 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise AtRiskQueryError('order must be asc or desc')
+    limit = _int_param('limit', args.get('limit', AT_RISK_PAGE_SIZE), 1, AT_RISK_MAX_PAGE_SIZE)
+
+    today = time.time() / SECONDS_PER_DAY
+
+    def idle_for(days):
+        # days_since_checkin >= days  <=>  last_seen_ts <= this
+        return (today - days) * SECONDS_PER_DAY
+
+    conditions, params = [], []
+    risk_level = args.get('risk_level')
+    if risk_level is not None:
+        risk_level = risk_level.capitalize()
+        if risk_level not in RISK_LEVELS:
+            raise AtRiskQueryError(f'risk_level must be one of: {", ".join(RISK_LEVELS)}')
+    # Recency levels: idle for more than 30 days (or never seen) is High,
+    # more than 14 Medium
+    high, medium = idle_for(RECENCY_HIGH_RISK_DAYS + 1), idle_for(RECENCY_MEDIUM_RISK_DAYS + 1)
+    if scored:
+        if risk_level:
+            conditions.append('risk_level = ?')
+            params.append(risk_level)
+        else:
+            conditions.append('churn_probability >= ?')
+            params.append(CHURN_MEDIUM_RISK)
+    else:
+        if risk_level == 'High':
+            conditions.append('last_seen_ts <= ?')
+            params.append(high)
+        elif risk_level == 'Medium':
+            conditions.append('last_seen_ts > ? AND last_seen_ts <= ?')
+            params.extend([high, medium])
+        elif risk_level == 'Low':
+            conditions.append('last_seen_ts > ?')
+            params.append(medium)
+        else:
+            conditions.append('last_seen_ts <= ?')
+            params.append(idle_for(AT_RISK_IDLE_DAYS + 1))
+
+    if args.get('min_days_since_checkin'):
+        days = _int_param('min_days_since_checkin', args['min_days_since_checkin'], 0)
+        conditions.append('last_seen_ts <= ?')
+        params.append(idle_for(days))
+    if args.get('has_personal_training'):
+        conditions.append('has_personal_training = ?')
+        params.append(_flag_param('has_personal_training', args['has_personal_training']))
+    for name, lookup in (('location', 'locations'), ('membership_type', 'membership_types')):
+        if args.get(name):
+            conditions.append(f'{LOOKUP_TABLES[lookup]} = ?')
+            params.append(_lookup_id(lookup, args[name]))
+
+    column, descending = AT_RISK_SORTS[sort]
+    direction = descending if order == 'desc' else ('ASC' if descending == 'DESC' else 'DESC')
+    if args.get('cursor'):
+        key, member_id = _decode_cursor(args['cursor'], sort, order)
+        comparison = '>' if direction == 'ASC' else '<'
+        if column == 'member_id':
+            conditions.append(f'member_id {comparison} ?')
+            params.append(member_id)
+        else:
+            conditions.append(f'({column}, member_id) {comparison} (?, ?)')
+            params.extend([key, member_id])
+
+    score_columns = """
+            r.risk_level,
+            r.churn_probability,""" if scored else f"""
+            CASE
+                WHEN r.last_seen_ts <= ? THEN 'High'
+                WHEN r.last_seen_ts <= ? THEN 'Medium'
+                ELSE 'Low'
+            END as risk_level,"""
+    query = f"""
+        SELECT
+            r.member_id,
+            m.location,
+            m.membership_type,
+            m.has_personal_training,
+            r.monthly_fee,
+            CAST((? - m.signup_day) / 30 AS REAL) as months_member,
+            COALESCE(a.total_checkins, 0) as total_checkins,
+            a.last_checkin,
+            CAST(? - a.last_checkin_ts / 86400.0 AS INTEGER) as days_since_checkin,{score_columns}
+            ROUND(COALESCE(a.total_checkins, 0) * 1.0
+                  / NULLIF(CAST((? - m.signup_day) / 30 AS REAL), 0), 1) as avg_checkins_per_month,
+            r.{column} as sort_key
+        FROM (
+            SELECT * FROM member_risk
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {column} {direction}, member_id {direction}
+            LIMIT ?
+        ) r
+        JOIN members m ON m.member_id = r.member_id
+        LEFT JOIN member_activity a ON a.member_id = r.member_id
+        ORDER BY r.{column} {direction}, r.member_id {direction}
+    """
+    levels = () if scored else (high, medium)
+    rows = query_columns(query, (today, today, *levels, today, *params, limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows.head(limit)
+        next_cursor = _encode_cursor(sort, order, rows['sort_key'][-1], rows['member_id'][-1])
+    return rows.drop('sort_key'), next_cursor, sort, order
+
+# ============================================================================
+# REVENUE ENGINE
+# ============================================================================
+
+# Survival curves, lifetime value and the MRR forecast are computed for every
+# member at once from a few arrays. Membership durations are bucketed into
+# whole months and each Kaplan-Meier curve comes from two bincounts (exits
+# and cancellations per segment and month). Active members' monthly churn
+# hazard is their segment's, scaled by their churn-model score relative to
+# the average score, so expected remaining value and the retained MRR in the
+# forecast follow the model. The result is cached per data version, scoring
+# run and day.
+
+FORECAST_MONTHS = 6
+LTV_HORIZON_MONTHS = 60
+SURVIVAL_CURVE_MONTHS = 24
+ACQUISITION_LOOKBACK_MONTHS = 12
+FORECAST_Z = 1.96  # 95% bands
+DAYS_PER_MONTH = 365.25 / 12
+
+REVENUE_MEMBERS_QUERY = """
+    SELECT
+        m.membership_type_id,
+        m.location_id,
+        m.is_active,
+        m.monthly_fee,
+        m.signup_day,
+        m.cancel_day,
+        s.churn_probability
+    FROM members m
+    LEFT JOIN member_scores s ON s.member_id = m.member_id
+"""
+
+_revenue_model_cache = {'key': None, 'model': None}
+_revenue_model_lock = threading.Lock()
+
+
+def load_revenue_frame():
+    """Members with their lookup labels and churn scores, as read by revenue_model"""
+    df = query_to_df(REVENUE_MEMBERS_QUERY)
+    for lookup, id_column in LOOKUP_TABLES.items():
+        rows = query_to_df(f'SELECT {id_column}, name FROM {lookup}')
+        # Categorical labels factorize on their integer codes
+        labels = pd.Categorical(df[id_column])
+        df[id_column.replace('_id', '')] = labels.rename_categories(
+            dict(zip(rows[id_column], rows['name'])))
+    return df
+
+
+def _month_numbers(days):
+    """Months since 1970-01 of day numbers (-1 where NaN)"""
+    months = np.full(len(days), -1, dtype=np.int64)
+    known = ~np.isnan(days)
+    months[known] = (days[known].astype(np.int64).astype('datetime64[D]')
+                     .astype('datetime64[M]').astype(np.int64))
+    return months
+
+
+def _segment_codes(*columns):
+    """Integer code per distinct combination of the columns, and the
+    (label, ...) tuple of each code, with None for missing values"""
+    codes = np.zeros(len(columns[0]), dtype=np.int64)
+    uniques = []
+    for column in columns:
+        column_codes, column_uniques = pd.factorize(column, use_na_sentinel=False)
+        codes = codes * len(column_uniques) + column_codes
+        uniques.append([_label(value) for value in column_uniques])
+    codes, combined = pd.factorize(codes, sort=True)
+    labels = []
+    for value in combined.tolist():
+        label = []
+        for column_uniques in reversed(uniques):
+            value, position = divmod(value, len(column_uniques))
+            label.append(column_uniques[position])
+        labels.append(tuple(reversed(label)))
+    return codes, labels
+
+
+def _kaplan_meier(groups, n_groups, months, churned, horizon):
+    """Survival and at-risk counts per (group, month) for month = 0..horizon
+
+    months holds each member's whole months observed (capped at horizon)
+    and churned marks the ones whose observation ended with a cancellation
+    rather than today. survival[g, k] is the share still a member k months
+    after signing up.
+    """
+    size = n_groups * (horizon + 1)
+    flat = groups * (horizon + 1) + months
+    exits = np.bincount(flat, minlength=size).reshape(n_groups, horizon + 1)
+    cancels = np.bincount(flat, weights=churned, minlength=size).reshape(n_groups, horizon + 1)
+    at_risk = exits[:, ::-1].cumsum(axis=1)[:, ::-1]
+    hazard = np.divide(cancels, at_risk, out=np.zeros(cancels.shape), where=at_risk > 0)
+    survival = np.ones((n_groups, horizon + 1))
+    survival[:, 1:] = np.cumprod(1 - hazard[:, :-1], axis=1)
+    return survival, at_risk
+
+
+def _curve(survival, at_risk, months=SURVIVAL_CURVE_MONTHS):
+    """Rounded curve, None past the last month anyone was observed"""
+    return [round(float(s), 4) if n else None
+            for s, n in zip(survival[:months + 1], at_risk[:months + 1])]
+
+
+def revenue_model(df, now_day):
+    """Survival curves, expected LTV and the MRR forecast for `df` members
+
+    df is load_revenue_frame()'s output and now_day the current (fractional)
+    day number. Every step is a whole-array operation over the members.
+    """
+    signup = df['signup_day'].to_numpy(dtype=float)
+    cancel = df['cancel_day'].to_numpy(dtype=float)
+    active = (df['is_active'] == 1).to_numpy()
+    raw_fee = df['monthly_fee'].to_numpy(dtype=float)
+    fee = np.where(np.isnan(raw_fee), DEFAULT_MONTHLY_FEE, raw_fee)
+    score = df['churn_probability'].to_numpy(dtype=float)
+
+    # Observation: active members up to today, cancelled ones up to their
+    # cancellation; cancelled members without a date can't be placed
+    end = np.where(active, now_day, cancel)
+    observed = ~np.isnan(signup) & ~np.isnan(end) & (end >= signup)
+    churned = (~active & observed).astype(float)
+    tenure = np.where(observed, end - signup, 0.0) / DAYS_PER_MONTH
+    months = np.minimum(tenure, LTV_HORIZON_MONTHS).astype(np.int64)
+
+    # Realized value to date per membership type (the former SQL average)
+    realized = raw_fee * np.where(active, (now_day - signup) / 30, (cancel - signup) / 30.0)
+    type_codes, type_labels = _segment_codes(df['membership_type'])
+    n_types = len(type_labels)
+    has_value = ~np.isnan(realized)
+    realized_sum = np.bincount(type_codes[has_value], weights=realized[has_value],
+                               minlength=n_types)
+    realized_count = np.bincount(type_codes[has_value], minlength=n_types)
+
+    # Segment survival, observed lifetime hazard and expected value
+    seg_codes, seg_labels = _segment_codes(df['membership_type'], df['location'])
+    n_segs = len(seg_labels)
+    obs = np.flatnonzero(observed)
+    seg_survival, seg_at_risk = _kaplan_meier(
+        seg_codes[obs], n_segs, months[obs], churned[obs], LTV_HORIZON_MONTHS)
+    exposure = np.bincount(seg_codes, weights=np.where(observed, tenure, 0.0), minlength=n_segs)
+    cancels = np.bincount(seg_codes, weights=churned, minlength=n_segs)
+    seg_hazard = np.divide(cancels, exposure, out=np.zeros(n_segs), where=exposure > 0)
+    members = np.bincount(seg_codes, minlength=n_segs)
+    seg_fee = np.bincount(seg_codes, weights=fee, minlength=n_segs) / np.maximum(members, 1)
+    expected_months = seg_survival[:, :LTV_HORIZON_MONTHS].sum(axis=1)
+
+    # Active members' monthly retention: segment hazard scaled by the score
+    scored = active & ~np.isnan(score)
+    mean_score = score[scored].mean() if scored.any() else np.nan
+    relative = np.where(scored & (mean_score > 0), score / mean_score, 1.0)
+    retention = 1 - np.clip(seg_hazard[seg_codes] * relative, 0.0, 1.0)
+    remaining = fee * np.where(
+        retention < 1,
+        retention * (1 - retention ** LTV_HORIZON_MONTHS) / np.maximum(1 - retention, 1e-12),
+        LTV_HORIZON_MONTHS)
+    active_members = np.bincount(seg_codes, weights=active, minlength=n_segs)
+    remaining_sum = np.bincount(seg_codes, weights=np.where(active, remaining, 0.0),
+                                minlength=n_segs)
+
+    # Per membership type: members-weighted segment LTV
+    seg_type = np.array([type_labels.index(label[:1]) for label in seg_labels], dtype=np.int64)
+    type_members = np.bincount(seg_type, weights=members, minlength=n_types)
+    type_ltv = np.bincount(seg_type, weights=members * seg_fee * expected_months,
+                           minlength=n_types) / np.maximum(type_members, 1)
+    type_active = np.bincount(seg_type, weights=active_members, minlength=n_types)
+    type_remaining = np.bincount(seg_type, weights=remaining_sum, minlength=n_types)
+
+    avg_ltv = np.where(realized_count > 0,
+                       _sql_round(realized_sum / np.maximum(realized_count, 1), 2), np.nan)
+    ltv_by_membership = pd.DataFrame({
+        'membership_type': [label[0] for label in type_labels],
+        'member_count': np.bincount(type_codes, minlength=n_types),
+        'avg_ltv': avg_ltv,
+        'expected_ltv': _sql_round(type_ltv, 2),
+        'expected_remaining_ltv': np.where(
+            type_active > 0, _sql_round(type_remaining / np.maximum(type_active, 1), 2), np.nan)
+    })
+    # ORDER BY avg_ltv DESC, membership_type: NULL averages last
+    ltv_by_membership = ltv_by_membership.iloc[np.lexsort((
+        ltv_by_membership['membership_type'].fillna('').to_numpy(),
+        -np.nan_to_num(avg_ltv, nan=-np.inf)))]
+
+    ltv_by_segment = pd.DataFrame({
+        'membership_type': [label[0] for label in seg_labels],
+        'location': [label[1] for label in seg_labels],
+        'member_count': members,
+        'active_members': active_members.astype(int),
+        'avg_monthly_fee': _sql_round(seg_fee, 2),
+        'monthly_churn_rate': _sql_round(100 * seg_hazard, 2),
+        'expected_lifetime_months': _sql_round(expected_months, 1),
+        'expected_ltv': _sql_round(seg_fee * expected_months, 2),
+        'expected_remaining_ltv': np.where(
+            active_members > 0,
+            _sql_round(remaining_sum / np.maximum(active_members, 1), 2), np.nan)
+    }).sort_values('expected_ltv', ascending=False)
+
+    # Survival curves: overall, per membership type and per signup year
+    zeros = np.zeros(len(obs), dtype=np.int64)
+    overall, overall_at_risk = _kaplan_meier(
+        zeros, 1, months[obs], churned[obs], LTV_HORIZON_MONTHS)
+    type_survival, type_at_risk = _kaplan_meier(
+        type_codes[obs], n_types, months[obs], churned[obs], LTV_HORIZON_MONTHS)
+    signup_month = _month_numbers(signup)
+    year_codes, year_labels = pd.factorize(signup_month[obs] // 12 + 1970, sort=True)
+    cohort_survival, cohort_at_risk = _kaplan_meier(
+        year_codes, len(year_labels), months[obs], churned[obs], LTV_HORIZON_MONTHS)
+    cohort_sizes = np.bincount(year_codes, minlength=len(year_labels))
+
+    # MRR forecast: retained MRR of today's actives plus expected new members
+    steps = np.arange(1, FORECAST_MONTHS + 1)
+    kept = np.cumprod(np.repeat(retention[active][:, None], FORECAST_MONTHS, axis=1), axis=1)
+    active_fee = fee[active][:, None]
+    retained_mrr = (active_fee * kept).sum(axis=0)
+    retained_var = (active_fee ** 2 * kept * (1 - kept)).sum(axis=0)
+
+    this_month = np.datetime64(_day_label(int(now_day)), 'M')
+    age = this_month.astype(np.int64) - signup_month
+    recent = (signup_month >= 0) & (age >= 1) & (age <= ACQUISITION_LOOKBACK_MONTHS)
+    monthly_signups = np.bincount(age[recent], minlength=ACQUISITION_LOOKBACK_MONTHS + 1)[1:]
+    signup_fee = fee[recent]
+    new_fee = signup_fee.mean() if len(signup_fee) else DEFAULT_MONTHLY_FEE
+    # A cohort joining in forecast month j is k - j months old in month k
+    ages = steps[:, None] - steps[None, :]
+    new_value = np.where(ages >= 0, new_fee * overall[0][np.clip(ages, 0, None)], 0.0)
+    new_mrr = monthly_signups.mean() * new_value.sum(axis=1)
+    new_var = monthly_signups.var() * (new_value ** 2).sum(axis=1)
+
+    mrr = retained_mrr + new_mrr
+    spread = FORECAST_Z * np.sqrt(retained_var + new_var)
+    forecast = pd.DataFrame({
+        'month': np.datetime_as_string(this_month + steps, unit='M'),
+        'mrr': _sql_round(mrr, 2),
+        'lower': _sql_round(np.maximum(mrr - spread, 0), 2),
+        'upper': _sql_round(mrr + spread, 2),
+        'retained_mrr': _sql_round(retained_mrr, 2),
+        'new_mrr': _sql_round(new_mrr, 2)
+    })
+
+    return {
+        'ltv_by_membership': Columns.from_frame(ltv_by_membership),
+        'ltv_by_segment': Columns.from_frame(ltv_by_segment),
+        'survival_curves': {
+            'overall': _curve(overall[0], overall_at_risk[0]),
+            'by_membership_type': [
+                {'membership_type': label[0], 'curve': _curve(type_survival[i], type_at_risk[i])}
+                for i, label in enumerate(type_labels)],
+            'by_signup_year': [
+                {'cohort': str(year), 'members': int(cohort_sizes[i]),
+                 'curve': _curve(cohort_survival[i], cohort_at_risk[i])}
+                for i, year in enumerate(year_labels)]
+        },
+        'mrr_forecast': Columns.from_frame(forecast),
+        'forecast_assumptions': {
+            'months': FORECAST_MONTHS,
+            'confidence': 0.95,
+            'ltv_horizon_months': LTV_HORIZON_MONTHS,
+            'monthly_signups': round(float(monthly_signups.mean()), 1),
+            'new_member_fee': round(float(new_fee), 2),
+            'churn_scores_used': bool(scored.any())
+        }
+    }
+
+
+def current_revenue_model():
+    """revenue_model() for the current data version, scores and day (cached)"""
+    with db_pool.connection() as conn:
+        scored_at = get_state(conn, 'scores_updated_at')
+    key = (current_data_version(), scored_at, utc_day())
+    with _revenue_model_lock:
+        if _revenue_model_cache['key'] != key:
+            _revenue_model_cache['model'] = revenue_model(
+                load_revenue_frame(), time.time() / SECONDS_PER_DAY)
+            _revenue_model_cache['key'] = key
+        return _revenue_model_cache['model']
+
+# ============================================================================
+# COHORT RETENTION
+# ============================================================================
+
+# Members are grouped by signup month and counted in every calendar month
+# they were still a member: active members up to this month, cancelled ones
+# up to their cancellation month. One bincount of (cohort, last month
+# retained) and a reverse cumulative sum give the whole matrix, computed
+# from the member frame that is already loaded once per data version.
+
+COHORT_MONTHS = 60
+COHORT_MAX_MONTHS = 120
+
+
+def _label_codes(frame, name, value):
+    """Codes of frame[name] whose label is `value` (none if unknown)"""
+    codes, labels = frame[name]
+    return np.isin(codes, [i for i, label in enumerate(labels) if label == value])
+
+
+def cohort_retention(frame, now_day, months=COHORT_MONTHS, location=None,
+                     membership_type=None):
+    """Signup month x months since signup retention matrix of `frame`
+
+    Covers the last `months` signup cohorts up to the month of `now_day`.
+    retained[c][k] is the number of cohort c members still a member in
+    their k-th month after signing up; months not reached yet are None.
+    """
+    signup = frame['signup_month']
+    cancel = frame['cancel_month']
+    active = frame['measures'][:, MEASURES.index('active')] > 0
+    this_month = np.datetime64(_day_label(int(now_day)), 'M').astype(np.int64)
+    first = this_month - months + 1
+
+    signup_month = np.where(np.isnat(signup), first - 1, signup.astype(np.int64))
+    cancel_month = np.where(np.isnat(cancel), first - 1, cancel.astype(np.int64))
+    selected = (signup_month >= first) & (signup_month <= this_month)
+    if location is not None:
+        selected &= _label_codes(frame, 'location', location)
+    if membership_type is not None:
+        selected &= _label_codes(frame, 'membership_type', membership_type)
+    # Cancelled members without a usable cancellation date can't be placed
+    placed = selected & (active | (cancel_month >= signup_month))
+    last = np.minimum(np.where(active, this_month, cancel_month), this_month) - signup_month
+
+    cohorts = signup_month[placed] - first
+    exits = np.bincount(cohorts * months + last[placed],
+                        minlength=months * months).reshape(months, months)
+    retained = exits[:, ::-1].cumsum(axis=1)[:, ::-1]
+    # Cohort c has been observed for months - c months
+    reached = np.arange(months)[None, :] < (months - np.arange(months))[:, None]
+
+    sizes = retained[:, 0]
+    labels = np.datetime_as_string(
+        (first + np.arange(months)).astype('datetime64[M]')).tolist()
+    rates = np.where(reached, _sql_round(100.0 * retained / np.maximum(sizes, 1)[:, None], 1),
+                     np.nan)
+    rows = [{
+        'cohort': labels[c],
+        'members': int(sizes[c]),
+        'retained': [int(n) if ok else None for n, ok in zip(retained[c], reached[c])],
+        'retention': [None if np.isnan(r) else float(r) for r in rates[c]]
+    } for c in np.flatnonzero(sizes)]
+
+    observed = reached & (sizes > 0)[:, None]
+    base = (sizes[:, None] * observed).sum(axis=0)
+    average = np.where(base > 0, _sql_round(
+        100.0 * (retained * observed).sum(axis=0) / np.maximum(base, 1), 1), np.nan)
+
+    return {
+        'as_of': labels[-1],
+        'months': months,
+        'cohorts': rows,
+        'average_retention': [None if np.isnan(r) else float(r) for r in average],
+        'members': int(placed.sum()),
+        'unplaced_members': int((selected & ~placed).sum())
+    }
+
+# ============================================================================
+# DAILY KPI SNAPSHOTS
+# ============================================================================
+
+# kpi_daily holds the overview KPIs as of the end of each day, per location,
+# so trends are a range read instead of a reconstruction from members. The
+# whole history is computed in one pass: each member adds +1 (and their fee)
+# on the day they join and -1 on the day they cancel, and a cumulative sum
+# per location gives the active members and MRR of every day. The
+# snapshot_kpis job appends the days since the last snapshot and rewrites
+# the last one; an empty table (first run, or after a members replace) is
+# backfilled over KPI_HISTORY_DAYS.
+
+KPI_HISTORY_DAYS = int(os.environ.get('KPI_HISTORY_DAYS', 5 * 365))
+KPI_TREND_DAYS = 90
+KPI_CHURN_WINDOW_DAYS = 30  # cancellations counted in churn_rate, like the overview
+MRR_TREND_MONTHS = 12
+
+KPI_MEMBERS_QUERY = """
+    SELECT
+        COALESCE(location_id, 0) as location_id,
+        is_active,
+        COALESCE(monthly_fee, 39.99) as monthly_fee,
+        signup_day,
+        cancel_day
+    FROM members
+"""
+
+KPI_COLUMNS = ('total_members', 'active_members', 'new_members', 'cancellations', 'mrr')
+
+
+class KpiTrendError(ValueError):
+    """Raised for a malformed ?days= trend length"""
+
+
+def _create_kpi_daily(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS kpi_daily (
+            day INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            total_members INTEGER NOT NULL,
+            active_members INTEGER NOT NULL,
+            new_members INTEGER NOT NULL,
+            cancellations INTEGER NOT NULL,
+            mrr REAL NOT NULL,
+            PRIMARY KEY (day, location_id)
+        )
+    """)
+
+
+def kpi_snapshots(df, first_day, last_day, today):
+    """KPI rows for every (day, location) from first_day to last_day
+
+    df is KPI_MEMBERS_QUERY's output. A member counts from their signup day
+    (from first_day if it is unknown) and is active until they cancel:
+    always while is_active = 1, otherwise until their cancellation day,
+    which is taken as today at the latest. Inactive members without a
+    cancellation date are never counted active. Locations are left out of
+    days before their first member.
+    """
+    days = last_day - first_day + 1
+    locations, location_ids = pd.factorize(df['location_id'], sort=True)
+    size = len(location_ids) * days
+    signup = np.floor(df['signup_day'].to_numpy(dtype=float))
+    cancel = np.floor(df['cancel_day'].to_numpy(dtype=float))
+    active = (df['is_active'] == 1).to_numpy()
+    fee = df['monthly_fee'].to_numpy(dtype=float)
+
+    joined_day = np.nan_to_num(signup, nan=first_day)
+    cancelled = ~active & ~np.isnan(cancel)
+    end_day = np.where(active, last_day + 1, np.maximum(
+        np.where(cancelled, np.minimum(cancel, today), joined_day), joined_day))
+    start = np.clip(joined_day - first_day, 0, None).astype(np.int64)
+    end = np.clip(end_day - first_day, 0, days).astype(np.int64)
+    joined = start < days
+
+    def per_day(positions, weights=None):
+        """(location, day) counts of events at positions, for members where joined"""
+        keep = joined & (positions < days)
+        return np.bincount(locations[keep] * days + positions[keep],
+                           weights=None if weights is None else weights[keep],
+                           minlength=size).reshape(len(location_ids), days)
+
+    joins = per_day(start)
+    total = joins.cumsum(axis=1)
+    counts = {
+        'total_members': total,
+        'active_members': (joins - per_day(end)).cumsum(axis=1),
+        'new_members': per_day(np.where(signup >= first_day, start, days)),
+        'cancellations': per_day(np.where(cancelled & (end_day >= first_day), end, days)),
+        'mrr': _sql_round((per_day(start, fee) - per_day(end, fee)).cumsum(axis=1), 2)
+    }
+    present = total > 0
+    location_index, day_index = np.nonzero(present)
+    return pd.DataFrame({
+        'day': first_day + day_index,
+        'location_id': location_ids[location_index],
+        **{name: counts[name][present] for name in KPI_COLUMNS}
+    })
+
+
+def snapshot_kpis(backfill=False):
+    """Write kpi_daily from the last snapshot day (or the whole history) to today"""
+    start = time.perf_counter()
+    today = utc_day()
+    with db_pool.connection() as conn:
+        # Read inside the write transaction, so the snapshot is built from
+        # the same data it replaces and no import can commit in between
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = current_data_version(conn)
+            last = conn.execute('SELECT MAX(day) FROM kpi_daily').fetchone()[0]
+            df = pd.read_sql_query(KPI_MEMBERS_QUERY, conn)
+            if backfill or last is None:
+                first_signup = df['signup_day'].min()
+                first_day = today - KPI_HISTORY_DAYS + 1
+                if not pd.isna(first_signup):
+                    first_day = min(max(first_day, int(first_signup)), today)
+            else:
+                first_day = min(last, today)
+            rows = kpi_snapshots(df, first_day, today, today)
+
+            conn.execute('DELETE FROM kpi_daily WHERE day >= ?',
+                         (0 if backfill else first_day,))
+            conn.executemany(
+                f'INSERT INTO kpi_daily (day, location_id, {", ".join(KPI_COLUMNS)}) '
+                f'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows.itertuples(index=False, name=None))
+            set_state(conn, 'kpi_version', version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    response_cache.clear()
+
+    return {
+        'first_day': _day_label(first_day),
+        'last_day': _day_label(today),
+        'rows': len(rows),
+        'elapsed_seconds': round(time.perf_counter() - start, 2)
+    }
+
+
+def schedule_kpi_snapshot():
+    """Queue a snapshot when kpi_daily predates today or the data version"""
+    with db_pool.connection() as conn:
+        if get_state(conn, 'kpi_version') == current_data_version():
+            return None
+    return submit_job_once('snapshot_kpis')
+
+
+def _trend_days(default):
+    try:
+        days = int(request.args.get('days', default))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= KPI_HISTORY_DAYS:
+        raise KpiTrendError(f'days must be a whole number from 1 to {KPI_HISTORY_DAYS}')
+    return days
+
+
+def kpi_trend(days, location=None):
+    """Daily KPIs for the last `days` days, summed over locations (or one)"""
+    schedule_kpi_snapshot()
+    where, params = _location_filter('location_id', location)
+    first_day = utc_day() - days + 1
+    return query_columns(f"""
+        WITH daily AS (
+            SELECT
+                day,
+                SUM(total_members) as total_members,
+                SUM(active_members) as active_members,
+                SUM(new_members) as new_members,
+                SUM(cancellations) as cancellations,
+                SUM(mrr) as mrr,
+                SUM(SUM(cancellations)) OVER (
+                    ORDER BY day RANGE BETWEEN {KPI_CHURN_WINDOW_DAYS} PRECEDING AND CURRENT ROW
+                ) as recent_cancellations
+            FROM kpi_daily
+            WHERE day >= ? AND {where}
+            GROUP BY day
+        )
+        SELECT
+            strftime('%Y-%m-%d', day * {SECONDS_PER_DAY}, 'unixepoch') as date,
+            total_members,
+            active_members,
+            new_members,
+            cancellations,
+            ROUND(mrr, 2) as mrr,
+            ROUND(100.0 * active_members / NULLIF(total_members, 0), 1) as retention_rate,
+            ROUND(100.0 * recent_cancellations / NULLIF(active_members, 0), 2) as churn_rate
+        FROM daily
+        WHERE day >= ?
+        ORDER BY day
+    """, (first_day - KPI_CHURN_WINDOW_DAYS, *params, first_day))
+
+
+def mrr_trend(months=MRR_TREND_MONTHS):
+    """MRR and active members at the end of each of the last `months` months"""
+    schedule_kpi_snapshot()
+    first_month = np.datetime64(_day_label(utc_day()), 'M') - (months - 1)
+    return query_columns(f"""
+        WITH daily AS (
+            SELECT
+                day,
+                strftime('%Y-%m', day * {SECONDS_PER_DAY}, 'unixepoch') as month,
+                SUM(mrr) as mrr,
+                SUM(active_members) as active_members
+            FROM kpi_daily
+            WHERE day >= ?
+            GROUP BY day
+        )
+        SELECT month, ROUND(mrr, 2) as mrr, active_members
+        FROM daily
+        WHERE day IN (SELECT MAX(day) FROM daily GROUP BY month)
+        ORDER BY month
+    """, (int(first_month.astype('datetime64[D]').astype(np.int64)),))
+
+
+@migration(10, 'daily KPI snapshots')
+def _migration_kpi_daily(conn):
+    _create_kpi_daily(conn)
+
+
+@app.cli.command('snapshot-kpis')
+@click.option('--backfill', is_flag=True, help='Recompute the whole history')
+def snapshot_kpis_command(backfill):
+    """Write today's KPI snapshot (and any days missed since the last one)"""
+    stats = snapshot_kpis(backfill)
+    click.echo(f"Wrote {stats['rows']:,} KPI rows for {stats['first_day']} to "
+               f"{stats['last_day']} in {stats['elapsed_seconds']}s")
+
+# ============================================================================
+# API ENDPOINTS
+# ============================================================================
+
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': db_pool.stats(),
+        'response_cache': response_cache.stats(),
+        'analytics_backend': columnar_store.stats(),
+        'shards': shard_router.stats()
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Query, route and memory metrics in Prometheus text format"""
+    return app.response_class(render_metrics(),
+                              mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics/queries', methods=['GET'])
+def get_query_metrics():
+    """Per-statement timings with their SQL, plus the slow-query log"""
+    return jsonify({
+        'queries': query_summary(),
+        'slow_query_ms': SLOW_QUERY_MS or None,
+        'slow_queries': list(slow_queries)
+    })
+
+
+@app.route('/api/overview', methods=['GET'])
+@cached_response
+def get_overview(breakdowns=None):
+    """Get high-level overview metrics (?location= for one location,
+    ?days= of daily KPI trend)"""
+
+    try:
+        days = _trend_days(KPI_TREND_DAYS)
+    except KpiTrendError as e:
+        return jsonify({'error': str(e)}), 400
+    location = request.args.get('location')
+    shards = shard_router.route(location)
+    if shards is None and location is None:
+        breakdowns = breakdowns or member_breakdowns(
+            *run_concurrently(member_frame, breakdown_windows))
+        totals, signup_trend = breakdowns['totals'], breakdowns['signup_trend']
+    else:
+        totals, signup_trend = _overview_partials(shards, location)
+
+    # Get active member counts
+    location_stats = [{
+        'total_members': totals['total_members'],
+        'active_members': totals['is_active_sum'],
+        'churned_members': totals['churned_members'],
+        'tours_scheduled': totals['tours_scheduled'],
+        'total_locations': totals['total_locations']
+    }]
+
+    # Calculate retention rate
+    retention_rate = (totals['active_members'] / totals['total_members']
+                      ) * 100 if totals['total_members'] > 0 else 0
+
+    # Calculate churn rate
+    recent_churns = totals['recent_churns']
+
+    churn_rate = (recent_churns / totals['active_members']) * \
+        100 if totals['active_members'] > 0 else 0
+
+    return {
+        'total_members': totals['total_members'],
+        'active_members': totals['active_members'],
+        'mrr': totals['mrr'],
+        'retention_rate': round(retention_rate, 1),
+        'churn_rate': round(churn_rate, 2),
+        'location_stats': location_stats,
+        'signup_trend': signup_trend,
+        'kpi_trend': kpi_trend(days, location)
+    }
+
+
+def _location_filter(column, location):
+    """(SQL condition, params) limiting a location_id column to `location`"""
+    if location is None:
+        return '1 = 1', ()
+    return f'{column} = (SELECT location_id FROM locations WHERE name = ?)', (location,)
+
+
+def _merged_sums(partials):
+    """Add up one row of sums per shard; a column NULL everywhere stays None"""
+    totals = {}
+    for rows in partials:
+        for name, value in rows[0].items():
+            if value is not None:
+                totals[name] = totals.get(name, 0) + value
+            else:
+                totals.setdefault(name, None)
+    return totals
+
+
+def _overview_partials(shards, location):
+    """Overview totals and signup trend summed from per-shard aggregates"""
+    now = breakdown_windows()
+    with db_pool.connection() as conn:
+        columns = {name for name, _, _ in _table_columns(conn, 'members')}
+    tour_column = 'tour_scheduled' if 'tour_scheduled' in columns else 'NULL'
+    where, params = _location_filter('location_id', location)
+
+    totals = _merged_sums(shard_router.fan_out(shards, f"""
+        SELECT
+            COUNT(*) as total_members,
+            SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_members,
+            SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END) as churned_members,
+            SUM(is_active) as is_active_sum,
+            SUM(CASE WHEN {tour_column} = 1 THEN 1 ELSE 0 END) as tours_scheduled,
+            COUNT(DISTINCT location_id) as total_locations,
+            SUM(CASE WHEN is_active = 1 THEN COALESCE(monthly_fee, ?) ELSE 0 END) as mrr,
+            SUM(CASE WHEN cancel_day >= ? THEN 1 ELSE 0 END) as recent_churns
+        FROM members
+        WHERE {where}
+    """, (DEFAULT_MONTHLY_FEE, now['days_30'], *params)))
+    totals.setdefault('is_active_sum', None)
+    for name in ('total_members', 'active_members', 'churned_members',
+                 'tours_scheduled', 'total_locations', 'mrr', 'recent_churns'):
+        totals[name] = totals.get(name) or 0
+    totals['mrr'] = round(totals['mrr'], 2)
+
+    signups = {}
+    for rows in shard_router.fan_out(shards, f"""
+        SELECT
+            strftime('%Y-%m', signup_day * {SECONDS_PER_DAY}, 'unixepoch') as month,
+            COUNT(*) as signups
+        FROM members
+        WHERE signup_day >= ? AND {where}
+        GROUP BY month
+    """, (now['months_6'], *params)):
+        for row in rows:
+            signups[row['month']] = signups.get(row['month'], 0) + row['signups']
+    signup_trend = [{'month': month, 'signups': signups[month]}
+                    for month in sorted(signups, reverse=True)[:6]]
+    return totals, signup_trend
+
+
+@app.route('/api/churn-analysis', methods=['GET'])
+@cached_response
+def get_churn_analysis(breakdowns=None):
+    """Get detailed churn analysis"""
+
+    # Churn by membership type, location, tenure, PT and month in one pass
+    breakdowns = breakdowns or member_breakdowns(
+        *run_concurrently(member_frame, breakdown_windows))
+
+    return {
+        'churn_by_membership': breakdowns['churn_by_membership'],
+        'churn_by_location': breakdowns['churn_by_location'],
+        'churn_by_tenure': breakdowns['churn_by_tenure'],
+        'pt_impact': breakdowns['pt_impact'],
+        'monthly_trend': breakdowns['monthly_trend']
+    }
+
+
+@app.route('/api/cohorts', methods=['GET'])
+@cached_response
+def get_cohorts():
+    """Signup-month retention matrix (?months=, ?location=, ?membership_type=)"""
+    try:
+        months = int(request.args.get('months', COHORT_MONTHS))
+    except ValueError:
+        months = 0
+    if not 1 <= months <= COHORT_MAX_MONTHS:
+        return jsonify({'error': f'months must be a whole number from 1 to {COHORT_MAX_MONTHS}'}), 400
+
+    return cohort_retention(
+        member_frame(), utc_day(), months,
+        location=request.args.get('location'),
+        membership_type=request.args.get('membership_type'))
+
+
+@app.route('/api/at-risk-members', methods=['GET'])
+@cached_response
+def get_at_risk_members():
+    """Identify members at high risk of churning
+
+    Filters: ?location=, ?membership_type=, ?risk_level=, ?has_personal_training=
+    and ?min_days_since_checkin=. ?sort= and ?order= pick the order and
+    ?limit= the page size; pass a response's next_cursor as ?cursor= for the
+    next page. The risk summary comes with the first page only.
+    """
+
+    # Scores come from the churn model when one has been trained; without
+    # one, risk falls back to days since the last check-in
+    schedule_scoring()
+    scored = scores_available()
+    try:
+        at_risk, next_cursor, sort, order = at_risk_page(request.args, scored)
+    except AtRiskQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = {'at_risk_members': at_risk}
+    first_page = not request.args.get('cursor')
+    if scored:
+        if first_page:
+            response['risk_summary'] = query_columns("""
+                SELECT s.risk_level, COUNT(*) as count
+                FROM member_scores s
+                JOIN members m ON m.member_id = s.member_id
+                WHERE m.is_active = 1
+                GROUP BY s.risk_level
+                ORDER BY s.risk_level
+            """)
+        response['risk_model'] = 'random_forest'
+        with db_pool.connection() as conn:
+            response['scored_at'] = get_state(conn, 'scores_updated_at')
+    else:
+        if first_page:
+            # Risk level summary
+            risk_summary = """
+                WITH member_checkins AS (
+                    SELECT
+                        m.member_id,
+                        a.last_checkin,
+                        CAST(? - a.last_checkin_ts / 86400.0 AS INTEGER) as days_since_checkin
+                    FROM members m
+                    LEFT JOIN member_activity a ON m.member_id = a.member_id
+                    WHERE m.is_active = 1
+                )
+                SELECT
+                    CASE
+                        WHEN days_since_checkin > 30 OR days_since_checkin IS NULL THEN 'High'
+                        WHEN days_since_checkin > 14 THEN 'Medium'
+                        ELSE 'Low'
+                    END as risk_level,
+                    COUNT(*) as count
+                FROM member_checkins
+                GROUP BY risk_level
+                ORDER BY risk_level
+            """
+            response['risk_summary'] = query_columns(risk_summary, (time.time() / SECONDS_PER_DAY,))
+        response['risk_model'] = 'recency_rules'
+
+    response.update({'sort': sort, 'order': order, 'next_cursor': next_cursor})
+    return response
+
+
+class DateRangeError(ValueError):
+    """Raised for a malformed ?start= / ?end= date range"""
+
+
+def _date_range():
+    """(start, end) days from ?start=YYYY-MM-DD&end=YYYY-MM-DD; either may be None"""
+    bounds = []
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if value:
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                raise DateRangeError(f'{name} must be a date like 2024-01-31')
+        bounds.append(value or None)
+    if bounds[0] and bounds[1] and bounds[0] > bounds[1]:
+        raise DateRangeError('start must not be after end')
+    return tuple(bounds)
+
+
+def _day_conditions(column, start, end):
+    """WHERE clause and params bounding a day-number column by YYYY-MM-DD dates (inclusive)"""
+    conditions, params = [], []
+    if start:
+        conditions.append(f'{column} >= ?')
+        params.append(_day_number(start))
+    if end:
+        conditions.append(f'{column} <= ?')
+        params.append(_day_number(end))
+    return ' AND '.join(conditions) or '1 = 1', tuple(params)
+
+
+@app.route('/api/engagement', methods=['GET'])
+@cached_response
+def get_engagement_metrics():
+    """Get member engagement statistics
+
+    Defaults to the last 30 days; ?start= and ?end= (inclusive) pick any
+    other range. Hourly and weekday patterns come from the check-in cubes.
+    """
+    try:
+        start, end = _date_range()
+    except DateRangeError as e:
+        return jsonify({'error': str(e)}), 400
+    ranged = bool(start or end)
+    if not ranged:
+        start = (datetime.now(timezone.utc).date() - timedelta(days=30)).isoformat()
+
+    refresh_activity_window()
+    where, params = _day_conditions('day', start, end)
+
+    # Check-in patterns by hour
+    hourly = query_columns(f"""
+        SELECT hour, SUM(checkins) as checkin_count
+        FROM checkin_hourly
+        WHERE {where}
+        GROUP BY hour
+        ORDER BY hour
+    """, params)
+
+    # Check-in patterns by day of week
+    daily = query_columns(f"""
+        SELECT dow, SUM(checkins) as checkin_count
+        FROM checkin_daily
+        WHERE {where}
+        GROUP BY dow
+        ORDER BY dow
+    """, params)
+    daily.replace('dow', 'day_of_week', [WEEKDAY_NAMES[dow] for dow in daily['dow']])
+
+    if ranged:
+        location_engagement, distribution = _ranged_engagement(start, end)
+    else:
+        location_engagement, distribution = _rolling_engagement()
+
+    return {
+        'hourly_pattern': hourly,
+        'daily_pattern': daily,
+        'location_engagement': location_engagement,
+        'engagement_distribution': distribution,
+        'start': start,
+        'end': end
+    }
+
+
+def _rolling_engagement():
+    """Location engagement and visit distribution over the last 30 days"""
+
+    # Average visits per member by location
+    avg_visits = """
+        SELECT 
+            l.name as location,
+            COUNT(*) as active_members,
+            SUM(COALESCE(a.visits_30d, 0)) as total_checkins,
+            ROUND(SUM(COALESCE(a.visits_30d, 0)) * 1.0 / NULLIF(COUNT(*), 0), 1) as avg_visits_per_member
+        FROM members m
+        LEFT JOIN member_activity a ON m.member_id = a.member_id
+        LEFT JOIN locations l ON l.location_id = m.location_id
+        WHERE m.is_active = 1
+        GROUP BY m.location_id, l.name
+        ORDER BY l.name
+    """
+    location_engagement = query_columns(avg_visits)
+
+    # Engagement distribution
+    engagement_dist = """
+        WITH member_visits AS (
+            SELECT 
+                m.member_id,
+                COALESCE(a.visits_30d, 0) as visits_last_30d
+            FROM members m
+            LEFT JOIN member_activity a ON m.member_id = a.member_id
+            WHERE m.is_active = 1
+        )
         SELECT 
             CASE 
                 WHEN visits_last_30d = 0 THEN 'Inactive (0 visits)'
@@ -439,236 +4040,1767 @@ def get_engagement_metrics():
             COUNT(*) as member_count
         FROM member_visits
         GROUP BY engagement_level
-        ORDER BY 
+        ORDER BY 
+            CASE engagement_level
+                WHEN 'Inactive (0 visits)' THEN 1
+                WHEN 'Low (1-4 visits)' THEN 2
+                WHEN 'Medium (5-11 visits)' THEN 3
+                ELSE 4
+            END
+    """
+    distribution = query_columns(engagement_dist)
+    return location_engagement, distribution
+
+
+def _ranged_engagement(start, end):
+    """Location engagement and visit distribution for an explicit date range
+
+    Uses the same definition as the 30-day figures: check-ins by active
+    members, grouped by the member's home location. Per-member visit
+    counts scan only the range through the checkins(checkin_ts) index.
+    """
+    conditions, checkin_params = [], []
+    if start:
+        conditions.append('c.checkin_ts >= ?')
+        checkin_params.append(_day_number(start) * SECONDS_PER_DAY)
+    if end:
+        conditions.append('c.checkin_ts < ?')
+        checkin_params.append((_day_number(end) + 1) * SECONDS_PER_DAY)
+    range_visits = f"""
+        range_visits AS (
+            SELECT c.member_id, COUNT(*) as visits
+            FROM checkins c
+            WHERE {' AND '.join(conditions)}
+            GROUP BY c.member_id
+        ),
+        member_visits AS (
+            SELECT m.location_id, COALESCE(v.visits, 0) as visits
+            FROM members m
+            LEFT JOIN range_visits v ON v.member_id = m.member_id
+            WHERE m.is_active = 1
+        )"""
+
+    location_engagement = query_columns(f"""
+        WITH {range_visits}
+        SELECT
+            l.name as location,
+            COUNT(*) as active_members,
+            SUM(mv.visits) as total_checkins,
+            ROUND(SUM(mv.visits) * 1.0 / NULLIF(COUNT(*), 0), 1) as avg_visits_per_member
+        FROM member_visits mv
+        LEFT JOIN locations l ON l.location_id = mv.location_id
+        GROUP BY mv.location_id, l.name
+        ORDER BY l.name
+    """, tuple(checkin_params))
+
+    distribution = query_columns(f"""
+        WITH {range_visits}
+        SELECT
+            CASE
+                WHEN visits = 0 THEN 'Inactive (0 visits)'
+                WHEN visits < 5 THEN 'Low (1-4 visits)'
+                WHEN visits < 12 THEN 'Medium (5-11 visits)'
+                ELSE 'High (12+ visits)'
+            END as engagement_level,
+            COUNT(*) as member_count
+        FROM member_visits
+        GROUP BY engagement_level
+        ORDER BY
             CASE engagement_level
                 WHEN 'Inactive (0 visits)' THEN 1
                 WHEN 'Low (1-4 visits)' THEN 2
                 WHEN 'Medium (5-11 visits)' THEN 3
                 ELSE 4
             END
+    """, tuple(checkin_params))
+    return location_engagement, distribution
+
+
+@app.route('/api/revenue', methods=['GET'])
+@cached_response
+def get_revenue_metrics():
+    """Get revenue and financial metrics"""
+
+    # Monthly revenue trend
+    monthly_revenue = """
+        SELECT 
+            strftime('%Y-%m', date) as month,
+            SUM(amount) as revenue,
+            COUNT(*) as transaction_count
+        FROM sales
+        WHERE date >= date('now', '-12 months')
+        GROUP BY month
+        ORDER BY month
     """
-    distribution = query_db(engagement_dist)
 
-    return jsonify({
-        'hourly_pattern': hourly,
-        'daily_pattern': daily,
-        'location_engagement': location_engagement,
-        'engagement_distribution': distribution
-    })
+    # Revenue by type
+    revenue_by_type = """
+        SELECT 
+            type,
+            SUM(amount) as total_revenue,
+            COUNT(*) as transaction_count,
+            ROUND(AVG(amount), 2) as avg_transaction
+        FROM sales
+        GROUP BY type
+        ORDER BY type
+    """
+
+    # Revenue by location
+    revenue_by_location = """
+        SELECT 
+            location,
+            SUM(amount) as total_revenue,
+            COUNT(*) as transaction_count
+        FROM sales
+        GROUP BY location
+        ORDER BY location
+    """
+
+    # Current MRR and growth
+    mrr_query = """
+        SELECT 
+            SUM(COALESCE(m.monthly_fee, 39.99)) as current_mrr,
+            COUNT(*) as active_count
+        FROM members m
+        WHERE is_active = 1
+    """
+
+    # The statements are independent, so they run concurrently
+    revenue_trend, by_type, by_location, mrr = query_all(
+        (monthly_revenue, ()),
+        (revenue_by_type, ()),
+        (revenue_by_location, ()),
+        (mrr_query, ()),
+        columns=True)
+    model = current_revenue_model()
+
+    return {
+        'monthly_revenue_trend': revenue_trend,
+        'mrr_trend': mrr_trend(),
+        'revenue_by_type': by_type,
+        'revenue_by_location': by_location,
+        'ltv_by_membership': model['ltv_by_membership'],
+        'ltv_by_segment': model['ltv_by_segment'],
+        'survival_curves': model['survival_curves'],
+        'mrr_forecast': model['mrr_forecast'],
+        'forecast_assumptions': model['forecast_assumptions'],
+        'current_mrr': mrr['current_mrr'][0],
+        'active_paying_members': mrr['active_count'][0]
+    }
+
+
+@app.route('/api/sales-funnel', methods=['GET'])
+@cached_response
+def get_sales_funnel():
+    """Get sales funnel and conversion metrics"""
+
+    # Overall conversion funnel
+    funnel_query = """
+        SELECT 
+            COUNT(*) as total_leads,
+            SUM(CASE WHEN tour_scheduled = 1 THEN 1 ELSE 0 END) as tours_scheduled,
+            SUM(CASE WHEN tour_completed = 1 THEN 1 ELSE 0 END) as tours_completed,
+            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions
+        FROM leads
+    """
+
+    # By lead source
+    source_performance = """
+        SELECT 
+            lead_source,
+            COUNT(*) as leads,
+            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
+            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
+        FROM leads
+        GROUP BY lead_source
+        ORDER BY conversion_rate DESC, lead_source
+    """
+
+    # By location
+    location_performance = """
+        SELECT 
+            location,
+            COUNT(*) as leads,
+            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
+            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
+        FROM leads
+        GROUP BY location
+        ORDER BY location
+    """
+
+    # Monthly trend
+    monthly_trend = """
+        SELECT 
+            strftime('%Y-%m', date) as month,
+            COUNT(*) as leads,
+            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
+            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
+        FROM leads
+        WHERE date >= date('now', '-6 months')
+        GROUP BY month
+        ORDER BY month
+    """
+
+    funnel_rows, by_source, by_location, trend = query_all(
+        (funnel_query, ()),
+        (source_performance, ()),
+        (location_performance, ()),
+        (monthly_trend, ()))
+    funnel = funnel_rows[0]
+
+    # Calculate conversion rates
+    funnel['tour_schedule_rate'] = round(
+        (funnel['tours_scheduled'] / funnel['total_leads']) * 100, 1) if funnel['total_leads'] > 0 else 0
+    funnel['tour_completion_rate'] = round(
+        (funnel['tours_completed'] / funnel['tours_scheduled']) * 100, 1) if funnel['tours_scheduled'] > 0 else 0
+    funnel['conversion_rate'] = round(
+        (funnel['conversions'] / funnel['tours_completed']) * 100, 1) if funnel['tours_completed'] > 0 else 0
+    funnel['overall_conversion'] = round(
+        (funnel['conversions'] / funnel['total_leads']) * 100, 1) if funnel['total_leads'] > 0 else 0
+
+    return {
+        'funnel_overview': funnel,
+        'by_source': by_source,
+        'by_location': by_location,
+        'monthly_trend': trend
+    }
+
+
+@app.route('/api/location-comparison', methods=['GET'])
+@cached_response
+def get_location_comparison(breakdowns=None):
+    """Compare performance between locations (?location= for one location)"""
+
+    refresh_activity_window()
+
+    location = request.args.get('location')
+    shards = shard_router.route(location)
+    if shards is None and location is None:
+        # Key metrics by location
+        metrics = (breakdowns or member_breakdowns(member_frame()))['location_metrics']
+        checkins = query_db(LOCATION_ENGAGEMENT_QUERY.format(where='1 = 1'))
+        sales = query_db(LOCATION_REVENUE_QUERY.format(where='1 = 1'))
+    else:
+        metrics, checkins, sales = _location_comparison_partials(shards, location)
+
+    return {
+        'key_metrics': metrics,
+        'engagement': checkins,
+        'revenue': sales
+    }
+
+
+# Check-ins comparison
+LOCATION_ENGAGEMENT_QUERY = """
+    SELECT 
+        l.name as location,
+        SUM(COALESCE(a.visits_30d, 0)) as total_checkins,
+        SUM(CASE WHEN a.visits_30d > 0 THEN 1 ELSE 0 END) as unique_visitors,
+        ROUND(SUM(COALESCE(a.visits_30d, 0)) * 1.0 / NULLIF(COUNT(*), 0), 1) as avg_visits_per_member
+    FROM members m
+    LEFT JOIN member_activity a ON m.member_id = a.member_id
+    LEFT JOIN locations l ON l.location_id = m.location_id
+    WHERE m.is_active = 1 AND {where}
+    GROUP BY m.location_id, l.name
+    ORDER BY l.name
+"""
+
+# Sales comparison
+LOCATION_REVENUE_QUERY = """
+    SELECT 
+        location,
+        SUM(amount) as total_revenue,
+        COUNT(*) as transactions,
+        ROUND(AVG(amount), 2) as avg_transaction
+    FROM sales
+    WHERE {where}
+    GROUP BY location
+    ORDER BY location
+"""
+
+
+def _by_location(partials):
+    """Concatenate per-shard rows, ordered by location like ORDER BY location"""
+    rows = [row for shard_rows in partials for row in shard_rows]
+    return sorted(rows, key=lambda row: (row['location'] is not None, row['location'] or ''))
+
+
+def _location_comparison_partials(shards, location):
+    """Location comparison from per-shard aggregates
+
+    Every location lives in exactly one shard, so the per-location rows of
+    each shard are final and only need to be put in order.
+    """
+    where, params = _location_filter('m.location_id', location)
+    metrics = _by_location(shard_router.fan_out(shards, f"""
+        SELECT
+            l.name as location,
+            COUNT(*) as total_members,
+            SUM(CASE WHEN m.is_active = 1 THEN 1 ELSE 0 END) as active_members,
+            ROUND(100.0 * SUM(CASE WHEN m.is_active = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as retention_rate,
+            ROUND(SUM(CASE WHEN m.is_active = 1 THEN COALESCE(m.monthly_fee, ?) ELSE 0 END), 2) as mrr,
+            SUM(CASE WHEN m.has_personal_training = 1 THEN 1 ELSE 0 END) as pt_members,
+            ROUND(100.0 * SUM(CASE WHEN m.has_personal_training = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as pt_attachment_rate
+        FROM members m
+        LEFT JOIN locations l ON l.location_id = m.location_id
+        WHERE {where}
+        GROUP BY m.location_id, l.name
+    """, (DEFAULT_MONTHLY_FEE, *params)))
+    checkins = _by_location(shard_router.fan_out(
+        shards, LOCATION_ENGAGEMENT_QUERY.format(where=where), params))
+    sales_where = '1 = 1' if location is None else 'location = ?'
+    sales = _by_location(shard_router.fan_out(
+        shards, LOCATION_REVENUE_QUERY.format(where=sales_where), params))
+    return metrics, checkins, sales
+
+# ============================================================================
+# DASHBOARD
+# ============================================================================
+
+# GET /api/dashboard returns several pages' payloads in one round trip. The
+# sections share their intermediate results: the member breakdowns behind
+# overview, churn and location comparison come from one pass over the member
+# frame, and the check-in rollup window is re-based once. Each section's
+# JSON is cached under the same key as its own endpoint, so the dashboard
+# and the pages warm each other's cache entries.
+
+# Section name -> (endpoint path, view, takes the shared breakdowns)
+DASHBOARD_SECTIONS = {
+    'overview': ('/api/overview', get_overview, True),
+    'churn': ('/api/churn-analysis', get_churn_analysis, True),
+    'cohorts': ('/api/cohorts', get_cohorts, False),
+    'at_risk': ('/api/at-risk-members', get_at_risk_members, False),
+    'engagement': ('/api/engagement', get_engagement_metrics, False),
+    'revenue': ('/api/revenue', get_revenue_metrics, False),
+    'sales_funnel': ('/api/sales-funnel', get_sales_funnel, False),
+    'location_comparison': ('/api/location-comparison', get_location_comparison, True)
+}
+# Query parameters of the dashboard itself, left out of section cache keys
+DASHBOARD_PARAMS = ('sections', 'format')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def _dashboard_sections():
+    """Requested section names (all of them by default), in request order"""
+    names = [name.strip().replace('-', '_')
+             for value in request.args.getlist('sections') for name in value.split(',')]
+    names = list(dict.fromkeys(name for name in names if name))
+    unknown = [name for name in names if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise ValueError(f'Unknown sections: {", ".join(unknown)}. '
+                         f'Choose from {", ".join(DASHBOARD_SECTIONS)}')
+    return names or list(DASHBOARD_SECTIONS)
+
+
+def _dashboard_section(name, version, breakdowns):
+    """(status, JSON body) of one section, from the response cache if current"""
+    path, view, shared = DASHBOARD_SECTIONS[name]
+    key = (path, tuple(sorted((k, v) for k, v in request.args.items(multi=True)
+                              if k not in DASHBOARD_PARAMS)))
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return 200, cached[0].replace(b'\n', b'')
+
+    view = view.__wrapped__
+    try:
+        response = app.make_response(view(breakdowns) if shared else view())
+    except Exception as e:
+        # One failing section must not take the others (or the stream) down
+        app.logger.exception('Dashboard section %s failed', name)
+        return 500, json.dumps({'error': str(e)}).encode()
+    body = response.get_data()
+    if response.status_code == 200:
+        response_cache.put(key, version, body, response.mimetype)
+    # Pretty-printed JSON (debug mode) only has newlines between tokens
+    return response.status_code, body.replace(b'\n', b'')
+
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Several sections in one response (?sections=overview,churn,...)
+
+    Returns {section: payload}. With Accept: application/x-ndjson (or
+    ?format=ndjson) each section is streamed as its own line as soon as it
+    is ready: {"section": ..., "status": ..., "data": payload}.
+    """
+    try:
+        names = _dashboard_sections()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    stream = request.args.get('format') == 'ndjson' \
+        or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+    version = current_data_version()
+    refresh_activity_window()
+    breakdowns = None
+    if any(DASHBOARD_SECTIONS[name][2] for name in names):
+        breakdowns = member_breakdowns(*run_concurrently(member_frame, breakdown_windows))
+
+    # Sections run on the query pool (views read the request, so each call
+    # carries a copy of the request context) and are yielded as they finish
+    calls = [copy_current_request_context(partial(_dashboard_section, name, version, breakdowns))
+             for name in names]
+    executor = query_pool()
+    if executor is None:
+        sections = ((name, call()) for name, call in zip(names, calls))
+    else:
+        futures = {executor.submit(_run_in_worker, call): name
+                   for name, call in zip(names, calls)}
+        sections = ((futures[future], future.result())
+                    for future in as_completed(futures))
+
+    if not stream:
+        results = dict(sections)
+        body = b'{' + b','.join(json.dumps(name).encode() + b':' + results[name][1]
+                                for name in names) + b'}'
+        return app.response_class(body, mimetype='application/json')
+
+    def lines():
+        for name, (status, body) in sections:
+            yield (b'{"section":' + json.dumps(name).encode()
+                   + b',"status":' + str(status).encode()
+                   + b',"data":' + body + b'}\n')
+    return app.response_class(stream_with_context(lines()), mimetype=NDJSON_MIMETYPE)
+
+# ============================================================================
+# STREAMING IMPORT
+# ============================================================================
+
+CHECKIN_REQUIRED_COLUMNS = ['member_id', 'checkin_date', 'location']
+
+
+class ImportValidationError(ValueError):
+    """The upload is structurally unusable (reported to the client as a 400)"""
+
+
+def iter_upload_chunks(source, file_ext, chunksize=IMPORT_CHUNK_SIZE):
+    """Yield DataFrames of at most `chunksize` rows from a CSV/XLSX upload
+
+    CSV is read with pandas' chunked reader and XLSX with openpyxl's
+    read-only row iterator, so only one chunk is in memory at a time.
+    Legacy .xls files have no streaming reader and are loaded whole.
+    """
+    if file_ext == 'csv':
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif file_ext == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(col) if col is not None else f'column_{i}'
+                      for i, col in enumerate(header)]
+            batch = []
+            for row in rows:
+                if any(value is not None for value in row):
+                    batch.append(row)
+                if len(batch) >= chunksize:
+                    yield pd.DataFrame.from_records(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame.from_records(batch, columns=header)
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(source)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+def _sqlite_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def replace_table(conn, table, df):
+    """Recreate `table` holding the rows of `df`, in the caller's transaction
+
+    Unlike DataFrame.to_sql, this does not commit, so a failure later in
+    the same import rolls the table back too.
+    """
+    columns = [str(col) for col in df.columns]
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" (' + ', '.join(
+        f'"{col}" {_sqlite_type(df[col].dtype)}' for col in columns) + ')')
+    conn.executemany(
+        f'INSERT INTO "{table}" ({column_list}) VALUES ({", ".join("?" * len(columns))})',
+        df.itertuples(index=False, name=None))
+
+
+def _prepare_checkin_chunk(chunk):
+    """Normalize column names, drop rows that can't be used and add checkin_ts
+
+    Timestamps are parsed once here; naive ones are taken as UTC, like
+    SQLite's date functions do. Returns (clean_chunk, rejected_row_count).
+    """
+    if 'checkin_datetime' in chunk.columns and 'checkin_date' not in chunk.columns:
+        chunk = chunk.rename(columns={'checkin_datetime': 'checkin_date'})
+
+    missing_cols = [col for col in CHECKIN_REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing_cols:
+        raise ImportValidationError(f'Missing required columns: {missing_cols}')
+
+    checkin_date = chunk['checkin_date']
+    if pd.api.types.is_datetime64_any_dtype(checkin_date):
+        parsed = checkin_date
+        utc = parsed.dt.tz_localize('UTC') if parsed.dt.tz is None else parsed.dt.tz_convert('UTC')
+    else:
+        parsed = utc = pd.to_datetime(checkin_date, errors='coerce', format='ISO8601', utc=True)
+    valid = chunk['member_id'].notna() & parsed.notna()
+
+    chunk = chunk[valid].copy()
+    if pd.api.types.is_datetime64_any_dtype(checkin_date):
+        chunk['checkin_date'] = parsed[valid].dt.strftime('%Y-%m-%d %H:%M:%S')
+    chunk['checkin_ts'] = (
+        (utc[valid] - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).astype('int64')
+    return chunk, int((~valid).sum())
+
+
+def row_hashes(df, columns):
+    """Signed 64-bit hash of each row's values in `columns` (order-insensitive)
+
+    Numbers hash as floats, so 30 and 30.0 match whichever dtype a chunk was
+    read with; everything else hashes as text, as SQLite stores it.
+    """
+    values = {}
+    for column in sorted(columns):
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            values[column] = series.astype(float)
+        else:
+            values[column] = series.astype(str).where(series.notna(), None)
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(values, index=df.index), index=False).to_numpy().view('int64')
+
+
+def _staging_table(table):
+    return f'staging_{table}'
+
+
+def stage_rows(conn, table, df, columns):
+    """Load `df[columns]` into a temp staging table and classify each row
+
+    Rows match on TABLE_KEYS[table] (the last one wins within `df`) and are
+    compared to the stored row by row_hash. The staging table's
+    staging_state is NULL for a new row, 1 for a changed one and 2 for an
+    unchanged one; it is kept until the next call so callers can read the
+    rows about to be replaced. Returns inserted/updated/unchanged counts.
+    """
+    key = TABLE_KEYS[table]
+    columns = [col for col in columns if col != ROW_HASH_COLUMN]
+    if key in columns:
+        ids = df[key]
+        df = df[ids.isna() | ~ids.duplicated(keep='last')]
+    derived = derived_column_names(table)
+    hashes = row_hashes(df, [col for col in columns if col not in derived])
+
+    staging = _staging_table(table)
+    column_list = ', '.join(f'"{col}"' for col in columns + [ROW_HASH_COLUMN])
+    conn.execute(f'DROP TABLE IF EXISTS temp."{staging}"')
+    conn.execute(f'CREATE TEMP TABLE "{staging}" ({column_list}, staging_state INTEGER)')
+    conn.executemany(
+        f'INSERT INTO "{staging}" ({column_list}) '
+        f'VALUES ({", ".join("?" * (len(columns) + 1))})',
+        ((*row, row_hash) for row, row_hash in zip(
+            df[columns].itertuples(index=False, name=None), hashes.tolist())))
+    if key in columns:
+        conn.execute(f"""
+            UPDATE "{staging}" SET staging_state = (
+                SELECT CASE WHEN t.{ROW_HASH_COLUMN} = "{staging}".{ROW_HASH_COLUMN}
+                            THEN 2 ELSE 1 END
+                FROM main."{table}" t WHERE t."{key}" = "{staging}"."{key}")
+        """)
+
+    counts = dict(conn.execute(
+        f'SELECT staging_state, COUNT(*) FROM "{staging}" GROUP BY staging_state'))
+    return {'inserted': counts.get(None, 0), 'updated': counts.get(1, 0),
+            'unchanged': counts.get(2, 0)}
+
+
+def apply_staged_rows(conn, table, columns):
+    """Upsert the new and changed rows of the staging table into `table`"""
+    key = TABLE_KEYS[table]
+    columns = [col for col in columns if col != ROW_HASH_COLUMN] + [ROW_HASH_COLUMN]
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    upsert = ''
+    if key in columns:
+        assignments = ', '.join(f'"{col}" = excluded."{col}"' for col in columns if col != key)
+        upsert = f'ON CONFLICT ("{key}") DO UPDATE SET {assignments}'
+    conn.execute(f"""
+        INSERT INTO main."{table}" ({column_list})
+        SELECT {column_list} FROM "{_staging_table(table)}"
+        WHERE staging_state IS NOT 2
+        {upsert}
+    """)
+
+
+def drop_staged_rows(conn, table):
+    conn.execute(f'DROP TABLE IF EXISTS temp."{_staging_table(table)}"')
+
+
+def upsert_checkin_chunk(conn, chunk, columns, track_cubes=True):
+    """Stage and upsert one prepared check-in chunk on checkin_id
+
+    Returns (counts, touched member ids, cube count delta). Only new and
+    changed rows are written; a changed row also leaves its old buckets and
+    touches its old member. The delta is None unless `track_cubes`.
+    """
+    staging = _staging_table('checkins')
+    counts = stage_rows(conn, 'checkins', chunk, columns)
+    touched, deltas = set(), []
+    if 'checkin_id' in columns:
+        replaced = pd.read_sql_query(f"""
+            SELECT t.checkin_ts, t.location_id, t.member_id
+            FROM "{staging}" s JOIN main.checkins t ON t.checkin_id = s.checkin_id
+            WHERE s.staging_state = 1
+        """, conn)
+        touched.update(replaced['member_id'].tolist())
+        if track_cubes:
+            deltas.append(-checkin_cube_counts(replaced['checkin_ts'], replaced['location_id']))
+    written = pd.read_sql_query(
+        f'SELECT checkin_ts, location_id, member_id FROM "{staging}" '
+        f'WHERE staging_state IS NOT 2', conn)
+    touched.update(written['member_id'].tolist())
+    if track_cubes:
+        deltas.append(checkin_cube_counts(written['checkin_ts'], written['location_id']))
+    apply_staged_rows(conn, 'checkins', columns)
+    return counts, touched, pd.concat(deltas) if track_cubes else None
+
+
+def stream_import_checkins(source, file_ext, mode='append',
+                           chunksize=IMPORT_CHUNK_SIZE, progress=None):
+    """Import check-ins chunk by chunk inside a single transaction
+
+    Each chunk is validated, staged and upserted on checkin_id, so peak
+    memory depends on `chunksize`, not on the size of the upload. Rows
+    identical to the stored ones are skipped, and only new or changed rows
+    touch the cubes and the activity rollup. `progress`, if given, is called
+    with the running stats dict after every chunk.
+    """
+    started = time.perf_counter()
+    stats = {'rows_imported': 0, 'rows_inserted': 0, 'rows_updated': 0,
+             'rows_unchanged': 0, 'rows_rejected': 0, 'chunks': 0,
+             'ignored_columns': []}
+    touched_members = set()
+    cube_counts = []
+
+    with db_pool.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            _create_lookup_tables(conn)
+            table_columns = None
+            if mode == 'append':
+                table_columns = [name for name, _, _ in _table_columns(conn, 'checkins')]
+            # The cubes are only topped up when appending to an existing table
+            rebuild_cubes = not table_columns
+
+            derived = derived_column_names('checkins')
+            for raw_chunk in iter_upload_chunks(source, file_ext, chunksize):
+                chunk, rejected = _prepare_checkin_chunk(raw_chunk)
+                chunk = chunk.drop(columns=[ROW_HASH_COLUMN], errors='ignore')
+                locations = chunk['location'].dropna().astype(str)
+                chunk['location_id'] = locations.map(lookup_ids(conn, 'locations', locations))
+
+                if not table_columns:
+                    # replace (or first import): recreate the table keyed and
+                    # indexed, with columns typed from the first chunk
+                    column_defs = ', '.join(
+                        f'"{col}" {_sqlite_type(chunk[col].dtype)}'
+                        for col in chunk.columns if col not in derived)
+                    conn.execute('DROP TABLE IF EXISTS checkins')
+                    conn.execute(f'CREATE TABLE checkins ({column_defs})')
+                    apply_table_schema(conn, 'checkins')
+                    table_columns = [name for name, _, _ in _table_columns(conn, 'checkins')]
+
+                columns = [col for col in chunk.columns if col in table_columns]
+                ignored = [col for col in chunk.columns
+                           if col not in table_columns and col not in stats['ignored_columns']]
+                stats['ignored_columns'].extend(ignored)
+
+                counts, touched, cube_delta = upsert_checkin_chunk(
+                    conn, chunk, columns, track_cubes=not rebuild_cubes)
+                touched_members.update(touched)
+                if cube_delta is not None:
+                    cube_counts.append(cube_delta)
+
+                stats['chunks'] += 1
+                stats['rows_imported'] += len(chunk)
+                stats['rows_rejected'] += rejected
+                for name, count in counts.items():
+                    stats[f'rows_{name}'] += count
+                stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+                if progress:
+                    progress(stats)
+
+            if table_columns is None:
+                raise ImportValidationError('File contains no rows')
+
+            if rebuild_cubes:
+                rebuild_checkin_cubes(conn)
+            else:
+                apply_checkin_cube_counts(conn, pd.concat(cube_counts))
+            locations = None
+            if mode == 'append':
+                update_member_activity(conn, list(touched_members))
+                locations = member_locations(conn, touched_members)
+            else:
+                rebuild_member_activity(conn)
+                rebuild_member_risk(conn)
+            drop_staged_rows(conn, 'checkins')
+            # A re-upload that changes nothing keeps the caches warm
+            if mode != 'append' or stats['rows_inserted'] or stats['rows_updated']:
+                bump_data_version(conn, locations)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows_imported'] / elapsed) if elapsed else 0
+    return stats
+
+
+def prepare_member_frame(df):
+    """Validate member rows and fill in the columns the app relies on"""
+    # Handle flexible date column naming
+    if 'join_date' in df.columns and 'signup_date' not in df.columns:
+        df['signup_date'] = df['join_date']
+    elif 'signup_date' in df.columns and 'join_date' not in df.columns:
+        df['join_date'] = df['signup_date']
+
+    # Validate required columns
+    has_join_date = 'join_date' in df.columns
+    has_signup_date = 'signup_date' in df.columns
+
+    if not (has_join_date or has_signup_date):
+        raise ImportValidationError(
+            'Missing required column: join_date or signup_date')
+
+    required_cols = ['member_id', 'membership_type', 'location']
+    missing_cols = [col for col in required_cols if col not in df.columns]
+    if missing_cols:
+        raise ImportValidationError(f'Missing required columns: {missing_cols}')
+
+    # Add defaults
+    if 'has_personal_training' not in df.columns:
+        df['has_personal_training'] = 0
+    if 'is_active' not in df.columns:
+        df['is_active'] = 1
+    if 'monthly_fee' not in df.columns:
+        df['monthly_fee'] = df['membership_type'].map({
+            'Premium': 49.99,
+            'Basic': 29.99,
+            'Family': 79.99,
+            'Monthly': 39.99,
+            'Annual': 399.99
+        }).fillna(39.99)
+
+    df = df.drop(columns=derived_column_names('members') + [ROW_HASH_COLUMN],
+                 errors='ignore')
+    # Excel dates are stored the way sqlite3 writes datetimes
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+
+def _with_stored_member_values(conn, df, columns):
+    """`df` with `columns` set to the stored values of the members already in the table"""
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS upsert_members (member_id PRIMARY KEY)')
+    conn.execute('DELETE FROM upsert_members')
+    conn.executemany('INSERT OR IGNORE INTO upsert_members VALUES (?)',
+                     [(m,) for m in df['member_id'].dropna().unique().tolist()])
+    column_list = ', '.join(f'm."{col}"' for col in columns)
+    stored = pd.read_sql_query(f"""
+        SELECT m.member_id, {column_list}
+        FROM members m JOIN upsert_members t ON t.member_id = m.member_id
+    """, conn)
+    conn.execute('DELETE FROM upsert_members')
+
+    stored.index = stored.pop('member_id').astype(str)
+    keys = df['member_id'].astype(str)
+    existing = df['member_id'].notna() & keys.isin(stored.index)
+    df = df.copy()
+    for column in columns:
+        df[column] = df[column].where(~existing, keys.map(stored[column]))
+    return df
+
+
+def upsert_members(conn, df, columns, source_columns=None):
+    """Stage and upsert prepared member rows on member_id
+
+    Columns the source file lacked (not in `source_columns`), such as the
+    ones prepare_member_frame fills with defaults, keep their stored values
+    for existing members; only new members take the defaults. Returns
+    (counts, locations of the written members before and after).
+    """
+    if source_columns is not None:
+        missing = [col for col in columns if col not in source_columns]
+        if missing:
+            df = _with_stored_member_values(conn, df, missing)
+    counts = stage_rows(conn, 'members', df, columns)
+    written = (f'SELECT member_id FROM "{_staging_table("members")}" '
+               f'WHERE staging_state IS NOT 2')
+    member_ids = [member_id for (member_id,) in conn.execute(written)]
+    # A member who moved changes the shards of both locations
+    locations = member_locations(conn, member_ids)
+    apply_staged_rows(conn, 'members', columns)
+    derive_columns(conn, 'members', f'member_id IN ({written})')
+    update_member_risk(conn, f'm.member_id IN ({written})')
+    drop_staged_rows(conn, 'members')
+    if locations is not None:
+        locations |= member_locations(conn, member_ids)
+    return counts, locations
+
+
+def import_members_file(source, file_ext, mode='append'):
+    """Validate a member upload and write it to the members table
+
+    Appends are staged and upserted on member_id, skipping unchanged rows;
+    mode=replace (or the first import) recreates the table.
+    """
+    if file_ext == 'csv':
+        df = pd.read_csv(source)
+    else:
+        df = pd.read_excel(source)
+    source_columns = list(df.columns)
+    df = prepare_member_frame(df)
+
+    stats = {'rows_imported': len(df), 'rows_inserted': 0, 'rows_updated': 0,
+             'rows_unchanged': 0, 'ignored_columns': []}
+    with db_pool.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            table_columns = []
+            if mode == 'append':
+                table_columns = [name for name, _, _ in _table_columns(conn, 'members')]
+
+            if not table_columns:
+                df[ROW_HASH_COLUMN] = row_hashes(df, df.columns)
+                replace_table(conn, 'members', df)
+                apply_table_schema(conn, 'members')
+                rebuild_member_risk(conn)
+                # History from the replaced members no longer applies; backfilled again
+                conn.execute('DELETE FROM kpi_daily')
+                stats['rows_inserted'] = conn.execute(
+                    'SELECT COUNT(*) FROM members').fetchone()[0]
+                bump_data_version(conn)
+                conn.commit()
+                return stats
+
+            columns = [col for col in df.columns if col in table_columns]
+            stats['ignored_columns'] = [col for col in df.columns if col not in table_columns]
+            counts, locations = upsert_members(conn, df, columns, source_columns)
+            if counts['inserted'] or counts['updated']:
+                bump_data_version(conn, locations)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    for name, count in counts.items():
+        stats[f'rows_{name}'] = count
+    return stats
+
+
+@migration(8, 'row hashes for incremental imports')
+def _migration_row_hashes(conn):
+    for table in ROW_HASH_TABLES:
+        if _table_columns(conn, table):
+            apply_table_schema(conn, table)
+
+# ============================================================================
+# DELTA SYNC
+# ============================================================================
+
+# Gym management systems push deltas instead of whole exports: a feed drops
+# CSV/XLSX files into SYNC_FOLDER/<source>/ (or SYNC_FOLDER itself for the
+# default source), writing them under a dotted or .part name and renaming
+# when complete. A file's table comes from its name (members*.csv,
+# checkins*.csv); members are applied before check-ins, files in name order.
+#
+# Per source and table, a watermark records the newest checkin_date, or
+# member SYNC_MEMBER_UPDATED_COLUMN, applied so far; rows older than it are
+# skipped. The rest are upserted in SYNC_BATCH_SIZE row transactions, each
+# topping up the check-in cubes for its days and the activity rollup for its
+# members. The watermark moves when a file completes, so re-dropping a file
+# that failed part-way replays its committed batches as unchanged rows.
+# Applied files move to done/; unreadable ones to failed/ with a .error note.
+
+SYNC_FOLDER = os.environ.get('SYNC_FOLDER', os.path.join(UPLOAD_FOLDER, 'sync'))
+SYNC_POLL_SECONDS = float(os.environ.get('SYNC_POLL_SECONDS', 30))
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', 1000))
+SYNC_MEMBER_UPDATED_COLUMN = os.environ.get('SYNC_MEMBER_UPDATED_COLUMN', 'updated_at')
+SYNC_TABLES = ('members', 'checkins')
+SYNC_DEFAULT_SOURCE = 'default'
+SYNC_DONE_FOLDER = 'done'
+SYNC_FAILED_FOLDER = 'failed'
+
+os.makedirs(SYNC_FOLDER, exist_ok=True)
+
+_sync_watcher = None
+
+
+def pending_sync_files():
+    """[(source, table, path)] waiting in SYNC_FOLDER, in the order they apply
+
+    table is None for files whose name matches no SYNC_TABLES entry.
+    """
+    folders = [(SYNC_DEFAULT_SOURCE, SYNC_FOLDER)]
+    for name in sorted(os.listdir(SYNC_FOLDER)):
+        path = os.path.join(SYNC_FOLDER, name)
+        if os.path.isdir(path) and name not in (SYNC_DONE_FOLDER, SYNC_FAILED_FOLDER):
+            folders.append((name, path))
+
+    pending = []
+    for source, folder in folders:
+        files = sorted(
+            name for name in os.listdir(folder)
+            if not name.startswith('.') and allowed_file(name)
+            and os.path.isfile(os.path.join(folder, name)))
+        tables = {name: next((table for table in SYNC_TABLES
+                              if name.lower().startswith(table)), None)
+                  for name in files}
+        order = {table: position for position, table in enumerate(SYNC_TABLES)}
+        for name in sorted(files, key=lambda name: order.get(tables[name], len(order))):
+            pending.append((source, tables[name], os.path.join(folder, name)))
+    return pending
+
+
+def _sync_state_key(source, table):
+    return f'sync:{source}:{table}'
+
+
+def _member_update_stamps(chunk):
+    """Seconds since the epoch of each member row's update time (NaN if unknown)"""
+    if SYNC_MEMBER_UPDATED_COLUMN not in chunk.columns:
+        return pd.Series(np.nan, index=chunk.index)
+    parsed = pd.to_datetime(chunk[SYNC_MEMBER_UPDATED_COLUMN], errors='coerce',
+                            format='ISO8601', utc=True)
+    return (parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+
+
+def _apply_sync_batch(conn, table, chunk, table_columns, stats, source_columns=None):
+    """Upsert one batch and its rollup/cube deltas in its own transaction
+
+    The batch, its rollups and the data version bump commit together, so
+    a failed batch leaves nothing behind and is replayed on the next run.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if table == 'checkins':
+            locations = chunk['location'].dropna().astype(str)
+            chunk['location_id'] = locations.map(lookup_ids(conn, 'locations', locations))
+        columns = [col for col in chunk.columns if col in table_columns]
+        stats['ignored_columns'].extend(
+            col for col in chunk.columns
+            if col not in table_columns and col not in stats['ignored_columns'])
+
+        if table == 'checkins':
+            counts, touched, cube_delta = upsert_checkin_chunk(conn, chunk, columns)
+            drop_staged_rows(conn, 'checkins')
+            apply_checkin_cube_counts(conn, cube_delta)
+            update_member_activity(conn, list(touched))
+            locations = member_locations(conn, touched)
+        else:
+            counts, locations = upsert_members(conn, chunk, columns, source_columns)
+        if counts['inserted'] or counts['updated']:
+            bump_data_version(conn, locations)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    stats['batches'] += 1
+    for name, count in counts.items():
+        stats[f'rows_{name}'] += count
+
+
+def sync_file(source, table, path, batch_size=SYNC_BATCH_SIZE):
+    """Apply the rows of one delta file newer than the source's watermark"""
+    started = time.perf_counter()
+    stats = {'source': source, 'table': table, 'file': os.path.basename(path),
+             'rows_read': 0, 'rows_skipped': 0, 'rows_rejected': 0,
+             'rows_inserted': 0, 'rows_updated': 0, 'rows_unchanged': 0,
+             'batches': 0, 'ignored_columns': []}
+    key = _sync_state_key(source, table)
+
+    with db_pool.connection() as conn:
+        state = json.loads(get_state(conn, key) or '{}')
+        watermark = state.get('watermark')
+        table_columns = [name for name, _, _ in _table_columns(conn, table)]
+        if not table_columns:
+            raise ImportValidationError(f'No {table} table yet; import a full file first')
+        _create_lookup_tables(conn)
+        conn.commit()
+
+        newest = watermark
+        for chunk in iter_upload_chunks(path, path.rsplit('.', 1)[1].lower(), batch_size):
+            stats['rows_read'] += len(chunk)
+            if table == 'checkins':
+                chunk, rejected = _prepare_checkin_chunk(chunk)
+                chunk = chunk.drop(columns=[ROW_HASH_COLUMN], errors='ignore')
+                stamps = chunk['checkin_ts']
+                stats['rows_rejected'] += rejected
+                source_columns = None
+            else:
+                source_columns = list(chunk.columns)
+                chunk = prepare_member_frame(chunk)
+                stamps = _member_update_stamps(chunk)
+
+            if watermark is not None:
+                # Rows at the watermark are re-read; the row hash skips them
+                older = stamps < watermark
+                stats['rows_skipped'] += int(older.sum())
+                chunk, stamps = chunk[~older], stamps[~older]
+            if stamps.notna().any():
+                latest = int(stamps.max())
+                newest = latest if newest is None else max(newest, latest)
+            if not chunk.empty:
+                _apply_sync_batch(conn, table, chunk, table_columns, stats, source_columns)
+
+        stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        set_state(conn, key, json.dumps({
+            'watermark': newest,
+            'watermark_time': datetime.fromtimestamp(newest, timezone.utc).isoformat()
+            if newest is not None else None,
+            'synced_at': datetime.now().isoformat(),
+            'last_file': {name: value for name, value in stats.items()
+                          if name not in ('source', 'table')}
+        }))
+        conn.commit()
+    return stats
+
+
+def _move_sync_file(path, folder):
+    """Move a processed file into done/ or failed/ next to it; returns the new path"""
+    target_dir = os.path.join(os.path.dirname(path), folder)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(
+        target_dir, f'{datetime.now():%Y%m%dT%H%M%S}_{os.path.basename(path)}')
+    shutil.move(path, target)
+    return target
+
+
+def sync_uploads(report=None):
+    """Apply every delta file waiting in SYNC_FOLDER; returns a result per file
+
+    Unreadable files move to failed/. Other errors (e.g. a locked database)
+    leave the file in place for the next run and are raised.
+    """
+    pending = pending_sync_files()
+    results = []
+    for position, (source, table, path) in enumerate(pending):
+        try:
+            if table is None:
+                raise ImportValidationError(
+                    f'File names must start with one of: {", ".join(SYNC_TABLES)}')
+            results.append(sync_file(source, table, path))
+            _move_sync_file(path, SYNC_DONE_FOLDER)
+        except (ValueError, KeyError) as e:
+            failed = _move_sync_file(path, SYNC_FAILED_FOLDER)
+            with open(failed + '.error', 'w') as note:
+                note.write(f'{e}\n')
+            results.append({'source': source, 'table': table,
+                            'file': os.path.basename(path), 'error': str(e)})
+        if report:
+            report((position + 1) / len(pending),
+                   f'{position + 1} of {len(pending)} files applied')
+    return results
+
+
+def sync_status():
+    """Watermarks and last results per source, plus the files still waiting"""
+    sources = {}
+    for row in query_db("SELECT key, value FROM app_state WHERE key LIKE 'sync:%'"):
+        _, source, table = row['key'].split(':', 2)
+        sources.setdefault(source, {})[table] = json.loads(row['value'])
+    return {
+        'folder': SYNC_FOLDER,
+        'poll_seconds': SYNC_POLL_SECONDS,
+        'pending_files': [os.path.relpath(path, SYNC_FOLDER)
+                          for _, _, path in pending_sync_files()],
+        'sources': sources
+    }
+
+
+def schedule_upload_sync():
+    """Queue a sync_uploads job unless one is already queued or running"""
+    return submit_job_once('sync_uploads')
+
+
+def start_sync_watcher():
+    """Poll SYNC_FOLDER every SYNC_POLL_SECONDS and queue a sync for new files"""
+    global _sync_watcher
+    if SYNC_POLL_SECONDS <= 0 or (_sync_watcher and _sync_watcher.is_alive()):
+        return
+
+    def watch():
+        while True:
+            try:
+                if pending_sync_files():
+                    schedule_upload_sync()
+            except Exception as e:
+                app.logger.warning('Delta sync poll failed: %s', e)
+            time.sleep(SYNC_POLL_SECONDS)
+
+    _sync_watcher = threading.Thread(target=watch, name='churnlytics-sync', daemon=True)
+    _sync_watcher.start()
+
+
+@app.cli.command('sync-uploads')
+def sync_uploads_command():
+    """Apply the delta files waiting in SYNC_FOLDER"""
+    results = sync_uploads()
+    if not results:
+        click.echo(f'No files waiting in {SYNC_FOLDER}')
+    for result in results:
+        name = f"{result['source']}/{result['file']}"
+        if 'error' in result:
+            click.echo(f"  {name}: failed: {result['error']}")
+        else:
+            click.echo(f"  {name}: {result['rows_inserted']:,} inserted, "
+                       f"{result['rows_updated']:,} updated, "
+                       f"{result['rows_unchanged']:,} unchanged, "
+                       f"{result['rows_skipped']:,} older than the watermark")
+
+# ============================================================================
+# STREAMING EXPORT
+# ============================================================================
+
+# Exports are written sheet by sheet straight from SQLite cursors, so only
+# EXPORT_FETCH_SIZE rows are held at a time. XLSX uses openpyxl's write-only
+# workbook; CSV and Parquet exports are zips with one file per sheet. Output
+# is spooled to a file under EXPORT_FOLDER and sent from disk.
+#
+# Sheets are independent, so with EXPORT_WORKERS they are built at once in
+# forked worker processes, each written as a one-sheet export of its own,
+# and the writer's merge() assembles the parts into the final file. XLSX
+# parts are spliced in as worksheet XML (openpyxl writes strings inline, so
+# a worksheet carries no references into the rest of the workbook). The
+# report pack builds all four exports' sheets on the same pool.
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# format -> (file extension, mimetype)
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', XLSX_MIMETYPE),
+    'csv': ('csv.zip', 'application/zip'),
+    'parquet': ('parquet.zip', 'application/zip')
+}
+
+
+# Worker processes building sheets; 0 (the default on a single core) builds
+# them one after another in the calling thread
+EXPORT_WORKERS = int(os.environ.get(
+    'EXPORT_WORKERS', os.cpu_count() if (os.cpu_count() or 1) > 1 else 0))
+REPORT_PACK = 'report-pack'
+
+_export_executor = None
+_export_executor_lock = threading.Lock()
+
+
+class ExportFormatError(ValueError):
+    """Unknown or unavailable export format (reported to the client as a 400)"""
+
+
+def iter_query_batches(conn, query, params=()):
+    """Return column names and a generator of row batches for a query"""
+    cursor = conn.execute(query, params)
+    columns = [col[0] for col in cursor.description]
+
+    def batches():
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                return
+            yield rows
+
+    return columns, batches()
+
+
+def _sheet_filename(title, extension):
+    return secure_filename(title.replace(' ', '_').lower()) + '.' + extension
+
+
+class XlsxExportWriter:
+    """Sheets as worksheets of a write-only openpyxl workbook"""
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+
+    def add_sheet(self, title, columns, batches):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        sheet = self.workbook.create_sheet(title)
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=column)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        for batch in batches:
+            for row in batch:
+                sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+    @classmethod
+    def merge(cls, parts, titles, path):
+        """Combine one-sheet workbooks into one, sheets in order"""
+        # A skeleton with the same sheets and header style provides the
+        # workbook parts; only its worksheets are replaced
+        skeleton = io.BytesIO()
+        writer = cls(skeleton)
+        for title in titles:
+            writer.add_sheet(title, [''], [])
+        writer.close()
+
+        with zipfile.ZipFile(skeleton) as base, \
+                zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as out:
+            styles = base.read('xl/styles.xml')
+            for position, part in enumerate(parts):
+                with zipfile.ZipFile(part) as source:
+                    if source.read('xl/styles.xml') != styles:
+                        raise ValueError(f'Sheet {titles[position]!r} uses other cell styles')
+            for item in base.infolist():
+                match = re.fullmatch(r'xl/worksheets/sheet(\d+)\.xml', item.filename)
+                if match is None:
+                    out.writestr(item, base.read(item))
+                    continue
+                with zipfile.ZipFile(parts[int(match.group(1)) - 1]) as source, \
+                        source.open('xl/worksheets/sheet1.xml') as sheet, \
+                        out.open(item.filename, 'w', force_zip64=True) as target:
+                    shutil.copyfileobj(sheet, target, 1024 * 1024)
+
+
+def _merge_archives(parts, path, compression):
+    """Copy every file of the zip archives at `parts` into one at `path`"""
+    with zipfile.ZipFile(path, 'w', compression) as out:
+        for part in parts:
+            with zipfile.ZipFile(part) as source:
+                for item in source.infolist():
+                    with source.open(item) as data, \
+                            out.open(item.filename, 'w', force_zip64=True) as target:
+                        shutil.copyfileobj(data, target, 1024 * 1024)
+
+
+class CsvExportWriter:
+    """Sheets as CSV files inside a zip archive"""
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    @staticmethod
+    def merge(parts, titles, path):
+        _merge_archives(parts, path, zipfile.ZIP_DEFLATED)
+
+    def add_sheet(self, title, columns, batches):
+        name = _sheet_filename(title, 'csv')
+        with self.archive.open(name, 'w', force_zip64=True) as raw:
+            with io.TextIOWrapper(raw, encoding='utf-8', newline='') as text:
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                for batch in batches:
+                    writer.writerows(batch)
+
+    def close(self):
+        self.archive.close()
+
+
+class ParquetExportWriter:
+    """Sheets as Parquet files inside a zip archive, one row group per batch"""
+
+    def __init__(self, path):
+        pa, pq = _require_pyarrow()
+        self.pa, self.pq = pa, pq
+        # Parquet pages are already compressed
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+
+    @staticmethod
+    def merge(parts, titles, path):
+        _merge_archives(parts, path, zipfile.ZIP_STORED)
+
+    def _table(self, columns, rows, schema):
+        pa = self.pa
+        arrays = []
+        for i, values in enumerate(zip(*rows)):
+            if schema is None:
+                try:
+                    array = pa.array(values)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    array = pa.array([None if v is None else str(v) for v in values])
+                if pa.types.is_null(array.type):
+                    array = array.cast(pa.string())
+            else:
+                target = schema.field(i).type
+                if pa.types.is_string(target):
+                    values = [None if v is None else str(v) for v in values]
+                array = pa.array(values, type=target)
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, names=columns)
+
+    def add_sheet(self, title, columns, batches):
+        name = _sheet_filename(title, 'parquet')
+        with self.archive.open(name, 'w', force_zip64=True) as raw:
+            writer = None
+            for batch in batches:
+                table = self._table(columns, batch, writer.schema if writer else None)
+                if writer is None:
+                    writer = self.pq.ParquetWriter(raw, table.schema)
+                writer.write_table(table)
+            if writer is None:
+                schema = self.pa.schema([(column, self.pa.string()) for column in columns])
+                writer = self.pq.ParquetWriter(raw, schema)
+            writer.close()
+
+    def close(self):
+        self.archive.close()
+
+
+EXPORT_WRITERS = {
+    'xlsx': XlsxExportWriter,
+    'csv': CsvExportWriter,
+    'parquet': ParquetExportWriter
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError('Parquet export requires the pyarrow package')
+    return pa, pq
+
+
+def _reset_export_executor():
+    global _export_executor
+    _export_executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_export_executor)
+
+
+def _init_export_worker(db_path):
+    """Give an export worker a connection pool of its own"""
+    global db_pool
+    db_pool = ConnectionPool(db_path)
+
+
+def export_pool():
+    """The export process pool, or None where sheets are built in-process
+
+    Workers are spawned, not forked: forking the threaded server could copy
+    a lock some other thread holds. Each imports the app afresh and opens
+    its own connection pool.
+    """
+    global _export_executor
+    if EXPORT_WORKERS <= 0:
+        return None
+    with _export_executor_lock:
+        if _export_executor is None:
+            _export_executor = ProcessPoolExecutor(
+                max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_export_worker, initargs=(DB_PATH,))
+        return _export_executor
+
+
+def _write_sheets(writer, sheets):
+    try:
+        with db_pool.connection() as conn:
+            for title, build in sheets:
+                writer.add_sheet(title, *build(conn))
+    finally:
+        writer.close()
+
+
+def _write_sheet_part(name, position, fmt, path):
+    """Write one sheet of export `name` as a one-sheet export (in a worker)"""
+    _write_sheets(EXPORT_WRITERS[fmt](path), EXPORTS[name][0][position:position + 1])
+
+
+def write_exports(exports):
+    """Build each (name, format, path) export, all sheets at once on the export pool"""
+    executor = export_pool()
+    if executor is None:
+        for name, fmt, path in exports:
+            _write_sheets(EXPORT_WRITERS[fmt](path), EXPORTS[name][0])
+        return
+
+    folder = tempfile.mkdtemp(prefix='parts-', dir=EXPORT_FOLDER)
+    futures = {}
+
+    def part_path(number, position):
+        return os.path.join(folder, f'{number}-{position}.{EXPORT_FORMATS[exports[number][1]][0]}')
+
+    try:
+        # Every export's first (largest) sheet is started first
+        tasks = sorted(((position, number, name, fmt)
+                        for number, (name, fmt, _) in enumerate(exports)
+                        for position in range(len(EXPORTS[name][0]))), key=lambda task: task[0])
+        for position, number, name, fmt in tasks:
+            futures[executor.submit(
+                _write_sheet_part, name, position, fmt, part_path(number, position))] = number
+        # Each export is merged as soon as its last sheet is done
+        remaining = [len(EXPORTS[name][0]) for name, _, _ in exports]
+        for future in as_completed(futures):
+            future.result()
+            number = futures[future]
+            remaining[number] -= 1
+            if remaining[number] == 0:
+                name, fmt, path = exports[number]
+                sheets = EXPORTS[name][0]
+                EXPORT_WRITERS[fmt].merge(
+                    [part_path(number, position) for position in range(len(sheets))],
+                    [title for title, _ in sheets], path)
+    except BrokenProcessPool:
+        _reset_export_executor()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def write_report_pack(fmt, path):
+    """Every export in format `fmt`, stored together in one zip at `path`"""
+    folder = tempfile.mkdtemp(prefix='pack-', dir=EXPORT_FOLDER)
+    try:
+        files = [(name, fmt, os.path.join(folder, _export_download_name(name, fmt)))
+                 for name in EXPORTS]
+        write_exports(files)
+        # The exports are compressed already
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as pack:
+            for _, _, file in files:
+                pack.write(file, os.path.basename(file))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def write_export(name, fmt, path):
+    """Build export `name` (or the report pack) in format `fmt` at `path`"""
+    if name == REPORT_PACK:
+        write_report_pack(fmt, path)
+    else:
+        write_exports([(name, fmt, path)])
+
+
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+
+# Imports and exports can run outside the request thread: the request is
+# recorded in the jobs table, the work runs on a small thread pool, and the
+# client polls /api/jobs/<id>. Jobs live in SQLite, so queued jobs and jobs
+# whose worker process died are picked up again on the next startup.
+
+JOB_HANDLERS = {}
+
+# Live progress of jobs running in this process. Imports hold the SQLite write
+# lock for their whole transaction, so progress is kept in memory and only the
+# final state is written to the jobs table.
+_job_progress = {}
+
+# Jobs the app queues on its own (at most one of each kind at a time). They
+# run on their own pool, so a user's import or export never waits behind them.
+MAINTENANCE_JOBS = ('score_members', 'snapshot_kpis', 'sync_columnar',
+                    'sync_shards', 'sync_uploads')
+
+_job_executors = {}
+_job_executor_lock = threading.Lock()
+
+
+@migration(4, 'background jobs')
+def _migration_jobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params TEXT,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+
+
+def job_handler(kind):
+    """Register func(job_id, params, report) -> result dict for a job kind"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _executor(kind):
+    """The thread pool running jobs of `kind`"""
+    pool = 'maintenance' if kind in MAINTENANCE_JOBS else 'job'
+    with _job_executor_lock:
+        if pool not in _job_executors:
+            _job_executors[pool] = ThreadPoolExecutor(
+                max_workers=MAINTENANCE_WORKERS if pool == 'maintenance' else JOB_WORKERS,
+                thread_name_prefix=f'churnlytics-{pool}')
+        return _job_executors[pool]
+
 
+def _reset_executor():
+    global _job_executor_lock
+    _job_executors.clear()
+    _job_executor_lock = threading.Lock()
 
-@app.route('/api/revenue', methods=['GET'])
-def get_revenue_metrics():
-    """Get revenue and financial metrics"""
 
-    # Monthly revenue trend
-    monthly_revenue = """
-        SELECT 
-            strftime('%Y-%m', date) as month,
-            SUM(amount) as revenue,
-            COUNT(*) as transaction_count
-        FROM sales
-        WHERE date >= date('now', '-12 months')
-        GROUP BY month
-        ORDER BY month
-    """
-    revenue_trend = query_db(monthly_revenue)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executor)
 
-    # Revenue by type
-    revenue_by_type = """
-        SELECT 
-            type,
-            SUM(amount) as total_revenue,
-            COUNT(*) as transaction_count,
-            ROUND(AVG(amount), 2) as avg_transaction
-        FROM sales
-        GROUP BY type
-    """
-    by_type = query_db(revenue_by_type)
 
-    # Revenue by location
-    revenue_by_location = """
-        SELECT 
-            location,
-            SUM(amount) as total_revenue,
-            COUNT(*) as transaction_count
-        FROM sales
-        GROUP BY location
-    """
-    by_location = query_db(revenue_by_location)
+def submit_job(kind, params):
+    """Record a queued job and hand it to the thread pool; returns its id"""
+    job_id = uuid.uuid4().hex
+    with db_pool.connection() as conn:
+        conn.execute(
+            'INSERT INTO jobs (job_id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, kind, 'queued', json.dumps(params), datetime.now().isoformat()))
+        conn.commit()
+    _executor(kind).submit(_run_job, job_id)
+    return job_id
 
-    # Member Lifetime Value by membership type
-    ltv_query = """
-        SELECT 
-            m.membership_type,
-            COUNT(DISTINCT m.member_id) as member_count,
-            ROUND(AVG(
-                CASE 
-                    WHEN m.is_active = 1 THEN 
-                        m.monthly_fee * CAST((julianday('now') - julianday(COALESCE(m.signup_date, m.join_date))) / 30 AS REAL)
-                    ELSE 
-                        m.monthly_fee * CAST((julianday(m.cancellation_date) - julianday(COALESCE(m.signup_date, m.join_date))) / 30 AS REAL)
-                END
-            ), 2) as avg_ltv
-        FROM members m
-        GROUP BY m.membership_type
-        ORDER BY avg_ltv DESC
-    """
-    ltv_stats = query_db(ltv_query)
 
-    # Current MRR and growth
-    mrr_query = """
-        SELECT 
-            SUM(COALESCE(m.monthly_fee, 39.99)) as current_mrr,
-            COUNT(*) as active_count
-        FROM members
-        WHERE is_active = 1
+def submit_job_once(kind, params=None):
+    """submit_job unless a job of this kind is already queued or running
+
+    The check and the insert are one statement, so concurrent callers queue
+    a single job between them.
     """
-    mrr_data = query_db(mrr_query)[0]
+    job_id = uuid.uuid4().hex
+    with db_pool.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            inserted = conn.execute("""
+                INSERT INTO jobs (job_id, kind, status, params, created_at)
+                SELECT ?, ?, 'queued', ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM jobs WHERE kind = ? AND status IN ('queued', 'running')
+                )
+            """, (job_id, kind, json.dumps(params or {}), datetime.now().isoformat(),
+                  kind)).rowcount
+            if not inserted:
+                job_id = conn.execute("""
+                    SELECT job_id FROM jobs
+                    WHERE kind = ? AND status IN ('queued', 'running')
+                """, (kind,)).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if inserted:
+        _executor(kind).submit(_run_job, job_id)
+    return job_id
+
+
+def _update_job(job_id, **fields):
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    with db_pool.connection() as conn:
+        conn.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?',
+                     (*fields.values(), job_id))
+        conn.commit()
+
+
+def _run_job(job_id):
+    # Claim the job first so only one process ever runs it
+    with db_pool.connection() as conn:
+        claimed = conn.execute("""
+            UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ?
+            WHERE job_id = ? AND status = 'queued'
+        """, (datetime.now().isoformat(), os.getpid(), job_id)).rowcount
+        conn.commit()
+        row = conn.execute(
+            'SELECT kind, params FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+    if not claimed:
+        return
+
+    kind, params = row[0], json.loads(row[1] or '{}')
+
+    def report(progress, message=None):
+        _job_progress[job_id] = (round(min(max(progress, 0.0), 1.0), 4), message)
 
-    return jsonify({
-        'monthly_revenue_trend': revenue_trend,
-        'revenue_by_type': by_type,
-        'revenue_by_location': by_location,
-        'ltv_by_membership': ltv_stats,
-        'current_mrr': mrr_data['current_mrr'],
-        'active_paying_members': mrr_data['active_count']
-    })
+    try:
+        result = JOB_HANDLERS[kind](job_id, params, report)
+        _update_job(job_id, status='succeeded', progress=1.0,
+                    message=_job_progress.get(job_id, (0, None))[1],
+                    result=json.dumps(result), finished_at=datetime.now().isoformat())
+    except Exception as e:
+        _update_job(job_id, status='failed', error=str(e),
+                    finished_at=datetime.now().isoformat())
+    finally:
+        _job_progress.pop(job_id, None)
+
+
+def get_job(job_id):
+    """Job row as a dict with params/result decoded, or None"""
+    rows = query_db('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+    if not rows:
+        return None
+    job = rows[0]
+    if job['status'] == 'running' and job_id in _job_progress:
+        job['progress'], job['message'] = _job_progress[job_id]
+    job['params'] = json.loads(job['params'] or '{}')
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def _pid_alive(pid):
+    if not pid or os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def resume_jobs():
+    """Requeue interrupted jobs, dispatch queued ones and purge old jobs"""
+    cutoff = (datetime.now() - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+    with db_pool.connection() as conn:
+        running = conn.execute(
+            "SELECT job_id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        for job_id, pid in running:
+            if pid != os.getpid() and not _pid_alive(pid):
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', progress = 0 WHERE job_id = ? AND status = 'running'",
+                    (job_id,))
+
+        expired = conn.execute(
+            "SELECT job_id, result FROM jobs WHERE finished_at < ?", (cutoff,)).fetchall()
+        for job_id, result in expired:
+            path = (json.loads(result) or {}).get('file_path') if result else None
+            if path and os.path.exists(path):
+                os.remove(path)
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+        conn.commit()
+
+        queued = conn.execute(
+            "SELECT job_id, kind FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+    for job_id, kind in queued:
+        _executor(kind).submit(_run_job, job_id)
+
+
+def _wants_async():
+    return request.values.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def _queued_response(job_id):
+    status_url = f'/api/jobs/{job_id}'
+    response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+def _queue_import(kind, file, filename, mode):
+    """Persist the upload under UPLOAD_FOLDER and queue an import job"""
+    path = os.path.join(UPLOAD_FOLDER, f'{uuid.uuid4().hex}_{filename}')
+    file.save(path)
+    return _queued_response(submit_job(kind, {
+        'path': path,
+        'file_ext': filename.rsplit('.', 1)[1].lower(),
+        'mode': mode
+    }))
+
+
+@job_handler('import_checkins')
+def _import_checkins_job(job_id, params, report):
+    path = params['path']
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as source:
+            def progress(stats):
+                # CSV progress by bytes consumed; XLSX only reports rows
+                fraction = source.tell() / size if params['file_ext'] == 'csv' else 0
+                report(min(fraction, 0.99),
+                       f'{stats["rows_imported"]:,} check-ins imported')
 
+            return stream_import_checkins(
+                source, params['file_ext'], params['mode'], progress=progress)
+    finally:
+        os.remove(path)
 
-@app.route('/api/sales-funnel', methods=['GET'])
-def get_sales_funnel():
-    """Get sales funnel and conversion metrics"""
 
-    # sales
-    sales_query = """
-    SELECT
-        COUNT(*) as total_sales,
-        SUM(amount) as total_revenue,
-        COUNT(DISTINCT product) as total_products
-    FROM sales
-"""
-    sales = query_db(sales_query)
+@job_handler('import_members')
+def _import_members_job(job_id, params, report):
+    try:
+        return import_members_file(params['path'], params['file_ext'], params['mode'])
+    finally:
+        os.remove(params['path'])
 
-    # Overall conversion funnel
-    funnel_query = """
-        SELECT 
-            COUNT(*) as total_leads,
-            SUM(CASE WHEN tour_scheduled = 1 THEN 1 ELSE 0 END) as tours_scheduled,
-            SUM(CASE WHEN tour_completed = 1 THEN 1 ELSE 0 END) as tours_completed,
-            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions
-        FROM leads
-    """
-    funnel = query_db(funnel_query)[0]
 
-    # Calculate conversion rates
-    funnel['tour_schedule_rate'] = round(
-        (funnel['tours_scheduled'] / funnel['total_leads']) * 100, 1) if funnel['total_leads'] > 0 else 0
-    funnel['tour_completion_rate'] = round(
-        (funnel['tours_completed'] / funnel['tours_scheduled']) * 100, 1) if funnel['tours_scheduled'] > 0 else 0
-    funnel['conversion_rate'] = round(
-        (funnel['conversions'] / funnel['tours_completed']) * 100, 1) if funnel['tours_completed'] > 0 else 0
-    funnel['overall_conversion'] = round(
-        (funnel['conversions'] / funnel['total_leads']) * 100, 1) if funnel['total_leads'] > 0 else 0
+@job_handler('score_members')
+def _score_members_job(job_id, params, report):
+    return score_members()
 
-    # By lead source
-    source_performance = """
-        SELECT 
-            lead_source,
-            COUNT(*) as leads,
-            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
-            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
-        FROM leads
-        GROUP BY lead_source
-        ORDER BY conversion_rate DESC
-    """
-    by_source = query_db(source_performance)
 
-    # By location
-    location_performance = """
-        SELECT 
-            location,
-            COUNT(*) as leads,
-            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
-            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
-        FROM leads
-        GROUP BY location
-    """
-    by_location = query_db(location_performance)
+@job_handler('snapshot_kpis')
+def _snapshot_kpis_job(job_id, params, report):
+    return snapshot_kpis(params.get('backfill', False))
 
-    # Monthly trend
-    monthly_trend = """
-        SELECT 
-            strftime('%Y-%m', date) as month,
-            COUNT(*) as leads,
-            SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) as conversions,
-            ROUND(100.0 * SUM(CASE WHEN converted_to_member = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as conversion_rate
-        FROM leads
-        WHERE date >= date('now', '-6 months')
-        GROUP BY month
-        ORDER BY month
-    """
-    trend = query_db(monthly_trend)
 
-    return jsonify({
-        'funnel_overview': funnel,
-        'by_source': by_source,
-        'by_location': by_location,
-        'monthly_trend': trend
-    })
+@job_handler('sync_columnar')
+def _sync_columnar_job(job_id, params, report):
+    return sync_columnar_store(report)
 
 
-@app.route('/api/location-comparison', methods=['GET'])
-def get_location_comparison():
-    """Compare performance between locations"""
+@job_handler('sync_shards')
+def _sync_shards_job(job_id, params, report):
+    return sync_shards(report)
 
-    # Key metrics by location
-    comparison_query = """
-        SELECT 
-            location,
-            COUNT(DISTINCT m.member_id) as total_members,
-            SUM(CASE WHEN m.is_active = 1 THEN 1 ELSE 0 END) as active_members,
-            ROUND(100.0 * SUM(CASE WHEN m.is_active = 1 THEN 1 ELSE 0 END) / COUNT(*), 1) as retention_rate,
-            SUM(CASE WHEN m.is_active = 1 THEN COALESCE(m.monthly_fee, 39.99) ELSE 0 END) as mrr,
-            COUNT(DISTINCT CASE WHEN m.has_personal_training = 1 THEN m.member_id END) as pt_members,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN m.has_personal_training = 1 THEN m.member_id END) / COUNT(*), 1) as pt_attachment_rate
-        FROM members m
-        GROUP BY location
-    """
-    metrics = query_db(comparison_query)
 
-    # Check-ins comparison
-    checkins_comparison = """
-        SELECT 
-            m.location,
-            COUNT(c.checkin_id) as total_checkins,
-            COUNT(DISTINCT c.member_id) as unique_visitors,
-            ROUND(COUNT(c.checkin_id) * 1.0 / NULLIF(COUNT(DISTINCT m.member_id), 0), 1) as avg_visits_per_member
-        FROM members m
-        LEFT JOIN checkins c ON m.member_id = c.member_id 
-            AND c.checkin_date >= date('now', '-30 days')
-        WHERE m.is_active = 1
-        GROUP BY m.location
-    """
-    checkins = query_db(checkins_comparison)
+@job_handler('sync_uploads')
+def _sync_uploads_job(job_id, params, report):
+    return {'files': sync_uploads(report)}
 
-    # Sales comparison
-    sales_comparison = """
-        SELECT 
-            location,
-            SUM(amount) as total_revenue,
-            COUNT(*) as transactions,
-            ROUND(AVG(amount), 2) as avg_transaction
-        FROM sales
-        GROUP BY location
-    """
-    sales = query_db(sales_comparison)
 
-    return jsonify({
-        'key_metrics': metrics,
-        'engagement': checkins,
-        'revenue': sales
-    })
+@job_handler('export')
+def _export_job(job_id, params, report):
+    name, fmt = params['export'], params.get('format', 'xlsx')
+    extension, mimetype = export_file_type(name, fmt)
+    path = os.path.join(EXPORT_FOLDER, f'{job_id}.{extension}')
+    report(0, f'Building {name} export')
+    try:
+        write_export(name, fmt, path)
+    except Exception:
+        _remove_export_file(path)
+        raise
+    return {
+        'file_path': path,
+        'download_name': _export_download_name(name, fmt),
+        'mimetype': mimetype,
+        'bytes': os.path.getsize(path)
+    }
 
 # ============================================================================
 # IMPORT/EXPORT ENDPOINTS
@@ -722,59 +5854,28 @@ def import_members():
 
         file = request.files['file']
         filename = secure_filename(file.filename)
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type'}), 400
         file_ext = filename.rsplit('.', 1)[1].lower()
 
-        if file_ext == 'csv':
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-
-        # Handle flexible date column naming
-        if 'join_date' in df.columns and 'signup_date' not in df.columns:
-            df['signup_date'] = df['join_date']
-        elif 'signup_date' in df.columns and 'join_date' not in df.columns:
-            df['join_date'] = df['signup_date']
-
-        # Validate required columns
-        has_join_date = 'join_date' in df.columns
-        has_signup_date = 'signup_date' in df.columns
-
-        if not (has_join_date or has_signup_date):
-            return jsonify({'error': 'Missing required column: join_date or signup_date'}), 400
-
-        required_cols = ['member_id', 'membership_type', 'location']
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            return jsonify({'error': f'Missing required columns: {missing_cols}'}), 400
-
-        # Add defaults
-        if 'has_personal_training' not in df.columns:
-            df['has_personal_training'] = 0
-        if 'is_active' not in df.columns:
-            df['is_active'] = 1
-        if 'monthly_fee' not in df.columns:
-            df['monthly_fee'] = df['membership_type'].map({
-                'Premium': 49.99,
-                'Basic': 29.99,
-                'Family': 79.99,
-                'Monthly': 39.99,
-                'Annual': 399.99
-            }).fillna(39.99)
-
-        conn = sqlite3.connect(DB_PATH)
         mode = request.form.get('mode', 'append')
-        if_exists = 'append' if mode == 'append' else 'replace'
+        if mode != 'append':
+            mode = 'replace'
 
-        df.to_sql('members', conn, if_exists=if_exists, index=False)
-        conn.close()
+        if _wants_async():
+            return _queue_import('import_members', file, filename, mode)
+
+        stats = import_members_file(file.stream, file_ext, mode)
 
         return jsonify({
             'success': True,
-            'message': f'Imported {len(df)} members',
-            'rows_imported': len(df),
-            'mode': mode
+            'message': f'Imported {stats["rows_imported"]} members',
+            'mode': mode,
+            **stats
         })
 
+    except ImportValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Import failed: {str(e)}'}), 500
 
@@ -788,215 +5889,317 @@ def import_checkins():
 
         file = request.files['file']
         filename = secure_filename(file.filename)
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type'}), 400
         file_ext = filename.rsplit('.', 1)[1].lower()
 
-        if file_ext == 'csv':
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-
-        # Handle both column names
-        if 'checkin_datetime' in df.columns and 'checkin_date' not in df.columns:
-            df['checkin_date'] = df['checkin_datetime']
-
-        required_cols = ['member_id', 'checkin_date', 'location']
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            return jsonify({'error': f'Missing required columns: {missing_cols}'}), 400
-
-        conn = sqlite3.connect(DB_PATH)
         mode = request.form.get('mode', 'append')
-        if_exists = 'append' if mode == 'append' else 'replace'
+        if mode != 'append':
+            mode = 'replace'
 
-        df.to_sql('checkins', conn, if_exists=if_exists, index=False)
-        conn.close()
+        if _wants_async():
+            return _queue_import('import_checkins', file, filename, mode)
+
+        stats = stream_import_checkins(file.stream, file_ext, mode)
 
         return jsonify({
             'success': True,
-            'message': f'Imported {len(df)} check-ins',
-            'rows_imported': len(df),
-            'mode': mode
+            'message': f'Imported {stats["rows_imported"]} check-ins',
+            'mode': mode,
+            **stats
         })
 
+    except ImportValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Import failed: {str(e)}'}), 500
 
 
-@app.route('/api/export/overview', methods=['GET'])
-def export_overview():
-    """Export overview data to Excel"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        members_df = pd.read_sql_query("SELECT * FROM members", conn)
-        checkins_df = pd.read_sql_query("SELECT * FROM checkins", conn)
-
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            members_df.to_excel(writer, sheet_name='Members', index=False)
-            summary = pd.DataFrame({
-                'Metric': ['Total Members', 'Active Members', 'Total Check-ins'],
-                'Value': [len(members_df), len(members_df[members_df['is_active'] == 1]), len(checkins_df)]
-            })
-            summary.to_excel(writer, sheet_name='Summary', index=False)
+def _source_columns(conn, table, alias):
+    """The table's columns as loaded, without the derived ones or the row hash"""
+    derived = derived_column_names(table) + [ROW_HASH_COLUMN]
+    return ', '.join(f'{alias}."{name}"' for name, _, _ in _table_columns(conn, table)
+                     if name not in derived)
 
-        conn.close()
-        output.seek(0)
 
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'overview_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
+# Each sheet builder takes a connection and returns (columns, row batches)
 
-    except Exception as e:
-        return jsonify({'error': f'Export failed: {str(e)}'}), 500
+def overview_members_sheet(conn):
+    return iter_query_batches(
+        conn, f"SELECT {_source_columns(conn, 'members', 'm')} FROM members m")
 
 
-@app.route('/api/export/at-risk', methods=['GET'])
-def export_at_risk():
-    """Export at-risk members to Excel"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
+def overview_summary_sheet(conn):
+    """Headline counts"""
+    total, active = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(is_active = 1), 0) FROM members").fetchone()
+    checkins = conn.execute("SELECT COUNT(*) FROM checkins").fetchone()[0]
+    return ['Metric', 'Value'], [[
+        ('Total Members', total),
+        ('Active Members', active),
+        ('Total Check-ins', checkins)
+    ]]
+
 
-        query = """
+AT_RISK_EXPORT_QUERY = """
+    SELECT *,
+        CASE
+            WHEN days_since_checkin IS NULL OR days_since_checkin > 30 THEN 'High'
+            WHEN days_since_checkin > 14 THEN 'Medium'
+            ELSE 'Low'
+        END as risk_level
+    FROM (
         SELECT 
             m.member_id,
             m.membership_type,
             m.location,
             COALESCE(m.join_date, m.signup_date) as join_date,
-            COALESCE(m.monthly_fee, 39.99),
-            MAX(c.checkin_date) as last_checkin,
-            julianday('now') - julianday(MAX(c.checkin_date)) as days_since_checkin,
-            COUNT(c.checkin_id) as total_checkins
+            COALESCE(m.monthly_fee, 39.99) as monthly_fee,
+            a.last_checkin,
+            (strftime('%s', 'now') - a.last_checkin_ts) / 86400.0 as days_since_checkin,
+            COALESCE(a.total_checkins, 0) as total_checkins
         FROM members m
-        LEFT JOIN checkins c ON m.member_id = c.member_id
+        LEFT JOIN member_activity a ON m.member_id = a.member_id
         WHERE m.is_active = 1
-        GROUP BY m.member_id
-        HAVING days_since_checkin > 7 OR days_since_checkin IS NULL
-        ORDER BY days_since_checkin DESC
-        """
+            AND (a.last_checkin_ts IS NULL
+                 OR a.last_checkin_ts < strftime('%s', 'now') - 7 * 86400)
+    )
+"""
 
-        df = pd.read_sql_query(query, conn)
-        df['risk_level'] = df['days_since_checkin'].apply(
-            lambda x: 'High' if pd.isna(x) or x > 30 else (
-                'Medium' if x > 14 else 'Low')
-        )
 
-        conn.close()
+AT_RISK_SCORED_EXPORT_QUERY = """
+    SELECT 
+        m.member_id,
+        m.membership_type,
+        m.location,
+        COALESCE(m.join_date, m.signup_date) as join_date,
+        COALESCE(m.monthly_fee, 39.99) as monthly_fee,
+        a.last_checkin,
+        (strftime('%s', 'now') - a.last_checkin_ts) / 86400.0 as days_since_checkin,
+        COALESCE(a.total_checkins, 0) as total_checkins,
+        s.churn_probability,
+        s.risk_level
+    FROM member_scores s
+    JOIN members m ON m.member_id = s.member_id
+    LEFT JOIN member_activity a ON m.member_id = a.member_id
+    WHERE m.is_active = 1 AND s.churn_probability >= {threshold}
+"""
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='At-Risk Members', index=False)
-            summary = df.groupby('risk_level').agg({
-                'member_id': 'count',
-                'monthly_fee': 'sum'
-            }).reset_index()
-            summary.columns = ['Risk Level', 'Member Count', 'Revenue at Risk']
-            summary.to_excel(writer, sheet_name='Summary', index=False)
-
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'at_risk_members_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
 
-    except Exception as e:
-        return jsonify({'error': f'Export failed: {str(e)}'}), 500
+def _at_risk_export_query():
+    """(query, ORDER BY clause): by churn score when scored, else by recency"""
+    if scores_available():
+        query = AT_RISK_SCORED_EXPORT_QUERY.format(threshold=float(CHURN_MEDIUM_RISK))
+        return query, " ORDER BY churn_probability DESC"
+    return AT_RISK_EXPORT_QUERY, " ORDER BY days_since_checkin DESC"
 
 
-@app.route('/api/export/churn-analysis', methods=['GET'])
-def export_churn_analysis():
-    """Export churn analysis to Excel"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
+def at_risk_members_sheet(conn):
+    query, order = _at_risk_export_query()
+    return iter_query_batches(conn, query + order)
+
 
-        query = """
-        SELECT m.*, COUNT(c.checkin_id) as total_checkins,
-               MAX(c.checkin_date) as last_checkin
+def at_risk_summary_sheet(conn):
+    """Revenue at risk by risk level"""
+    query, _ = _at_risk_export_query()
+    summary = conn.execute(f"""
+        SELECT risk_level, COUNT(*), TOTAL(monthly_fee)
+        FROM ({query})
+        GROUP BY risk_level
+        ORDER BY risk_level
+    """).fetchall()
+    return ['Risk Level', 'Member Count', 'Revenue at Risk'], [summary]
+
+
+def _group_counts(conn, column, where):
+    return conn.execute(f"""
+        SELECT {column}, COUNT(*) FROM members
+        WHERE {where} AND {column} IS NOT NULL
+        GROUP BY {column} ORDER BY {column}
+    """).fetchall()
+
+
+def churned_members_sheet(conn):
+    return iter_query_batches(conn, f"""
+        SELECT {_source_columns(conn, 'members', 'm')},
+               COALESCE(a.total_checkins, 0) as total_checkins,
+               a.last_checkin
         FROM members m
-        LEFT JOIN checkins c ON m.member_id = c.member_id
+        LEFT JOIN member_activity a ON m.member_id = a.member_id
         WHERE m.is_active = 0
-        GROUP BY m.member_id
-        """
+    """)
 
-        churned_df = pd.read_sql_query(query, conn)
-        churn_by_type = churned_df.groupby(
-            'membership_type').size().reset_index(name='churned_count')
-        churn_by_location = churned_df.groupby(
-            'location').size().reset_index(name='churned_count')
 
-        conn.close()
+def churn_by_type_sheet(conn):
+    return (['membership_type', 'churned_count'],
+            [_group_counts(conn, 'membership_type', 'is_active = 0')])
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            churned_df.to_excel(
-                writer, sheet_name='Churned Members', index=False)
-            churn_by_type.to_excel(
-                writer, sheet_name='Churn by Type', index=False)
-            churn_by_location.to_excel(
-                writer, sheet_name='Churn by Location', index=False)
-
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'churn_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
 
-    except Exception as e:
-        return jsonify({'error': f'Export failed: {str(e)}'}), 500
+def churn_by_location_sheet(conn):
+    return ['location', 'churned_count'], [_group_counts(conn, 'location', 'is_active = 0')]
 
 
-@app.route('/api/export/revenue', methods=['GET'])
-def export_revenue():
-    """Export revenue data to Excel"""
+def _revenue_by(conn, column):
+    return conn.execute(f"""
+        SELECT {column}, TOTAL(monthly_fee), AVG(monthly_fee), COUNT(monthly_fee)
+        FROM members
+        WHERE is_active = 1 AND {column} IS NOT NULL
+        GROUP BY {column} ORDER BY {column}
+    """).fetchall()
+
+
+def active_members_sheet(conn):
+    return iter_query_batches(
+        conn, f"SELECT {_source_columns(conn, 'members', 'm')} FROM members m "
+              "WHERE m.is_active = 1")
+
+
+def revenue_by_type_sheet(conn):
+    return (['Membership Type', 'Total Revenue', 'Avg Revenue', 'Member Count'],
+            [_revenue_by(conn, 'membership_type')])
+
+
+def revenue_by_location_sheet(conn):
+    return (['Location', 'Total Revenue', 'Avg Revenue', 'Member Count'],
+            [_revenue_by(conn, 'location')])
+
+
+def revenue_summary_sheet(conn):
+    mrr, active, average = conn.execute("""
+        SELECT TOTAL(monthly_fee), COUNT(*), AVG(monthly_fee)
+        FROM members WHERE is_active = 1
+    """).fetchone()
+    return ['Metric', 'Value'], [[
+        ('Total MRR', mrr),
+        ('Active Members', active),
+        ('Avg Revenue/Member', average)
+    ]]
+
+
+# export name -> ([(sheet title, sheet builder)], download filename prefix)
+EXPORTS = {
+    'overview': ([
+        ('Members', overview_members_sheet),
+        ('Summary', overview_summary_sheet)
+    ], 'overview_report'),
+    'at-risk': ([
+        ('At-Risk Members', at_risk_members_sheet),
+        ('Summary', at_risk_summary_sheet)
+    ], 'at_risk_members'),
+    'churn-analysis': ([
+        ('Churned Members', churned_members_sheet),
+        ('Churn by Type', churn_by_type_sheet),
+        ('Churn by Location', churn_by_location_sheet)
+    ], 'churn_analysis'),
+    'revenue': ([
+        ('Active Members', active_members_sheet),
+        ('Revenue by Type', revenue_by_type_sheet),
+        ('Revenue by Location', revenue_by_location_sheet),
+        ('Summary', revenue_summary_sheet)
+    ], 'revenue_report')
+}
+
+
+def export_file_type(name, fmt):
+    """(file extension, mimetype) of export `name` in format `fmt`"""
+    if name == REPORT_PACK:
+        return 'zip', 'application/zip'
+    return EXPORT_FORMATS[fmt]
+
+
+def _export_download_name(name, fmt='xlsx'):
+    prefix = 'report_pack' if name == REPORT_PACK else EXPORTS[name][1]
+    extension = export_file_type(name, fmt)[0]
+    return f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+
+def _export_format():
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFormatError(
+            f'Unsupported export format: {fmt} (use one of {", ".join(EXPORT_FORMATS)})')
+    if fmt == 'parquet':
+        _require_pyarrow()
+    return fmt
+
+
+def _remove_export_file(path):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        members_df = pd.read_sql_query(
-            "SELECT * FROM members WHERE is_active = 1", conn)
+        os.remove(path)
+    except OSError:
+        pass
 
-        revenue_by_type = members_df.groupby('membership_type')['monthly_fee'].agg([
-            'sum', 'mean', 'count']).reset_index()
-        revenue_by_type.columns = ['Membership Type',
-                                   'Total Revenue', 'Avg Revenue', 'Member Count']
 
-        revenue_by_location = members_df.groupby('location')['monthly_fee'].agg([
-            'sum', 'mean', 'count']).reset_index()
-        revenue_by_location.columns = [
-            'Location', 'Total Revenue', 'Avg Revenue', 'Member Count']
+class _SpooledExportFile(io.FileIO):
+    """Read handle that deletes the spooled export once the response closes it"""
 
-        conn.close()
+    def close(self):
+        super().close()
+        _remove_export_file(self.name)
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            members_df.to_excel(
-                writer, sheet_name='Active Members', index=False)
-            revenue_by_type.to_excel(
-                writer, sheet_name='Revenue by Type', index=False)
-            revenue_by_location.to_excel(
-                writer, sheet_name='Revenue by Location', index=False)
-            summary = pd.DataFrame({
-                'Metric': ['Total MRR', 'Active Members', 'Avg Revenue/Member'],
-                'Value': [members_df['monthly_fee'].sum(), len(members_df), members_df['monthly_fee'].mean()]
-            })
-            summary.to_excel(writer, sheet_name='Summary', index=False)
-
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+
+def _send_export(name):
+    """Stream an export to a temp file and send it, or queue it when ?async=1"""
+    try:
+        fmt = _export_format()
+        if _wants_async():
+            return _queued_response(submit_job('export', {'export': name, 'format': fmt}))
+
+        extension, mimetype = export_file_type(name, fmt)
+        fd, path = tempfile.mkstemp(prefix='export-', suffix='.' + extension,
+                                    dir=EXPORT_FOLDER)
+        os.close(fd)
+        try:
+            write_export(name, fmt, path)
+        except Exception:
+            _remove_export_file(path)
+            raise
+
+        response = send_file(
+            _SpooledExportFile(path),
+            mimetype=mimetype,
             as_attachment=True,
-            download_name=f'revenue_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+            download_name=_export_download_name(name, fmt)
         )
+        response.content_length = os.path.getsize(path)
+        return response
 
+    except ExportFormatError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Export failed: {str(e)}'}), 500
 
 
+@app.route('/api/export/overview', methods=['GET'])
+def export_overview():
+    """Export overview data to Excel"""
+    return _send_export('overview')
+
+
+@app.route('/api/export/at-risk', methods=['GET'])
+def export_at_risk():
+    """Export at-risk members to Excel"""
+    return _send_export('at-risk')
+
+
+@app.route('/api/export/churn-analysis', methods=['GET'])
+def export_churn_analysis():
+    """Export churn analysis to Excel"""
+    return _send_export('churn-analysis')
+
+
+@app.route('/api/export/revenue', methods=['GET'])
+def export_revenue():
+    """Export revenue data to Excel"""
+    return _send_export('revenue')
+
+
+@app.route('/api/export/report-pack', methods=['GET'])
+def export_report_pack():
+    """Export all four reports in one zip"""
+    return _send_export(REPORT_PACK)
+
+
 @app.route('/api/template/members', methods=['GET'])
 def download_members_template():
     """Download member import template"""
@@ -1045,32 +6248,139 @@ def download_checkins_template():
     )
 
 
+# ============================================================================
+# JOB ENDPOINTS
+# ============================================================================
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List the most recent background jobs"""
+    jobs = query_db("""
+        SELECT job_id, kind, status, progress, message, error,
+               created_at, started_at, finished_at
+        FROM jobs
+        ORDER BY created_at DESC
+        LIMIT 50
+    """)
+    return jsonify({'jobs': jobs})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status and progress of one background job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    result = job['result'] or {}
+    if job['status'] == 'succeeded' and 'file_path' in result:
+        job['download_url'] = f'/api/jobs/{job_id}/download'
+        result.pop('file_path')
+    job.pop('worker_pid')
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_result(job_id):
+    """Download the file produced by a finished export job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'succeeded' or not (job['result'] or {}).get('file_path'):
+        return jsonify({'error': f'Job has no download (status: {job["status"]})'}), 409
+
+    result = job['result']
+    path = os.path.realpath(result['file_path'])
+    if not path.startswith(os.path.realpath(EXPORT_FOLDER) + os.sep) or not os.path.exists(path):
+        return jsonify({'error': 'Export file is no longer available'}), 410
+
+    return send_file(
+        path,
+        mimetype=result['mimetype'],
+        as_attachment=True,
+        download_name=result['download_name']
+    )
+
+
+# ============================================================================
+# DELTA SYNC ENDPOINTS
+# ============================================================================
+
+
+@app.route('/api/sync', methods=['GET'])
+def get_sync_status():
+    """Per-source watermarks, last file results and files waiting"""
+    return jsonify(sync_status())
+
+
+@app.route('/api/sync', methods=['POST'])
+def run_sync():
+    """Queue a sync of the files waiting in SYNC_FOLDER"""
+    return _queued_response(schedule_upload_sync())
+
+
+# ============================================================================
+# STARTUP
+# ============================================================================
+
+if ANALYTICS_BACKEND not in ANALYTICS_BACKENDS:
+    raise ValueError(f'ANALYTICS_BACKEND must be one of {", ".join(ANALYTICS_BACKENDS)}')
+if ANALYTICS_BACKEND == 'duckdb':
+    _require_duckdb()
+if SHARD_MODE not in SHARD_MODES:
+    raise ValueError(f'SHARD_MODE must be one of {", ".join(filter(None, SHARD_MODES))}')
+
+# Spawned export workers import this module too (see export_pool); only the
+# app's own process sets up the database and starts the background work
+if multiprocessing.current_process().name == 'MainProcess':
+    # Initialize database on startup if it doesn't exist
+    if not os.path.exists(DB_PATH):
+        init_database()
+    migrate()
+    resume_jobs()
+    start_sync_watcher()
+
+
 if __name__ == '__main__':
 
     print("\n" + "="*60)
     print("🏋️  Churnlytics API Server")
     print("="*60)
-    print("\n📊 Analytics Endpoints (8):")
+    print("\n📊 Analytics Endpoints (12):")
     print("  GET  /api/health")
+    print("  GET  /api/metrics")
+    print("  GET  /api/metrics/queries")
     print("  GET  /api/overview")
     print("  GET  /api/churn-analysis")
+    print("  GET  /api/cohorts")
     print("  GET  /api/at-risk-members")
     print("  GET  /api/engagement")
     print("  GET  /api/revenue")
     print("  GET  /api/sales-funnel")
     print("  GET  /api/location-comparison")
+    print("  GET  /api/dashboard")
     print("\n📥 Import Endpoints (3):")
     print("  POST /api/import/preview")
     print("  POST /api/import/members")
     print("  POST /api/import/checkins")
-    print("\n📤 Export Endpoints (4):")
+    print("\n📤 Export Endpoints (5):")
     print("  GET  /api/export/overview")
     print("  GET  /api/export/at-risk")
     print("  GET  /api/export/churn-analysis")
     print("  GET  /api/export/revenue")
+    print("  GET  /api/export/report-pack")
     print("\n📋 Template Downloads (2):")
     print("  GET  /api/template/members")
     print("  GET  /api/template/checkins")
+    print("\n⏳ Background Jobs (3):")
+    print("  GET  /api/jobs")
+    print("  GET  /api/jobs/<id>")
+    print("  GET  /api/jobs/<id>/download")
+    print("  (add ?async=1 to any import/export to run it as a job)")
+    print("\n🔁 Delta Sync (2):")
+    print("  GET  /api/sync")
+    print("  POST /api/sync")
     print("\n🌐 Server: http://localhost:5000")
     print("="*60 + "\n")
 
@@ -0,0 +1,6 @@
+"""
+Churnlytics benchmarks
+Scripts for timing the Flask API against a local data directory.
+
+Run from the backend/ directory, e.g. `python -m benchmarks.index_report`.
+"""
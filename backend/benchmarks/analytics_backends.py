@@ -0,0 +1,197 @@
+"""
+Every analytics route on the SQLite backend vs the DuckDB/Parquet backend.
+
+Both backends serve the same copy of a synthetic dataset, each in a fresh
+process. The DuckDB worker first writes the Parquet snapshot (timed as
+`sync`). Every GET /api/* analytics route is timed cold (response and
+member frame caches dropped before each call). The JSON responses of the
+two backends are compared; values that depend on the clock (such as
+months_member) are compared with a small tolerance, since the two runs
+happen at different times (a ROUND()ed ratio can still land one step
+apart). Needs the duckdb package.
+
+    python -m benchmarks.analytics_backends --members 100000 1000000
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.suite import (BACKEND_DIR, _dataset, _drop_caches, _measure,
+                              discover_routes)
+from benchmarks.synthetic import SEED_CHECKINS_PER_MEMBER
+
+BACKENDS = ('sqlite', 'duckdb')
+# Reports process state rather than data
+SKIPPED_ROUTES = ('/api/health',)
+
+
+def worker(repeat):
+    """Runs inside the subprocess; prints one JSON line of results"""
+    import app as churnlytics
+
+    sync = None
+    if churnlytics.ANALYTICS_BACKEND == 'duckdb':
+        manifest = churnlytics.sync_columnar_store()
+        sync = {'seconds': manifest['elapsed_seconds'], 'rows': manifest['tables']}
+
+    client = churnlytics.app.test_client()
+    results, bodies = [], {}
+    analytics, _ = discover_routes(churnlytics.app)
+    for route in [route for route in analytics if route not in SKIPPED_ROUTES]:
+        last = {}
+
+        def call():
+            last['response'] = client.get(route)
+            return last['response'], 0
+
+        result = _measure(churnlytics, route, 'GET', call, repeat,
+                          before=lambda: _drop_caches(churnlytics))
+        results.append(result)
+        bodies[route] = last['response'].get_json()
+
+    backends = sorted({labels[2] for labels in churnlytics.query_duration.snapshot()})
+    print(json.dumps({
+        'backend': churnlytics.ANALYTICS_BACKEND,
+        'sync': sync,
+        'statement_backends': backends,
+        'unsupported': churnlytics.columnar_store.unsupported,
+        'results': results,
+        'bodies': bodies
+    }))
+
+
+def _differences(a, b, path=''):
+    """Paths where two JSON values differ"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        if set(a) != set(b):
+            return [f'{path}: keys {sorted(set(a) ^ set(b))}']
+        return [d for key in a for d in _differences(a[key], b[key], f'{path}.{key}')]
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return [f'{path}: {len(a)} vs {len(b)} items']
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in _differences(x, y, f'{path}[{i}]')]
+    if isinstance(a, float) and isinstance(b, (int, float)) \
+            or isinstance(b, float) and isinstance(a, (int, float)):
+        if math.isclose(a, b, rel_tol=1e-4, abs_tol=1e-3):
+            return []
+    elif a == b:
+        return []
+    return [f'{path}: {a!r} vs {b!r}']
+
+
+def _snapshot_mb(data_dir):
+    total = 0
+    for root, _, files in os.walk(os.path.join(data_dir, 'columnar')):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return round(total / 1024 / 1024, 1)
+
+
+def run(args):
+    scales = []
+    for n in args.members:
+        source = _dataset(args.cache_dir, {
+            'members': n,
+            'locations': args.locations,
+            'checkins_per_member': args.checkins_per_member,
+            'seed': args.seed,
+            'now': args.now
+        })
+        workdir = tempfile.mkdtemp(prefix='churnlytics-backends-')
+        try:
+            for name in os.listdir(source):
+                if os.path.isfile(os.path.join(source, name)):
+                    shutil.copy2(os.path.join(source, name), workdir)
+            runs = {}
+            for backend in BACKENDS:
+                env = {**os.environ, 'CHURNLYTICS_DATA_DIR': workdir,
+                       'ANALYTICS_BACKEND': backend}
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.analytics_backends', '--worker',
+                     str(args.repeat)],
+                    cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+                if output.returncode != 0:
+                    sys.stderr.write(output.stderr)
+                    raise SystemExit(f'{backend} worker failed for {source}')
+                runs[backend] = json.loads(output.stdout.strip().splitlines()[-1])
+            db_mb = round(os.path.getsize(os.path.join(workdir, 'gym_analytics.db')) / 1024 / 1024, 1)
+            snapshot_mb = _snapshot_mb(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        sqlite, duckdb = runs['sqlite'], runs['duckdb']
+        routes = []
+        for base, head in zip(sqlite['results'], duckdb['results']):
+            route = base['route']
+            differences = _differences(sqlite['bodies'][route], duckdb['bodies'][route])
+            routes.append({
+                'route': route,
+                'sqlite_p50_ms': base['p50_ms'],
+                'duckdb_p50_ms': head['p50_ms'],
+                'speedup': round(base['p50_ms'] / head['p50_ms'], 2) if head['p50_ms'] else None,
+                'sqlite_peak_rss_mb': base['peak_rss_mb'],
+                'duckdb_peak_rss_mb': head['peak_rss_mb'],
+                'matches': not differences,
+                'differences': differences[:10]
+            })
+        scale = {
+            'members': n,
+            'sqlite_db_mb': db_mb,
+            'parquet_snapshot_mb': snapshot_mb,
+            'sync': duckdb['sync'],
+            'duckdb_statement_backends': duckdb['statement_backends'],
+            'unsupported': duckdb['unsupported'],
+            'routes': routes
+        }
+        scales.append(scale)
+        _print_scale(scale)
+    return scales
+
+
+def _print_scale(scale):
+    print(f"\n{scale['members']:,} members: SQLite {scale['sqlite_db_mb']} MB, "
+          f"Parquet {scale['parquet_snapshot_mb']} MB, sync {scale['sync']['seconds']} s")
+    for route in scale['routes']:
+        print(f"  {route['route']:<28} sqlite {route['sqlite_p50_ms']:>9.1f} ms  "
+              f"duckdb {route['duckdb_p50_ms']:>9.1f} ms  x{route['speedup'] or 0:<6} "
+              f"{'match' if route['matches'] else 'DIFFERS'}")
+        for difference in route['differences']:
+            print(f'      {difference}')
+    if scale['unsupported']:
+        print(f"  statements kept on SQLite: {scale['unsupported']}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--checkins-per-member', type=float, default=SEED_CHECKINS_PER_MEMBER)
+    parser.add_argument('--locations', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--now', default=datetime.now().strftime('%Y-%m-%d'))
+    parser.add_argument('--cache-dir', default=os.path.join(
+        tempfile.gettempdir(), 'churnlytics-bench-data'))
+    parser.add_argument('--repeat', type=int, default=5, help='calls per route and backend')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    scales = run(args)
+    print(f'\n{time.perf_counter() - start:.0f} s total')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'scales': scales}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark the single-pass member breakdowns against the per-breakdown SQL.
+
+For each member count, builds a synthetic database and times:
+  * sql    - the eight GROUP BY scans the overview, churn-analysis and
+             location-comparison endpoints used to run
+  * cold   - load_member_frame() + member_breakdowns() (first request
+             after an import)
+  * warm   - member_breakdowns() on the cached frame (every later request)
+
+    python -m benchmarks.churn_aggregation --sizes 1500 100000 1000000
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic import make_members, write_database
+
+
+LEGACY_QUERIES = [
+    # overview
+    """SELECT COUNT(*), SUM(is_active), COUNT(CASE WHEN is_active = 0 THEN 1 END),
+              COUNT(CASE WHEN tour_scheduled = 1 THEN 1 END), COUNT(DISTINCT location)
+       FROM members""",
+    """SELECT COUNT(*), SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END),
+              ROUND(SUM(CASE WHEN is_active = 1 THEN COALESCE(monthly_fee, 39.99) ELSE 0 END), 2)
+       FROM members""",
+    """SELECT strftime('%Y-%m', COALESCE(signup_date, join_date)) as month, COUNT(*)
+       FROM members WHERE COALESCE(signup_date, join_date) >= date('now', '-6 months')
+       GROUP BY month ORDER BY month DESC LIMIT 6""",
+    """SELECT COUNT(*) FROM members WHERE cancellation_date >= date('now', '-30 days')""",
+    # churn analysis
+    """SELECT membership_type, COUNT(*), SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END)
+       FROM members GROUP BY membership_type""",
+    """SELECT location, COUNT(*), SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END)
+       FROM members GROUP BY location""",
+    """SELECT CASE
+                WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 3 THEN '0-3 months'
+                WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 6 THEN '3-6 months'
+                WHEN CAST((julianday('now') - julianday(join_date)) / 30 AS INTEGER) < 12 THEN '6-12 months'
+                ELSE '12+ months' END as tenure_group,
+              COUNT(*), SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END)
+       FROM members GROUP BY tenure_group""",
+    """SELECT has_personal_training, COUNT(*), SUM(CASE WHEN is_active = 0 THEN 1 ELSE 0 END)
+       FROM members GROUP BY has_personal_training""",
+    """SELECT strftime('%Y-%m', cancellation_date) as month, COUNT(*)
+       FROM members WHERE cancellation_date IS NOT NULL
+           AND cancellation_date >= date('now', '-12 months')
+       GROUP BY month ORDER BY month""",
+    # location comparison
+    """SELECT location, COUNT(DISTINCT member_id), SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END),
+              SUM(CASE WHEN is_active = 1 THEN COALESCE(monthly_fee, 39.99) ELSE 0 END),
+              COUNT(DISTINCT CASE WHEN has_personal_training = 1 THEN member_id END)
+       FROM members GROUP BY location""",
+]
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run(sizes, repeat):
+    workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+    os.environ['CHURNLYTICS_DATA_DIR'] = workdir
+    results = []
+    try:
+        db_path = os.path.join(workdir, 'gym_analytics.db')
+        write_database(db_path, make_members(1))
+        churnlytics = importlib.import_module('app')
+
+        for size in sizes:
+            churnlytics.db_pool.close_all()
+            write_database(db_path, make_members(size))
+            churnlytics.db_pool = churnlytics.ConnectionPool(db_path)
+            with churnlytics.db_pool.connection() as conn:
+                churnlytics.apply_table_schema(conn, 'members')
+
+            conn = sqlite3.connect(db_path)
+            sql_ms = _time(lambda: [conn.execute(q).fetchall()
+                                    for q in LEGACY_QUERIES], repeat)
+            conn.close()
+
+            cold_ms = _time(lambda: churnlytics.member_breakdowns(
+                churnlytics.load_member_frame()), repeat)
+            frame = churnlytics.load_member_frame()
+            warm_ms = _time(lambda: churnlytics.member_breakdowns(frame), repeat)
+
+            row = {'members': size, 'sql_ms': sql_ms,
+                   'cold_ms': cold_ms, 'warm_ms': warm_ms}
+            results.append(row)
+            print(f"{size:>10,} members  sql {sql_ms:>9.1f} ms  "
+                  f"cold {cold_ms:>9.1f} ms  warm {warm_ms:>8.1f} ms  "
+                  f"({sql_ms / warm_ms:.1f}x warm)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1_500, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
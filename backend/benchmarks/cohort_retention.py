@@ -0,0 +1,110 @@
+"""
+Benchmark the vectorized cohort retention matrix against a SQL matrix.
+
+For each member count, builds a synthetic database and times:
+  * sql    - one GROUP BY over members joined to a 0..59 month offset
+             series, counting who was still a member at each offset
+  * load   - load_member_frame() (first request after an import)
+  * matrix - cohort_retention() on the cached frame: 60 signup months by
+             60 months since signup
+
+    python -m benchmarks.cohort_retention --sizes 1500 100000 1000000
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic import make_members, write_database
+
+
+SQL_MATRIX_QUERY = """
+    WITH RECURSIVE offsets(k) AS (
+        SELECT 0 UNION ALL SELECT k + 1 FROM offsets WHERE k < 59
+    ),
+    cohorts AS (
+        SELECT
+            strftime('%Y-%m', COALESCE(signup_date, join_date)) as cohort,
+            date(COALESCE(signup_date, join_date), 'start of month') as start,
+            CASE WHEN is_active = 1 THEN date('now', 'start of month')
+                 ELSE date(cancellation_date, 'start of month') END as last_month
+        FROM members
+        WHERE COALESCE(signup_date, join_date) >= date('now', 'start of month', '-59 months')
+    )
+    SELECT cohort, k, COUNT(*) as retained
+    FROM cohorts JOIN offsets
+        ON date(start, '+' || k || ' months') <= MIN(last_month, date('now'))
+    GROUP BY cohort, k
+    ORDER BY cohort, k
+"""
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run(sizes, repeat, sql=True):
+    workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+    os.environ['CHURNLYTICS_DATA_DIR'] = workdir
+    results = []
+    try:
+        db_path = os.path.join(workdir, 'gym_analytics.db')
+        write_database(db_path, make_members(1))
+        churnlytics = importlib.import_module('app')
+
+        for size in sizes:
+            churnlytics.db_pool.close_all()
+            write_database(db_path, make_members(size))
+            churnlytics.db_pool = churnlytics.ConnectionPool(db_path)
+            with churnlytics.db_pool.connection() as conn:
+                churnlytics.apply_table_schema(conn, 'members')
+
+            sql_ms = None
+            if sql:
+                conn = sqlite3.connect(db_path)
+                sql_ms = _time(lambda: conn.execute(SQL_MATRIX_QUERY).fetchall(), repeat)
+                conn.close()
+
+            load_ms = _time(churnlytics.load_member_frame, repeat)
+            frame = churnlytics.load_member_frame()
+            today = churnlytics.utc_day()
+            matrix_ms = _time(lambda: churnlytics.cohort_retention(frame, today), repeat)
+
+            row = {'members': size, 'sql_ms': sql_ms,
+                   'load_ms': load_ms, 'matrix_ms': matrix_ms}
+            results.append(row)
+            print(f"{size:>10,} members  sql {sql_ms or 0:>9.1f} ms  "
+                  f"load {load_ms:>9.1f} ms  matrix {matrix_ms:>8.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1_500, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-sql', action='store_true', help='skip the SQL matrix')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, sql=not args.no_sql)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Wall time and peak RSS of the report exports at increasing member counts.
+
+Each export runs in a fresh subprocess so peak RSS is measured per run.
+`legacy` is the old path (whole tables into pandas, workbook built in a
+BytesIO) for the same report, for comparison. RSS includes SQLite's
+mmap window and page cache, which the pool caps at 256 MB and 64 MB.
+With --workers, each EXPORT_WORKERS setting is timed; peak RSS is the
+parent's only, as sheets are then built in worker processes.
+
+    python -m benchmarks.export_memory --members 100000 500000 --legacy
+    python -m benchmarks.export_memory --export report-pack --workers 0 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.import_throughput import _peak_rss_mb
+from benchmarks.synthetic import make_checkins, make_members, write_database
+
+
+def _legacy_overview(churnlytics, path):
+    from io import BytesIO
+
+    import pandas as pd
+
+    members_df = churnlytics.query_to_df("SELECT * FROM members")
+    checkins_df = churnlytics.query_to_df("SELECT * FROM checkins")
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        members_df.to_excel(writer, sheet_name='Members', index=False)
+        pd.DataFrame({
+            'Metric': ['Total Members', 'Active Members', 'Total Check-ins'],
+            'Value': [len(members_df), int(members_df['is_active'].sum()), len(checkins_df)]
+        }).to_excel(writer, sheet_name='Summary', index=False)
+    with open(path, 'wb') as f:
+        f.write(output.getvalue())
+
+
+def worker(export, fmt, strategy, path):
+    """Runs inside the subprocess; prints one JSON line of results"""
+    import app as churnlytics
+
+    if churnlytics.export_pool() is not None:
+        # Start the worker processes before timing
+        churnlytics.export_pool().submit(int).result()
+
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    if strategy == 'streaming':
+        churnlytics.write_export(export, fmt, path)
+    else:
+        _legacy_overview(churnlytics, path)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'export': export,
+        'format': fmt,
+        'strategy': strategy,
+        'export_workers': churnlytics.EXPORT_WORKERS,
+        'seconds': round(elapsed, 2),
+        'bytes': os.path.getsize(path),
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _peak_rss_mb()
+    }))
+
+
+def run(member_counts, export, formats, legacy, checkins_per_member, workers=(None,)):
+    results = []
+    for n in member_counts:
+        workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+        try:
+            members = make_members(n)
+            db_path = os.path.join(workdir, 'gym_analytics.db')
+            write_database(db_path, members,
+                           make_checkins(members, per_member=checkins_per_member))
+            del members
+            env = {**os.environ, 'CHURNLYTICS_DATA_DIR': workdir}
+            # Apply migrations (rollup build) up front so they don't count
+            subprocess.run([sys.executable, '-c', 'import app'],
+                           env=env, capture_output=True, check=True)
+
+            runs = [('streaming', fmt, setting) for setting in workers for fmt in formats]
+            if legacy and export == 'overview':
+                runs.append(('legacy', 'xlsx', None))
+            for strategy, fmt, setting in runs:
+                run_env = env if setting is None else {**env, 'EXPORT_WORKERS': str(setting)}
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.export_memory', '--worker',
+                     export, fmt, strategy, os.path.join(workdir, f'out-{strategy}.{fmt}')],
+                    env=run_env, capture_output=True, text=True, check=True)
+                result = json.loads(output.stdout.strip().splitlines()[-1])
+                result['members'] = n
+                results.append(result)
+                print(f"{result['strategy']:>10} {result['format']:>8} "
+                      f"workers {result['export_workers']:>2} {n:>10,} members  "
+                      f"{result['seconds']:>7.2f} s  "
+                      f"peak RSS {result['peak_rss_mb']:>7.1f} MB "
+                      f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.1f} MB)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(*sys.argv[2:6])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--checkins-per-member', type=int, default=10)
+    parser.add_argument('--export', default='overview',
+                        choices=['overview', 'at-risk', 'churn-analysis', 'revenue',
+                                 'report-pack'])
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'csv'],
+                        choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('--legacy', action='store_true',
+                        help='also run the old in-memory overview export')
+    parser.add_argument('--workers', type=int, nargs='+', default=[None],
+                        help='EXPORT_WORKERS settings to time (default: the app default)')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    results = run(args.members, args.export, args.formats, args.legacy,
+                  args.checkins_per_member, args.workers)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Rows/sec and peak RSS of the check-in importer at increasing file sizes.
+
+Each import runs in a fresh subprocess against a fresh database so peak
+RSS is measured per run. `legacy` is the old whole-file path
+(pd.read_csv + to_sql) for comparison.
+
+    python -m benchmarks.import_throughput --rows 100000 1000000 --legacy
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_checkins, make_members, write_database
+
+
+def _peak_rss_mb():
+    # VmHWM is this process's own high-water mark; ru_maxrss on Linux also
+    # carries over the parent's peak from before the fork
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def worker(csv_path, strategy, chunksize):
+    """Runs inside the subprocess; prints one JSON line of results"""
+    import app as churnlytics
+
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    if strategy == 'streaming':
+        stats = churnlytics.stream_import_checkins(
+            csv_path, 'csv', 'append', chunksize=chunksize)
+        rows = stats['rows_imported']
+    else:
+        import pandas as pd
+        df = pd.read_csv(csv_path)
+        with churnlytics.db_pool.connection() as conn:
+            df.to_sql('checkins', conn, if_exists='append', index=False)
+            conn.commit()
+        rows = len(df)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'strategy': strategy,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed),
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _peak_rss_mb()
+    }))
+
+
+def run(row_counts, strategies, chunksize):
+    results = []
+    members = make_members(10_000)
+    for rows in row_counts:
+        workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+        try:
+            csv_path = os.path.join(workdir, 'checkins.csv')
+            make_checkins(members, per_member=max(1, rows // len(members)),
+                          seed=rows).to_csv(csv_path, index=False)
+            for strategy in strategies:
+                db_path = os.path.join(workdir, 'gym_analytics.db')
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+                write_database(db_path, members)
+
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.import_throughput',
+                     '--worker', csv_path, strategy, str(chunksize)],
+                    env={**os.environ, 'CHURNLYTICS_DATA_DIR': workdir},
+                    capture_output=True, text=True, check=True)
+                result = json.loads(output.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{result['strategy']:>10} {result['rows']:>11,} rows  "
+                      f"{result['rows_per_second']:>9,} rows/s  "
+                      f"peak RSS {result['peak_rss_mb']:>7.1f} MB "
+                      f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.1f} MB)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--legacy', action='store_true',
+                        help='also time the old read-everything importer')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    strategies = ['streaming'] + (['legacy'] if args.legacy else [])
+    results = run(args.rows, strategies, args.chunksize)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Before/after timing report for the schema migration indexes.
+
+Copies the current database twice: one copy has every primary key and
+index stripped (the layout pandas.to_sql leaves behind), the other has
+the migrated schema. Every analytics endpoint is timed against both.
+
+    python -m benchmarks.index_report --repeat 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import app as churnlytics
+
+
+ENDPOINTS = [
+    '/api/overview',
+    '/api/churn-analysis',
+    '/api/at-risk-members',
+    '/api/engagement',
+    '/api/revenue',
+    '/api/sales-funnel',
+    '/api/location-comparison',
+    '/api/export/at-risk',
+    '/api/export/churn-analysis',
+]
+
+
+def strip_schema(db_path):
+    """Recreate every table without keys or indexes, like to_sql does"""
+    conn = sqlite3.connect(db_path)
+    for table in churnlytics.TABLE_KEYS:
+        conn.execute(f'CREATE TABLE "{table}__plain" AS SELECT * FROM "{table}"')
+        conn.execute(f'DROP TABLE "{table}"')
+        conn.execute(f'ALTER TABLE "{table}__plain" RENAME TO "{table}"')
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+
+def time_endpoints(db_path, repeat):
+    """Median/min latency in ms per endpoint against the given database"""
+    churnlytics.db_pool = churnlytics.ConnectionPool(db_path)
+    client = churnlytics.app.test_client()
+    results = {}
+    for endpoint in ENDPOINTS:
+        client.get(endpoint)  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(endpoint)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[endpoint] = {
+            'status': response.status_code,
+            'median_ms': round(statistics.median(samples), 2),
+            'min_ms': round(min(samples), 2)
+        }
+    churnlytics.db_pool.close_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the report as JSON here')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+    try:
+        before_db = os.path.join(workdir, 'before.db')
+        after_db = os.path.join(workdir, 'after.db')
+        shutil.copy(churnlytics.DB_PATH, before_db)
+        strip_schema(before_db)
+        shutil.copy(before_db, after_db)
+
+        before = time_endpoints(before_db, args.repeat)
+
+        churnlytics.db_pool = churnlytics.ConnectionPool(after_db)
+        with churnlytics.db_pool.connection() as conn:
+            for table in churnlytics.TABLE_KEYS:
+                churnlytics.apply_table_schema(conn, table)
+        after = time_endpoints(after_db, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'endpoint':<30}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    report = []
+    for endpoint in ENDPOINTS:
+        b, a = before[endpoint], after[endpoint]
+        speedup = b['median_ms'] / a['median_ms'] if a['median_ms'] else float('nan')
+        print(f"{endpoint:<30}{b['median_ms']:>12.1f}{a['median_ms']:>12.1f}{speedup:>9.1f}x")
+        report.append({'endpoint': endpoint, 'before': b, 'after': a,
+                       'speedup': round(speedup, 2)})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Every analytics route with its statements run one after another vs on the
+query pool.
+
+The same copy of a synthetic dataset is served in a fresh process per
+QUERY_WORKERS setting (0 runs each handler's statements sequentially on the
+request thread). Every GET /api/* analytics route is timed cold (response
+and member frame caches dropped before each call), and the JSON responses
+of each setting are checked against the sequential run.
+
+    python -m benchmarks.query_concurrency --members 100000 --workers 0 2 4 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.analytics_backends import SKIPPED_ROUTES, _differences
+from benchmarks.suite import (BACKEND_DIR, _dataset, _drop_caches, _measure,
+                              discover_routes)
+from benchmarks.synthetic import SEED_CHECKINS_PER_MEMBER
+
+
+def worker(repeat):
+    """Runs inside the subprocess; prints one JSON line of results"""
+    import app as churnlytics
+
+    client = churnlytics.app.test_client()
+    results, bodies = [], {}
+    analytics, _ = discover_routes(churnlytics.app)
+    for route in [route for route in analytics if route not in SKIPPED_ROUTES]:
+        last = {}
+
+        def call():
+            last['response'] = client.get(route)
+            return last['response'], 0
+
+        result = _measure(churnlytics, route, 'GET', call, repeat,
+                          before=lambda: _drop_caches(churnlytics))
+        results.append(result)
+        bodies[route] = last['response'].get_json()
+
+    print(json.dumps({
+        'query_workers': churnlytics.QUERY_WORKERS,
+        'db_pool_size': churnlytics.DB_POOL_SIZE,
+        'results': results,
+        'bodies': bodies
+    }))
+
+
+def run(args):
+    scales = []
+    for n in args.members:
+        source = _dataset(args.cache_dir, {
+            'members': n,
+            'locations': args.locations,
+            'checkins_per_member': args.checkins_per_member,
+            'seed': args.seed,
+            'now': args.now
+        })
+        workdir = tempfile.mkdtemp(prefix='churnlytics-concurrency-')
+        try:
+            for name in os.listdir(source):
+                if os.path.isfile(os.path.join(source, name)):
+                    shutil.copy2(os.path.join(source, name), workdir)
+            runs = []
+            # A discarded first pass migrates the copy and warms the OS page
+            # cache, so the first setting is not penalized
+            for position, workers in enumerate([args.workers[0]] + args.workers):
+                env = {**os.environ, 'CHURNLYTICS_DATA_DIR': workdir,
+                       'QUERY_WORKERS': str(workers)}
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.query_concurrency', '--worker',
+                     str(1 if position == 0 else args.repeat)],
+                    cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+                if output.returncode != 0:
+                    sys.stderr.write(output.stderr)
+                    raise SystemExit(f'QUERY_WORKERS={workers} worker failed for {source}')
+                if position:
+                    runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        base = runs[0]
+        routes = []
+        for position, result in enumerate(base['results']):
+            route = result['route']
+            settings = []
+            for head in runs[1:]:
+                head_result = head['results'][position]
+                differences = _differences(base['bodies'][route], head['bodies'][route])
+                settings.append({
+                    'query_workers': head['query_workers'],
+                    'p50_ms': head_result['p50_ms'],
+                    'speedup': round(result['p50_ms'] / head_result['p50_ms'], 2)
+                    if head_result['p50_ms'] else None,
+                    'matches': not differences,
+                    'differences': differences[:10]
+                })
+            routes.append({
+                'route': route,
+                'base_query_workers': base['query_workers'],
+                'base_p50_ms': result['p50_ms'],
+                'settings': settings
+            })
+        scale = {'members': n, 'db_pool_size': base['db_pool_size'], 'routes': routes}
+        scales.append(scale)
+        _print_scale(scale)
+    return scales
+
+
+def _print_scale(scale):
+    print(f"\n{scale['members']:,} members (DB_POOL_SIZE={scale['db_pool_size']}), "
+          f"p50 per QUERY_WORKERS setting:")
+    for route in scale['routes']:
+        line = f"  {route['route']:<28} {route['base_query_workers']}: {route['base_p50_ms']:>8.1f} ms"
+        for setting in route['settings']:
+            line += (f"  {setting['query_workers']}: {setting['p50_ms']:>8.1f} ms "
+                     f"x{setting['speedup'] or 0:<5}"
+                     f"{'' if setting['matches'] else ' DIFFERS'}")
+        print(line)
+        for setting in route['settings']:
+            for difference in setting['differences']:
+                print(f"      {setting['query_workers']}: {difference}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 4],
+                        help='QUERY_WORKERS settings; the first is the baseline')
+    parser.add_argument('--checkins-per-member', type=float, default=SEED_CHECKINS_PER_MEMBER)
+    parser.add_argument('--locations', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--now', default=datetime.now().strftime('%Y-%m-%d'))
+    parser.add_argument('--cache-dir', default=os.path.join(
+        tempfile.gettempdir(), 'churnlytics-bench-data'))
+    parser.add_argument('--repeat', type=int, default=5, help='calls per route and setting')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    scales = run(args)
+    print(f'\n{time.perf_counter() - start:.0f} s total')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'scales': scales}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
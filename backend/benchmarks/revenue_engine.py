@@ -0,0 +1,112 @@
+"""
+Benchmark the vectorized revenue engine against the per-row LTV SQL.
+
+For each member count, builds a synthetic database and times:
+  * sql    - the AVG(monthly_fee * julianday span) GROUP BY the revenue
+             endpoint used to run for LTV alone
+  * load   - load_revenue_frame() (once per data version)
+  * engine - revenue_model() on the loaded frame: survival curves, LTV per
+             type and location, and the MRR forecast
+
+Synthetic members carry random churn scores so the score-weighted hazard
+path is exercised.
+
+    python -m benchmarks.revenue_engine --sizes 1500 100000 1000000
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_members, write_database
+
+
+LEGACY_LTV_QUERY = """
+    SELECT
+        m.membership_type,
+        COUNT(DISTINCT m.member_id) as member_count,
+        ROUND(AVG(
+            CASE
+                WHEN m.is_active = 1 THEN
+                    m.monthly_fee * CAST((julianday('now') - julianday(m.join_date)) / 30 AS INTEGER)
+                ELSE
+                    m.monthly_fee * CAST((julianday(m.cancellation_date) - julianday(m.join_date)) / 30 AS INTEGER)
+            END
+        ), 2) as avg_ltv
+    FROM members m
+    GROUP BY m.membership_type
+    ORDER BY avg_ltv DESC
+"""
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run(sizes, repeat):
+    workdir = tempfile.mkdtemp(prefix='churnlytics-bench-')
+    os.environ['CHURNLYTICS_DATA_DIR'] = workdir
+    results = []
+    try:
+        db_path = os.path.join(workdir, 'gym_analytics.db')
+        write_database(db_path, make_members(1))
+        churnlytics = importlib.import_module('app')
+
+        for size in sizes:
+            churnlytics.db_pool.close_all()
+            write_database(db_path, make_members(size))
+            churnlytics.db_pool = churnlytics.ConnectionPool(db_path)
+            with churnlytics.db_pool.connection() as conn:
+                churnlytics.apply_table_schema(conn, 'members')
+
+            conn = sqlite3.connect(db_path)
+            sql_ms = _time(lambda: conn.execute(LEGACY_LTV_QUERY).fetchall(), repeat)
+            conn.close()
+
+            load_ms = _time(churnlytics.load_revenue_frame, repeat)
+            frame = churnlytics.load_revenue_frame()
+            rng = np.random.default_rng(0)
+            frame['churn_probability'] = np.where(
+                frame['is_active'] == 1, rng.random(len(frame)), np.nan)
+            now_day = time.time() / churnlytics.SECONDS_PER_DAY
+            engine_ms = _time(lambda: churnlytics.revenue_model(frame, now_day), repeat)
+
+            row = {'members': size, 'sql_ms': sql_ms,
+                   'load_ms': load_ms, 'engine_ms': engine_ms}
+            results.append(row)
+            print(f"{size:>10,} members  sql {sql_ms:>9.1f} ms  "
+                  f"load {load_ms:>9.1f} ms  engine {engine_ms:>8.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1_500, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
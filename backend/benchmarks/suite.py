@@ -0,0 +1,348 @@
+"""
+End-to-end API benchmark at configurable scale.
+
+For each member count, a synthetic data directory is generated (and cached
+under --cache-dir, so later runs and other commits reuse identical data),
+copied to a scratch directory and served in a fresh process through Flask's
+test client. Every GET /api/* analytics route is timed cold (caches dropped
+before each call) and cached; exports are timed per format, then check-in
+and member imports. Each measurement records latency percentiles, peak RSS
+and rows/sec. Results are written as JSON; --compare diffs two result files.
+
+    python -m benchmarks.suite --members 10000 100000 --output head.json
+    python -m benchmarks.suite --compare base.json head.json
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.import_throughput import _peak_rss_mb
+from benchmarks.synthetic import (SEED_CHECKINS_PER_MEMBER, generate_dataset,
+                                  iter_checkins, make_members)
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKIPPED_PREFIXES = ('/api/template/', '/api/jobs', '/api/metrics')
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    # Linux only: writing 5 resets VmHWM to the current RSS
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def discover_routes(flask_app):
+    """(analytics GET routes, export routes) registered under /api/"""
+    analytics, exports = [], []
+    for rule in flask_app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.arguments or not rule.rule.startswith('/api/'):
+            continue
+        if rule.rule.startswith('/api/export/'):
+            exports.append(rule.rule)
+        elif not rule.rule.startswith(SKIPPED_PREFIXES):
+            analytics.append(rule.rule)
+    return sorted(analytics), sorted(exports)
+
+
+def _drop_caches(churnlytics):
+    churnlytics.response_cache.clear()
+    churnlytics._member_frame_cache['version'] = None
+
+
+def _sql_rows(churnlytics):
+    return sum(values[-1] for values in churnlytics.query_rows.snapshot().values())
+
+
+def _measure(churnlytics, name, method, call, repeat, before=None):
+    """Run `call` `repeat` times; returns one result record"""
+    peak_reset = _reset_peak_rss()
+    baseline = _current_rss_mb()
+    rows_before = _sql_rows(churnlytics)
+    timings, statuses, sizes, rows = [], set(), [], 0
+
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        response, counted = call()
+        timings.append(time.perf_counter() - start)
+        statuses.add(response.status_code)
+        sizes.append(len(response.get_data()))
+        rows += counted or 0
+        response.close()
+
+    rows += _sql_rows(churnlytics) - rows_before
+    ms = np.array(timings) * 1000
+    total_seconds = float(np.sum(timings))
+    return {
+        'route': name,
+        'method': method,
+        'repeat': repeat,
+        'status': sorted(statuses),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p90_ms': round(float(np.percentile(ms, 90)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'mean_ms': round(float(ms.mean()), 2),
+        'bytes': int(np.mean(sizes)),
+        'rows': int(rows / repeat),
+        'rows_per_second': round(rows / total_seconds) if total_seconds else None,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': _peak_rss_mb() if peak_reset else None
+    }
+
+
+def _checkin_upload(members, rows, seed):
+    chunk = next(iter_checkins(members, rows, seed=seed, chunk_rows=rows))
+    chunk['checkin_id'] = [f'B{seed:03d}{i:09d}' for i in range(rows)]
+    return chunk.to_csv(index=False).encode()
+
+
+def _member_upload(rows, seed):
+    members = make_members(rows, seed=seed)
+    members['member_id'] = [f'N{seed:03d}{i:07d}' for i in range(rows)]
+    return members.to_csv(index=False).encode()
+
+
+def worker(config):
+    """Runs inside the subprocess; prints one JSON line of results"""
+    start = time.perf_counter()
+    import app as churnlytics
+    startup_seconds = time.perf_counter() - start
+    client = churnlytics.app.test_client()
+    repeat, export_repeat = config['repeat'], config['export_repeat']
+    results = []
+
+    def get(path):
+        return lambda: (client.get(path), 0)
+
+    analytics, exports = discover_routes(churnlytics.app)
+    for route in analytics:
+        cold = _measure(churnlytics, route, 'GET', get(route), repeat,
+                        before=lambda: _drop_caches(churnlytics))
+        cached = _measure(churnlytics, route, 'GET', get(route), repeat)
+        results.extend([{**cold, 'phase': 'cold'}, {**cached, 'phase': 'cached'}])
+
+    for route in exports:
+        for fmt in config['export_formats']:
+            path = f'{route}?format={fmt}'
+            results.append({**_measure(churnlytics, path, 'GET', get(path), export_repeat),
+                            'phase': 'export'})
+
+    if config['import_rows']:
+        members = churnlytics.query_to_df('SELECT member_id, location FROM members')
+        uploads = iter(range(1, 1000))
+
+        def post(route, payload_factory, stat_key):
+            def call():
+                seed = next(uploads)
+                data = {'file': (io.BytesIO(payload_factory(seed)), 'upload.csv'),
+                        'mode': 'append'}
+                response = client.post(route, data=data, content_type='multipart/form-data')
+                return response, (response.get_json() or {}).get(stat_key, 0)
+            return call
+
+        rows = config['import_rows']
+        results.append({**_measure(
+            churnlytics, '/api/import/checkins', 'POST',
+            post('/api/import/checkins', lambda seed: _checkin_upload(members, rows, seed),
+                 'rows_imported'), export_repeat), 'phase': 'import'})
+        member_rows = max(1, rows // 10)
+        results.append({**_measure(
+            churnlytics, '/api/import/members', 'POST',
+            post('/api/import/members', lambda seed: _member_upload(member_rows, seed),
+                 'rows_imported'), export_repeat), 'phase': 'import'})
+
+    print(json.dumps({
+        'startup_seconds': round(startup_seconds, 2),
+        'peak_rss_mb': _peak_rss_mb(),
+        'results': results
+    }))
+
+
+def _git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', '.'], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _dataset(cache_dir, params):
+    """Path of a pristine generated dataset, generating it on first use"""
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    path = os.path.join(cache_dir, f"members-{params['members']}-{key}")
+    if not os.path.exists(os.path.join(path, 'synthetic.json')):
+        print(f"  generating {params['members']:,} members ...", flush=True)
+        generate_dataset(path, **params)
+    return path
+
+
+def run(args):
+    report = {
+        'revision': _git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'scales': []
+    }
+    config = {
+        'repeat': args.repeat,
+        'export_repeat': args.export_repeat,
+        'export_formats': args.export_formats,
+        'import_rows': args.import_rows
+    }
+
+    sources = [('data-dir', args.data_dir)] if args.data_dir else [
+        ('members', n) for n in args.members]
+    for kind, value in sources:
+        if kind == 'data-dir':
+            source = value
+        else:
+            source = _dataset(args.cache_dir, {
+                'members': value,
+                'locations': args.locations,
+                'checkins_per_member': args.checkins_per_member,
+                'seed': args.seed,
+                'now': args.now
+            })
+
+        workdir = tempfile.mkdtemp(prefix='churnlytics-suite-')
+        try:
+            # Work on a copy so imports and migrations never touch the source
+            for name in os.listdir(source):
+                if os.path.isfile(os.path.join(source, name)):
+                    shutil.copy2(os.path.join(source, name), workdir)
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.suite', '--worker', json.dumps(config)],
+                cwd=BACKEND_DIR, env={**os.environ, 'CHURNLYTICS_DATA_DIR': workdir},
+                capture_output=True, text=True)
+            if output.returncode != 0:
+                sys.stderr.write(output.stderr)
+                raise SystemExit(f'benchmark worker failed for {source}')
+            scale = json.loads(output.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        manifest_path = os.path.join(source, 'synthetic.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                scale['dataset'] = json.load(f)
+        scale['source'] = source
+        report['scales'].append(scale)
+        _print_scale(scale)
+    return report
+
+
+def _print_scale(scale):
+    rows = scale.get('dataset', {}).get('rows', {})
+    print(f"\n{scale['source']}  {rows}")
+    print(f"  startup {scale['startup_seconds']} s, peak RSS {scale['peak_rss_mb']} MB")
+    for result in scale['results']:
+        rate = f"{result['rows_per_second']:>12,}" if result['rows_per_second'] else ' ' * 12
+        print(f"  {result['phase']:<7} {result['method']:<4} {result['route']:<44} "
+              f"p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+              f"rows/s {rate}  peak {result['peak_rss_mb'] or 0:>7.1f} MB")
+
+
+def compare(base_path, head_path):
+    """Print p50 and peak RSS per route for two result files"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"base {base.get('revision')} ({base['timestamp']})  ->  "
+          f"head {head.get('revision')} ({head['timestamp']})")
+
+    def scale_key(scale):
+        return scale.get('dataset', {}).get('rows', {}).get('members') or scale['source']
+
+    base_scales = {scale_key(scale): scale for scale in base['scales']}
+    for scale in head['scales']:
+        key = scale_key(scale)
+        if key not in base_scales:
+            continue
+        print(f'\nmembers: {key}')
+        before = {(r['phase'], r['method'], r['route']): r for r in base_scales[key]['results']}
+        for result in scale['results']:
+            old = before.get((result['phase'], result['method'], result['route']))
+            if old is None:
+                print(f"  {result['phase']:<7} {result['route']:<44} new: {result['p50_ms']:.1f} ms")
+                continue
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            print(f"  {result['phase']:<7} {result['route']:<44} "
+                  f"p50 {old['p50_ms']:>9.1f} -> {result['p50_ms']:>9.1f} ms ({change:+6.1f}%)  "
+                  f"peak {old['peak_rss_mb'] or 0:>7.1f} -> {result['peak_rss_mb'] or 0:>7.1f} MB")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(json.loads(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--checkins-per-member', type=float, default=SEED_CHECKINS_PER_MEMBER)
+    parser.add_argument('--locations', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--now', default=datetime.now().strftime('%Y-%m-%d'),
+                        help='reference date for generated data (pin it to compare across days)')
+    parser.add_argument('--data-dir', help='benchmark an existing data directory instead')
+    parser.add_argument('--cache-dir', default=os.path.join(
+        tempfile.gettempdir(), 'churnlytics-bench-data'))
+    parser.add_argument('--repeat', type=int, default=5, help='calls per analytics route')
+    parser.add_argument('--export-repeat', type=int, default=2,
+                        help='calls per export and import route')
+    parser.add_argument('--export-formats', nargs='+', default=['xlsx', 'csv'],
+                        choices=['xlsx', 'csv', 'parquet'])
+    parser.add_argument('--import-rows', type=int, default=100_000,
+                        help='check-ins per import call (members: a tenth); 0 skips imports')
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'),
+                        help='diff two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Produces tables with the same columns init_database loads from the seed
+CSVs, so the API can run against them unchanged. generate_dataset writes a
+whole data directory at any scale, streaming check-ins in chunks:
+
+    python -m benchmarks.synthetic --members 1000000 --checkins-per-member 500 \
+        --locations 12 --out /data/churnlytics-1m
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+
+MEMBERSHIP_FEES = {
+    'Premium': 49.99,
+    'Basic': 29.99,
+    'Family': 79.99,
+    'Monthly': 39.99,
+    'Annual': 399.99
+}
+
+
+# Per-member ratios of the shipped seed data (1,500 members)
+SEED_CHECKINS_PER_MEMBER = 140
+SEED_SALES_PER_MEMBER = 1.2
+SEED_LEADS_PER_MEMBER = 1.8
+
+LEAD_SOURCES = ['Web', 'Referral', 'Walk-in', 'Social Media', 'Event']
+SALE_TYPES = {
+    'Membership': ['Premium', 'Basic', 'Family', 'Monthly', 'Annual'],
+    'Personal Training': ['PT 5-Pack', 'PT 10-Pack', 'PT Single'],
+    'Merchandise': ['Shaker', 'T-Shirt', 'Protein', 'Towel']
+}
+STAFF = ['Alex', 'Jordan', 'Sam', 'Taylor', 'Morgan', 'Casey']
+
+# Column types match what pandas.to_sql produces from the seed CSVs, with the
+# primary keys declared up front so migrations don't rebuild large tables
+TABLE_SCHEMAS = {
+    'members': [
+        ('member_id', 'TEXT PRIMARY KEY'), ('location', 'TEXT'), ('join_date', 'TEXT'),
+        ('signup_date', 'TEXT'), ('membership_type', 'TEXT'), ('monthly_fee', 'REAL'),
+        ('age', 'INTEGER'), ('gender', 'TEXT'), ('has_personal_training', 'INTEGER'),
+        ('is_active', 'INTEGER'), ('cancellation_date', 'TEXT'), ('tour_scheduled', 'INTEGER')
+    ],
+    'checkins': [
+        ('checkin_id', 'TEXT PRIMARY KEY'), ('member_id', 'TEXT'), ('location', 'TEXT'),
+        ('checkin_date', 'TEXT'), ('checkin_duration_minutes', 'INTEGER')
+    ],
+    'sales': [
+        ('sale_id', 'TEXT PRIMARY KEY'), ('date', 'TEXT'), ('location', 'TEXT'),
+        ('type', 'TEXT'), ('product', 'TEXT'), ('amount', 'REAL'), ('member_id', 'TEXT'),
+        ('staff_member', 'TEXT'), ('lead_source', 'TEXT')
+    ],
+    'leads': [
+        ('lead_id', 'TEXT PRIMARY KEY'), ('date', 'TEXT'), ('location', 'TEXT'),
+        ('lead_source', 'TEXT'), ('tour_scheduled', 'INTEGER'),
+        ('tour_completed', 'INTEGER'), ('converted_to_member', 'INTEGER')
+    ]
+}
+
+
+def location_names(n):
+    """'Location A' ... 'Location Z', then 'Location 27' onwards"""
+    return np.array([f'Location {chr(65 + i)}' if i < 26 else f'Location {i + 1}'
+                     for i in range(n)])
+
+
+def _timestamps(now, seconds_ago):
+    """'YYYY-MM-DD HH:MM:SS' strings for `seconds_ago` before `now`"""
+    moments = np.datetime64(now, 's') - seconds_ago.astype('timedelta64[s]')
+    return pd.Series(moments).astype(str).to_numpy()
+
+
+def make_members(n, locations=2, seed=0, now=None):
+    """n members spread over `locations` clubs, ~30% cancelled"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+
+    join = now - pd.to_timedelta(rng.integers(1, 5 * 365, n), unit='D')
+    tenure_days = (now - join).days.to_numpy()
+    is_active = rng.random(n) < 0.7
+    cancel = join + pd.to_timedelta(
+        (rng.random(n) * tenure_days).astype(int), unit='D')
+    cancel_text = pd.Series(cancel.strftime('%Y-%m-%d')).where(~is_active, None)
+
+    types = np.array(list(MEMBERSHIP_FEES))
+    membership_type = types[rng.integers(0, len(types), n)]
+    join_text = join.strftime('%Y-%m-%d')
+
+    return pd.DataFrame({
+        'member_id': [f'M{i:07d}' for i in range(n)],
+        'location': location_names(locations)[rng.integers(0, locations, n)],
+        'join_date': join_text,
+        'signup_date': join_text,
+        'membership_type': membership_type,
+        'monthly_fee': pd.Series(membership_type).map(MEMBERSHIP_FEES).to_numpy(),
+        'age': rng.integers(18, 70, n),
+        'gender': np.where(rng.random(n) < 0.5, 'M', 'F'),
+        'has_personal_training': (rng.random(n) < 0.2).astype(int),
+        'is_active': is_active.astype(int),
+        'cancellation_date': cancel_text,
+        'tour_scheduled': (rng.random(n) < 0.5).astype(int)
+    })
+
+
+def make_checkins(members, per_member=20, days=365, seed=1, now=None):
+    """Roughly `per_member` check-ins per member over the last `days` days"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+    n = len(members) * per_member
+
+    owner = rng.integers(0, len(members), n)
+    seconds = rng.integers(0, days * 86400, n)
+    when = now - pd.to_timedelta(seconds, unit='s')
+    return pd.DataFrame({
+        'checkin_id': [f'C{i:09d}' for i in range(n)],
+        'member_id': members['member_id'].to_numpy()[owner],
+        'location': members['location'].to_numpy()[owner],
+        'checkin_date': when.strftime('%Y-%m-%d %H:%M:%S'),
+        'checkin_duration_minutes': rng.integers(20, 120, n)
+    })
+
+
+def iter_checkins(members, total, days=365, seed=1, now=None, chunk_rows=1_000_000):
+    """Yield `total` check-ins as DataFrames of at most `chunk_rows` rows
+
+    Each chunk has its own RNG stream, so output is deterministic for a
+    given seed and chunk size without holding more than one chunk.
+    """
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+    member_ids = members['member_id'].to_numpy()
+    member_locations = members['location'].to_numpy()
+
+    for chunk, start in enumerate(range(0, total, chunk_rows)):
+        n = min(chunk_rows, total - start)
+        rng = np.random.default_rng([seed, chunk])
+        owner = rng.integers(0, len(members), n)
+        yield pd.DataFrame({
+            'checkin_id': [f'C{i:09d}' for i in range(start, start + n)],
+            'member_id': member_ids[owner],
+            'location': member_locations[owner],
+            'checkin_date': _timestamps(now, rng.integers(0, days * 86400, n)),
+            'checkin_duration_minutes': rng.integers(20, 120, n)
+        })
+
+
+def make_sales(members, n, days=730, seed=2, now=None):
+    """n sales of memberships, PT packs and merchandise over `days` days"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+
+    types = np.array(list(SALE_TYPES))
+    sale_type = types[rng.choice(len(types), n, p=[0.5, 0.3, 0.2])]
+    product = np.array([SALE_TYPES[t][i % len(SALE_TYPES[t])]
+                        for t, i in zip(sale_type, rng.integers(0, 12, n))])
+    amount = np.where(sale_type == 'Membership', rng.uniform(30, 400, n),
+                      np.where(sale_type == 'Personal Training',
+                               rng.uniform(60, 600, n), rng.uniform(10, 80, n)))
+    buyer = rng.integers(0, len(members), n)
+
+    return pd.DataFrame({
+        'sale_id': [f'S{i:08d}' for i in range(n)],
+        'date': _timestamps(now, rng.integers(0, days, n) * 86400).astype('U10'),
+        'location': members['location'].to_numpy()[buyer],
+        'type': sale_type,
+        'product': product,
+        'amount': amount.round(2),
+        'member_id': members['member_id'].to_numpy()[buyer],
+        'staff_member': np.array(STAFF)[rng.integers(0, len(STAFF), n)],
+        'lead_source': np.array(LEAD_SOURCES)[rng.integers(0, len(LEAD_SOURCES), n)]
+    })
+
+
+def make_leads(n, locations=2, days=730, seed=3, now=None):
+    """n leads; ~60% book a tour, ~70% of those attend, ~45% of those join"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+
+    scheduled = rng.random(n) < 0.6
+    completed = scheduled & (rng.random(n) < 0.7)
+    converted = completed & (rng.random(n) < 0.45)
+
+    return pd.DataFrame({
+        'lead_id': [f'L{i:08d}' for i in range(n)],
+        'date': _timestamps(now, rng.integers(0, days, n) * 86400).astype('U10'),
+        'location': location_names(locations)[rng.integers(0, locations, n)],
+        'lead_source': np.array(LEAD_SOURCES)[rng.integers(0, len(LEAD_SOURCES), n)],
+        'tour_scheduled': scheduled.astype(int),
+        'tour_completed': completed.astype(int),
+        'converted_to_member': converted.astype(int)
+    })
+
+
+def _create_table(conn, table):
+    columns = ', '.join(f'"{name}" {col_type}' for name, col_type in TABLE_SCHEMAS[table])
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" ({columns})')
+
+
+def _insert_frame(conn, table, df):
+    names = [name for name, _ in TABLE_SCHEMAS[table]]
+    placeholders = ', '.join('?' * len(names))
+    conn.executemany(
+        f'INSERT INTO "{table}" VALUES ({placeholders})',
+        df[names].astype(object).where(df[names].notna(), None).itertuples(index=False, name=None))
+
+
+def generate_dataset(out_dir, members=10_000, locations=2,
+                     checkins_per_member=SEED_CHECKINS_PER_MEMBER,
+                     sales_per_member=SEED_SALES_PER_MEMBER,
+                     leads_per_member=SEED_LEADS_PER_MEMBER,
+                     days=365, fmt='sqlite', seed=0, now=None,
+                     chunk_rows=1_000_000, progress=None):
+    """Write a complete data directory and return its manifest
+
+    fmt='sqlite' writes gym_analytics.db with keyed tables (the app applies
+    the remaining migrations on startup); fmt='csv' writes the seed CSVs for
+    init_database to load. Check-ins are streamed `chunk_rows` at a time.
+    The manifest (parameters and row counts) is saved as synthetic.json.
+    """
+    now = pd.Timestamp(now or pd.Timestamp.now().normalize())
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    member_df = make_members(members, locations=locations, seed=seed, now=now)
+    tables = {
+        'members': member_df,
+        'sales': make_sales(member_df, int(members * sales_per_member), seed=seed + 2, now=now),
+        'leads': make_leads(int(members * leads_per_member), locations=locations,
+                            seed=seed + 3, now=now)
+    }
+    total_checkins = int(members * checkins_per_member)
+    checkins = iter_checkins(member_df, total_checkins, days=days, seed=seed + 1,
+                             now=now, chunk_rows=chunk_rows)
+
+    if fmt == 'csv':
+        for table, df in tables.items():
+            df.to_csv(os.path.join(out_dir, f'{table}.csv'), index=False)
+        path = os.path.join(out_dir, 'checkins.csv')
+        for i, chunk in enumerate(checkins):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            if progress:
+                progress(min((i + 1) * chunk_rows, total_checkins), total_checkins)
+        if total_checkins == 0:
+            pd.DataFrame(columns=[name for name, _ in TABLE_SCHEMAS['checkins']]).to_csv(
+                path, index=False)
+    else:
+        db_path = os.path.join(out_dir, 'gym_analytics.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        for table in TABLE_SCHEMAS:
+            _create_table(conn, table)
+        for table, df in tables.items():
+            _insert_frame(conn, table, df)
+        conn.commit()
+        for i, chunk in enumerate(checkins):
+            _insert_frame(conn, 'checkins', chunk)
+            conn.commit()
+            if progress:
+                progress(min((i + 1) * chunk_rows, total_checkins), total_checkins)
+        conn.close()
+
+    manifest = {
+        'format': fmt,
+        'seed': seed,
+        'now': now.isoformat(),
+        'locations': locations,
+        'days': days,
+        'rows': {
+            'members': members,
+            'checkins': total_checkins,
+            'sales': len(tables['sales']),
+            'leads': len(tables['leads'])
+        },
+        'generate_seconds': round(time.perf_counter() - start, 1)
+    }
+    with open(os.path.join(out_dir, 'synthetic.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_database(db_path, members, checkins=None, sales=None, leads=None):
+    """Write the four core tables the way init_database does"""
+    empty = {
+        'checkins': ['checkin_id', 'member_id', 'location', 'checkin_date',
+                     'checkin_duration_minutes'],
+        'sales': ['sale_id', 'date', 'location', 'type', 'product', 'amount',
+                  'member_id', 'staff_member', 'lead_source'],
+        'leads': ['lead_id', 'date', 'location', 'lead_source', 'tour_scheduled',
+                  'tour_completed', 'converted_to_member']
+    }
+    tables = {'members': members, 'checkins': checkins,
+              'sales': sales, 'leads': leads}
+
+    conn = sqlite3.connect(db_path)
+    for name, df in tables.items():
+        if df is None:
+            df = pd.DataFrame(columns=empty[name])
+        df.to_sql(name, conn, if_exists='replace', index=False, chunksize=100_000)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic Churnlytics data directory')
+    parser.add_argument('--out', required=True, help='data directory to create')
+    parser.add_argument('--members', type=int, default=10_000)
+    parser.add_argument('--locations', type=int, default=2)
+    parser.add_argument('--checkins-per-member', type=float, default=SEED_CHECKINS_PER_MEMBER)
+    parser.add_argument('--sales-per-member', type=float, default=SEED_SALES_PER_MEMBER)
+    parser.add_argument('--leads-per-member', type=float, default=SEED_LEADS_PER_MEMBER)
+    parser.add_argument('--days', type=int, default=365, help='check-in history length')
+    parser.add_argument('--format', choices=['sqlite', 'csv'], default='sqlite')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--now', help='reference date (default: today)')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f'\r  check-ins {done:,} / {total:,}', end='', flush=True)
+
+    manifest = generate_dataset(
+        args.out, members=args.members, locations=args.locations,
+        checkins_per_member=args.checkins_per_member,
+        sales_per_member=args.sales_per_member, leads_per_member=args.leads_per_member,
+        days=args.days, fmt=args.format, seed=args.seed, now=args.now,
+        chunk_rows=args.chunk_rows, progress=progress)
+    print()
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Shared fixtures: the app, loaded against a small throwaway database.
+
+CHURNLYTICS_DATA_DIR is read when app is imported, so the data directory is
+written and the variable set before the first test imports it.
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic import make_members, write_database  # noqa: E402
+
+MEMBERS = 120
+
+
+def _checkins(members, now):
+    """Check-ins for two in three members, at midnight so last visits tie"""
+    rows = []
+    for position, member_id in enumerate(members['member_id']):
+        if position % 3 == 2:
+            continue  # never checked in
+        # Recent (not at risk) or 20-29 days ago (at risk)
+        days_ago = 2 if position % 3 == 1 and position % 2 else 20 + position % 10
+        for visit in range(3):
+            day = now - pd.Timedelta(days=days_ago + visit * 5)
+            rows.append({
+                'checkin_id': f'C{position:05d}{visit}',
+                'member_id': member_id,
+                'location': members['location'].iloc[position],
+                'checkin_date': day.strftime('%Y-%m-%d %H:%M:%S'),
+                'checkin_duration_minutes': 45
+            })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope='session')
+def churnlytics():
+    data_dir = tempfile.mkdtemp(prefix='churnlytics-test-')
+    os.environ['CHURNLYTICS_DATA_DIR'] = data_dir
+    now = pd.Timestamp.now().normalize()
+    members = make_members(MEMBERS, now=now)
+    write_database(os.path.join(data_dir, 'gym_analytics.db'), members,
+                   _checkins(members, now))
+    import app
+    return app
+
+
+@pytest.fixture
+def client(churnlytics):
+    churnlytics.app.config['TESTING'] = True
+    return churnlytics.app.test_client()
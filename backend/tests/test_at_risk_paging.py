@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+
+def _expected(churnlytics, order):
+    """Active members idle for over AT_RISK_IDLE_DAYS, most idle first for desc"""
+    with churnlytics.db_pool.connection() as conn:
+        members = pd.read_sql_query("""
+            SELECT m.member_id, MAX(c.checkin_date) as last_checkin
+            FROM members m
+            LEFT JOIN checkins c ON c.member_id = m.member_id
+            WHERE m.is_active = 1
+            GROUP BY m.member_id
+        """, conn)
+    last_seen = pd.to_datetime(members['last_checkin'])
+    cutoff = pd.Timestamp.now() - pd.Timedelta(days=churnlytics.AT_RISK_IDLE_DAYS + 1)
+    members = members[last_seen.isna() | (last_seen <= cutoff)]
+    # Never checked in sorts as the oldest visit
+    members = members.fillna({'last_checkin': ''}).sort_values(
+        ['last_checkin', 'member_id'], ascending=order == 'desc')
+    return members
+
+
+def _pages(client, order):
+    member_ids, cursor, pages = [], None, 0
+    while True:
+        params = {'sort': 'days_since_checkin', 'order': order, 'limit': 7}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/at-risk-members', query_string=params)
+        assert response.status_code == 200
+        body = response.get_json()
+        member_ids += [row['member_id'] for row in body['at_risk_members']]
+        pages += 1
+        cursor = body['next_cursor']
+        if not cursor:
+            return member_ids, pages
+
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_cursor_pages_list_every_at_risk_member_once_in_order(churnlytics, client, order):
+    expected = _expected(churnlytics, order)
+    # Pages must break inside runs of members last seen at the same moment
+    assert expected['last_checkin'].duplicated().sum() > 7
+
+    member_ids, pages = _pages(client, order)
+
+    assert member_ids == expected['member_id'].tolist()
+    assert pages == -(-len(expected) // 7)
+
+
+def test_cursor_from_another_order_is_rejected(client):
+    first = client.get('/api/at-risk-members',
+                       query_string={'order': 'desc', 'limit': 7}).get_json()
+    response = client.get('/api/at-risk-members', query_string={
+        'order': 'asc', 'limit': 7, 'cursor': first['next_cursor']})
+    assert response.status_code == 400
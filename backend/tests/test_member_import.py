@@ -0,0 +1,50 @@
+import io
+
+MEMBER_COLUMNS = ['member_id', 'location', 'join_date', 'signup_date', 'membership_type',
+                  'monthly_fee', 'age', 'gender', 'has_personal_training', 'is_active',
+                  'cancellation_date', 'tour_scheduled']
+
+
+def _members(churnlytics, member_ids):
+    placeholders = ', '.join('?' * len(member_ids))
+    with churnlytics.db_pool.connection() as conn:
+        return churnlytics.pd.read_sql_query(
+            f'SELECT {", ".join(MEMBER_COLUMNS)} FROM members '
+            f'WHERE member_id IN ({placeholders}) ORDER BY member_id',
+            conn, params=member_ids)
+
+
+def _import(churnlytics, df):
+    return churnlytics.import_members_file(io.StringIO(df.to_csv(index=False)), 'csv')
+
+
+def _hashed_members(churnlytics, member_ids):
+    """Stored rows of these members, re-imported once so they carry a row hash"""
+    df = _members(churnlytics, member_ids)
+    _import(churnlytics, df)
+    return df
+
+
+def test_append_counts_changed_unchanged_and_new_rows(churnlytics):
+    df = _hashed_members(churnlytics, ['M0000010', 'M0000011', 'M0000012'])
+    df.loc[0, 'monthly_fee'] = 12.5
+    new = df.iloc[[2]].assign(member_id='M9000000')
+    version = churnlytics.current_data_version()
+
+    stats = _import(churnlytics, churnlytics.pd.concat([df, new]))
+
+    assert (stats['rows_imported'], stats['rows_inserted'], stats['rows_updated'],
+            stats['rows_unchanged']) == (4, 1, 1, 2)
+    assert churnlytics.current_data_version() != version
+    stored = _members(churnlytics, ['M0000010', 'M9000000'])
+    assert stored['monthly_fee'].tolist() == [12.5, new['monthly_fee'].iloc[0]]
+
+
+def test_append_of_unchanged_rows_keeps_the_data_version(churnlytics):
+    df = _hashed_members(churnlytics, ['M0000020', 'M0000021'])
+    version = churnlytics.current_data_version()
+
+    stats = _import(churnlytics, df)
+
+    assert (stats['rows_inserted'], stats['rows_updated'], stats['rows_unchanged']) == (0, 0, 2)
+    assert churnlytics.current_data_version() == version
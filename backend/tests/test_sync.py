@@ -0,0 +1,52 @@
+import pandas as pd
+
+
+def _sync_twice(churnlytics, table, path):
+    first = churnlytics.sync_file('test', table, str(path))
+    version = churnlytics.current_data_version()
+    second = churnlytics.sync_file('test', table, str(path))
+    return first, second, version
+
+
+def test_second_sync_of_a_members_file_is_a_no_op(churnlytics, tmp_path):
+    with churnlytics.db_pool.connection() as conn:
+        stored = pd.read_sql_query(
+            "SELECT member_id, location, join_date, membership_type, is_active FROM members "
+            "WHERE member_id IN ('M0000030', 'M0000031', 'M0000032') ORDER BY member_id", conn)
+    # The feed doesn't send is_active, so stored values must survive
+    delta = stored.drop(columns=['is_active']).assign(monthly_fee=[19.0, 29.0, 39.0])
+    delta = pd.concat([delta, delta.iloc[[0]].assign(member_id='M9000100')])
+    path = tmp_path / 'members_delta.csv'
+    delta.to_csv(path, index=False)
+
+    first, second, version = _sync_twice(churnlytics, 'members', path)
+
+    assert first['rows_inserted'] == 1 and first['rows_updated'] == 3
+    assert (second['rows_inserted'], second['rows_updated'], second['rows_unchanged']) == (0, 0, 4)
+    assert churnlytics.current_data_version() == version
+    with churnlytics.db_pool.connection() as conn:
+        is_active = dict(conn.execute(
+            "SELECT member_id, is_active FROM members "
+            "WHERE member_id IN ('M0000030', 'M0000031', 'M0000032', 'M9000100')").fetchall())
+    assert is_active == {**dict(zip(stored['member_id'], stored['is_active'])), 'M9000100': 1}
+
+
+def test_second_sync_of_a_checkins_file_is_a_no_op(churnlytics, tmp_path):
+    now = pd.Timestamp.now().normalize()
+    delta = pd.DataFrame({
+        'checkin_id': ['S0001', 'S0002', 'S0003'],
+        'member_id': ['M0000040', 'M0000041', 'M0000040'],
+        'location': ['Location A', 'Location B', 'Location A'],
+        'checkin_date': [(now - pd.Timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+                         for days in (3, 2, 1)],
+        'checkin_duration_minutes': [30, 60, 90]
+    })
+    path = tmp_path / 'checkins_delta.csv'
+    delta.to_csv(path, index=False)
+
+    first, second, version = _sync_twice(churnlytics, 'checkins', path)
+
+    assert first['rows_inserted'] == 3
+    assert (second['rows_inserted'], second['rows_updated']) == (0, 0)
+    assert second['rows_skipped'] + second['rows_unchanged'] == 3
+    assert churnlytics.current_data_version() == version